@@ -1,10 +1,9 @@
-import os
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
+import numpy as np
 
-# Initialize REFPROP
-RP = REFPROPFunctionLibrary(os.environ['RPPREFIX'])
-RP.SETPATHdll(os.environ['RPPREFIX'])
-MASS_BASE_SI = RP.GETENUMdll(0, "MASS BASE SI").iEnum
+from offload import (PRESSURE_HALT, STATION_FULL, TRAILER_EMPTY, RisingPressureOffload, Trajectory,
+                     integrate_adaptive, integrate_batch, solve_ode)
+from properties import PropertyBatch, get_backend
+from tracing import debug, info, warning
 
 # Constants and initial conditions
 trailer_volume = 32.0  # m^3
@@ -24,75 +23,112 @@ trailer_pressure_initial = 160000 #
 m_station_max = 870.0 * station_max_fill_fraction  # 95% of full mass
 
 
-def boil_to_pressure(mass_initial, pressure_initial, pressure_final):
+# Each process function has a NumPy form (*_batch) that takes arrays of
+# states, broadcast against each other, and returns arrays; the scalar
+# functions run a batch of one. heat_load (W) defaults to TRAILER_HEAT_LOAD
+# and may also be an array, one load per state
+def _scalars(values):
+    return tuple(float(v) for v in values)
+
+def boil_to_pressure_batch(mass_initial, pressure_initial, pressure_final, heat_load=None):
+    props = get_backend()
+    mass_initial = np.asarray(mass_initial, dtype=float)
     density = mass_initial / trailer_volume
     
     # Calculate initial and final states
-    r_initial = RP.REFPROPdll("PARAHYD", "PD", "H;E", MASS_BASE_SI, 0, 0, pressure_initial, density, [1.0])
-    h_initial, e_initial = r_initial.Output[0], r_initial.Output[1]
-    
-    r_final = RP.REFPROPdll("PARAHYD", "PD", "H;E", MASS_BASE_SI, 0, 0, pressure_final, density, [1.0])
-    h_final, e_final = r_final.Output[0], r_final.Output[1]
+    h_initial, e_initial = props.calc_array("PD", "H;E", pressure_initial, density)
+    h_final, e_final = props.calc_array("PD", "H;E", pressure_final, density)
     
     # Calculate energy change and time duration
     de = e_final - e_initial
-    dt = de * mass_initial / TRAILER_HEAT_LOAD
+    dt = de * mass_initial / (TRAILER_HEAT_LOAD if heat_load is None else np.asarray(heat_load, dtype=float))
     
     return h_final, dt
 
-def boil_over_time(mass_initial, pressure_initial, time_duration):
+def boil_to_pressure(mass_initial, pressure_initial, pressure_final, heat_load=None):
+    return _scalars(boil_to_pressure_batch(mass_initial, pressure_initial, pressure_final, heat_load))
+
+def boil_over_time_batch(mass_initial, pressure_initial, time_duration, heat_load=None):
+    props = get_backend()
+    mass_initial = np.asarray(mass_initial, dtype=float)
     density = mass_initial / trailer_volume
     
     # Calculate initial state
-    r_initial = RP.REFPROPdll("PARAHYD", "PD", "E", MASS_BASE_SI, 0, 0, pressure_initial, density, [1.0])
-    e_initial = r_initial.Output[0]
+    e_initial = props.calc_array("PD", "E", pressure_initial, density)[0]
     
     # Calculate final internal energy
-    e_final = e_initial + (TRAILER_HEAT_LOAD * time_duration) / mass_initial
+    heat_load = TRAILER_HEAT_LOAD if heat_load is None else np.asarray(heat_load, dtype=float)
+    e_final = e_initial + (heat_load * np.asarray(time_duration, dtype=float)) / mass_initial
     
     # Find final pressure 
-    r_final = RP.REFPROPdll("PARAHYD", "DE", "P;QMASS", MASS_BASE_SI, 0, 0, density, e_final, [1.0])
-    pressure_final, quality_final= r_final.Output[0], r_final.Output[1]
+    pressure_final, quality_final = props.calc_array("DE", "P;QMASS", density, e_final)
     
     return pressure_final, quality_final
 
-def vent_trailer(mass_initial, pressure_initial, pressure_final):
-    # print(pressure_final)
+def boil_over_time(mass_initial, pressure_initial, time_duration, heat_load=None):
+    return _scalars(boil_over_time_batch(mass_initial, pressure_initial, time_duration, heat_load))
+
+def vent_trailer_batch(mass_initial, pressure_initial, pressure_final):
+    props = get_backend()
+    mass_initial = np.asarray(mass_initial, dtype=float)
     density_initial = mass_initial / trailer_volume
     
     # Calculate initial entropy
-    r_initial = RP.REFPROPdll("PARAHYD", "PD", "S", MASS_BASE_SI, 0, 0, pressure_initial, density_initial, [1.0])
-    s_initial = r_initial.Output[0]
+    s_initial = props.calc_array("PD", "S", pressure_initial, density_initial)[0]
     
     # Calculate new density at final pressure, with same entropy
-    r_final = RP.REFPROPdll("PARAHYD", "PS", "D;QMASS", MASS_BASE_SI, 0, 0, pressure_final, s_initial, [1.0])
-    density_final, x_final = r_final.Output[0], r_final.Output[1]
+    density_final, x_final = props.calc_array("PS", "D;QMASS", pressure_final, s_initial)
 
-    # print(x_final, density_initial, density_final)
-    if x_final < 0 or x_final > 1:
-        x_final = 1
-        print("Caution Quality is constrained!")
-    else:
-        x_final = x_final
+    constrained = (x_final < 0) | (x_final > 1)
+    if constrained.any():
+        x_final = np.where(constrained, 1.0, x_final)
+        warning("Caution Quality is constrained!")
     
     # Calculate liquid final values
     mass_final = trailer_volume*density_final
     mass_liq_final = (1 - x_final) * mass_final #why are we using the initial mass here?
-    r1 = RP.REFPROPdll("PARAHYD", "P;QMASS", "D", MASS_BASE_SI, 0, 0, pressure_final, 0, [1.0])
-    vol_liq = mass_liq_final/r1.Output[0]
+    density_liq, density_gas = props.calc_array("PQ", "DLIQ;DVAP", pressure_final, 0)
+    vol_liq = mass_liq_final/density_liq
     
     # Calculate gas final values
     vol_gas = trailer_volume - vol_liq
-    r2 = RP.REFPROPdll("PARAHYD", "P;QMASS", "D", MASS_BASE_SI, 0, 0, pressure_final, 1, [1.0])
-    mass_gas_final = vol_gas*r2.Output[0]
+    mass_gas_final = vol_gas*density_gas
     
     # Calculate mass vented
-    #mass_trailer_final = mass_gas_final + mass_liq_final
     mass_vented = mass_initial - mass_final
     
     return mass_final, mass_vented, mass_liq_final, mass_gas_final
 
-def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initial_trailer, m_initial_station, V_station, m_station_max, P_station_max, P_trailer_max, V_trailer):
+def vent_trailer(mass_initial, pressure_initial, pressure_final):
+    return _scalars(vent_trailer_batch(mass_initial, pressure_initial, pressure_final))
+
+def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initial_trailer, m_initial_station, V_station, m_station_max, P_station_max, P_trailer_max, V_trailer,
+                                  method="adaptive", rtol=1e-6, atol=1e-3, trajectory=False, return_solution=False):
+    # Pushes liquid from the trailer into the station while both pressurize
+    # together. The default "adaptive" method integrates the transfer with
+    # error control (rtol relative, atol kg on the station mass) and stops
+    # exactly at the limiting pressure, station fill or trailer empty (see
+    # offload.py); "ode" solves the same model with scipy's solve_ivp and
+    # terminal events; "stepwise" is the original 1 kPa march.
+    # With trajectory=True a fourth value is returned: a structured array
+    # (offload.TRAJECTORY_DTYPE) with one row per step, from the initial
+    # state to the final one, including the heat into the contents (Q_total).
+    # With return_solution=True (method="ode" only) the offload.OffloadSolution
+    # comes last, for the station and trailer masses at any pressure along
+    # the way; it is None when the offload is skipped.
+    if return_solution and method != "ode":
+        raise ValueError(f"return_solution needs method='ode', not {method!r}")
+    props = get_backend()
+    steps = Trajectory() if trajectory else None
+
+    def finish(P, m_station, m_trailer, solution=None):
+        results = (P, m_station, m_trailer)
+        if steps is not None:
+            if len(steps) == 0:
+                steps.append(P, m_station, m_trailer)
+            results += (steps.rows.copy(),)
+        return results + (solution,) if return_solution else results
+
     # Constants
     # V_trailer = 32  # m^3
     # P_trailer_max = 1204514.0  # Pa (160 psig, 174.7 psia)
@@ -101,9 +137,6 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
     # m_station_max = 800
     # P_station_max = 400000
 
-    dP = 1000  # Pa
-    max_steps = 1000
-    
     P_max = min(P_station_max, P_trailer_max)
     P = P_initial_trailer
     
@@ -116,10 +149,11 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
     # print(f"  Station max fill fraction: {station_max_fill_fraction:.2f}")
     
     # Calculate full and empty masses
-    m_trailer_empty = V_trailer * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, P, 1, [1.0]).Output[0]
-    m_trailer_full = V_trailer * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, P, 0, [1.0]).Output[0]
-    m_station_empty = V_station * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, P, 1, [1.0]).Output[0]
-    m_station_full = V_station * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, P, 0, [1.0]).Output[0]
+    rho_L, rho_V = props.calc("PQ", "DLIQ;DVAP", P, 0)
+    m_trailer_empty = V_trailer * rho_V
+    m_trailer_full = V_trailer * rho_L
+    m_station_empty = V_station * rho_V
+    m_station_full = V_station * rho_L
     
     # print(f"Calculated masses:")
     # print(f"  Trailer empty mass: {m_trailer_empty:.2f} kg")
@@ -129,16 +163,93 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
     
     # Check input validity
     if m_initial_trailer <= m_trailer_empty:
-        print(f"Trailer is empty! Initial mass ({m_initial_trailer:.2f} kg) <= Empty mass ({m_trailer_empty:.2f} kg)")
-        return P, m_initial_station, m_initial_trailer
+        warning("Trailer is empty! Initial mass ({mass:.2f} kg) <= Empty mass ({empty:.2f} kg)",
+                mass=m_initial_trailer, empty=m_trailer_empty)
+        return finish(P, m_initial_station, m_initial_trailer)
     elif m_initial_trailer > m_trailer_full:
-        print(f"Trailer mass ({m_initial_trailer:.2f} kg) exceeds calculated full mass ({m_trailer_full:.2f} kg) at new pressure. Proceeding with transfer.")
+        warning("Trailer mass ({mass:.2f} kg) exceeds calculated full mass ({full:.2f} kg) at new pressure. Proceeding with transfer.",
+                mass=m_initial_trailer, full=m_trailer_full)
     elif m_initial_station < m_station_empty:
-        print(f"Station is less than empty! Initial mass ({m_initial_station:.2f} kg) < Empty mass ({m_station_empty:.2f} kg)")
-        return P, m_initial_station, m_initial_trailer
+        warning("Station is less than empty! Initial mass ({mass:.2f} kg) < Empty mass ({empty:.2f} kg)",
+                mass=m_initial_station, empty=m_station_empty)
+        return finish(P, m_initial_station, m_initial_trailer)
     elif m_initial_station > m_station_full:
-        print(f"Station is overfull! Initial mass ({m_initial_station:.2f} kg) > Full mass ({m_station_full:.2f} kg)")
-        return P, m_initial_station, m_initial_trailer
+        warning("Station is overfull! Initial mass ({mass:.2f} kg) > Full mass ({full:.2f} kg)",
+                mass=m_initial_station, full=m_station_full)
+        return finish(P, m_initial_station, m_initial_trailer)
+    
+    if method == "stepwise":
+        return finish(*_offload_stepwise(props, P, m_initial_trailer, m_initial_station, V_station, m_station_max, P_max,
+                                         V_trailer, steps))
+    if method not in ("adaptive", "ode"):
+        raise ValueError(f"Unknown offload method {method!r}, expected 'adaptive', 'ode' or 'stepwise'")
+    
+    problem = RisingPressureOffload(m_initial_trailer + m_initial_station, V_station, V_trailer, m_station_max, P_max, props)
+    solution = None
+    if method == "ode":
+        solution = solve_ode(problem, P, m_initial_station, rtol=rtol, atol=atol, trajectory=steps)
+        P, m_station, reason = solution.P, solution.m_station, solution.reason
+    else:
+        P, m_station, reason = integrate_adaptive(problem, P, m_initial_station, rtol=rtol, atol=atol, trajectory=steps)
+    if steps is not None:
+        _trajectory_heat(props, steps.rows, problem.m_total, V_station + V_trailer)
+    m_trailer = m_initial_trailer + m_initial_station - m_station
+    if reason == PRESSURE_HALT:
+        debug("Pressure Halt")
+    elif reason == STATION_FULL:
+        debug("Station Full with {mass:.2f} kg", mass=m_station)
+    elif reason == TRAILER_EMPTY:
+        debug("Trailer Empty with {mass:.2f} kg", mass=m_trailer)
+    else:
+        info("Step Limit Reached")
+    
+    return finish(P, m_station, m_trailer, solution)
+
+def offload_with_raising_pressure_batch(P_initial_trailer, P_initial_station, m_initial_trailer, m_initial_station, V_station, m_station_max, P_station_max, P_trailer_max, V_trailer,
+                                        steps=32):
+    # offload_with_raising_pressure for arrays of states, integrated
+    # together with fixed-step Runge-Kutta (offload.integrate_batch). States
+    # that fail the scalar version's checks are returned unchanged, without
+    # the per-state warnings. All-scalar arguments give scalar results
+    props = get_backend()
+    scalar = all(np.ndim(a) == 0 for a in (P_initial_trailer, m_initial_trailer, m_initial_station, V_station,
+                                           m_station_max, P_station_max, P_trailer_max, V_trailer))
+    P, m_initial_trailer, m_initial_station, V_station, m_station_max, P_max, V_trailer = (
+        np.array(a, dtype=float, ndmin=1) for a in np.broadcast_arrays(
+            P_initial_trailer, m_initial_trailer, m_initial_station, V_station, m_station_max,
+            np.minimum(P_station_max, P_trailer_max), V_trailer))
+    rho_L, rho_V = props.calc_array("PQ", "DLIQ;DVAP", P, 0)
+    trailer_empty = m_initial_trailer <= V_trailer * rho_V
+    trailer_overfull = m_initial_trailer > V_trailer * rho_L
+    station_invalid = (m_initial_station < V_station * rho_V) | (m_initial_station > V_station * rho_L)
+    skip = trailer_empty | (~trailer_overfull & station_invalid)
+    if skip.any():
+        warning("{count} of {total} offloads skipped: trailer empty or station outside its empty/full range",
+                count=int(skip.sum()), total=skip.size)
+
+    m_station = m_initial_station.copy()
+    run = np.flatnonzero(~skip)
+    if run.size:
+        m_total = m_initial_trailer[run] + m_initial_station[run]
+        P[run], m_station[run], _ = integrate_batch(
+            m_total, V_station[run], V_trailer[run], m_station_max[run], P_max[run], P[run], m_initial_station[run],
+            steps, props)
+    results = P, m_station, m_initial_trailer + m_initial_station - m_station
+    return _scalars(np.squeeze(a) for a in results) if scalar else results
+
+def _trajectory_heat(props, rows, m_combined, V_combined):
+    # Transfers and heat between the rows of an engine's trajectory; the
+    # combined contents keep their density, so the heat is the change of
+    # their internal energy, as in the stepwise march
+    u = props.calc_array("PD", "U", rows["P"], m_combined / V_combined)[0]
+    rows["m_transfer"][1:] = np.diff(rows["m_station"])
+    rows["Q_step"][1:] = np.diff(u) * m_combined
+    rows["Q_total"] = np.cumsum(rows["Q_step"])
+
+def _offload_stepwise(props, P, m_initial_trailer, m_initial_station, V_station, m_station_max, P_max, V_trailer, steps=None):
+    # Original fixed-step march, kept for comparison (method="stepwise")
+    dP = 1000  # Pa
+    max_steps = 1000
     
     # Initialize
     m_trailer = m_initial_trailer
@@ -148,35 +259,42 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
     rho_combined = m_combined / V_combined
     
     # Calculate initial energies and entropies
-    u_combined = RP.REFPROPdll("PARAHYD", "PD", "U", MASS_BASE_SI, 0, 0, P, rho_combined, [1.0]).Output[0]
-    s_station = RP.REFPROPdll("PARAHYD", "PD", "S", MASS_BASE_SI, 0, 0, P, m_station / V_station, [1.0]).Output[0]
+    u_combined = props.calc("PD", "U", P, rho_combined)[0]
+    s_station = props.calc("PD", "S", P, m_station / V_station)[0]
     
     Q_total = 0
     m_transferred = 0
+    if steps is not None:
+        steps.append(P, m_station, m_trailer)
     
     # Stepwise pressure increase
     for step in range(max_steps):
         P2 = P + dP
-        print(f"\nStep {step}")
-        print(f"Pressure: {P:.1f} Pa")
+        debug("\nStep {step}", step=step)
+        debug("Pressure: {P:.1f} Pa", P=P)
+        
+        # Everything this step needs at P2, one flash per state
+        batch = PropertyBatch(props)
+        batch.add("PD", "U", P2, rho_combined)
+        batch.add("PS", "D", P2, s_station)
+        batch.add("PQ", "D", P2, 0)
+        batch.add("PQ", "D", P2, 1)
+        (u2_combined,), (rho_shrunk_station,), (rho2_L,), (rho2_V,) = batch.run()
         
         # Calculate new energies
-        u2_combined = RP.REFPROPdll("PARAHYD", "PD", "U", MASS_BASE_SI, 0, 0, P2, rho_combined, [1.0]).Output[0]
         Q_step = (u2_combined - u_combined) * m_combined
         
         # Calculate new station properties
-        rho_shrunk_station = RP.REFPROPdll("PARAHYD", "PS", "D", MASS_BASE_SI, 0, 0, P2, s_station, [1.0]).Output[0]
         V_shrunk_station = m_station / rho_shrunk_station
         
         # Calculate mass transfer
-        rho2_L = RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, P2, 0, [1.0]).Output[0]
         m_transfer = (V_station - V_shrunk_station) * rho2_L
         
-        print(f"Mass Transferring: {m_transfer:.2f} kg")
+        debug("Mass Transferring: {m_transfer:.2f} kg", m_transfer=m_transfer)
         m2_trailer = m_trailer - m_transfer
         m2_station = m_station + m_transfer
         
-        m2_trailer_min = V_trailer * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, P2, 1, [1.0]).Output[0]
+        m2_trailer_min = V_trailer * rho2_V
         
         # print(f"Updated masses:")
         # print(f"  Trailer: {m2_trailer:.2f} kg")
@@ -186,13 +304,13 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
         
         # Check stop conditions
         if P2 >= P_max:
-            print("Pressure Halt")
+            debug("Pressure Halt")
             break
         elif m2_station >= m_station_max:
-            print(f"Station Full with {m2_station:.2f} kg")
+            debug("Station Full with {mass:.2f} kg", mass=m2_station)
             break
         elif m2_trailer < m2_trailer_min:
-            print(f"Trailer Empty with {m2_trailer:.2f} kg")
+            debug("Trailer Empty with {mass:.2f} kg", mass=m2_trailer)
             break
         
         # Update values for next step
@@ -201,11 +319,13 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
         Q_total += Q_step
         m_station = m2_station
         m_trailer = m2_trailer
-        s_station = RP.REFPROPdll("PARAHYD", "PD", "S", MASS_BASE_SI, 0, 0, P, m_station / V_station, [1.0]).Output[0]
+        s_station = props.calc("PD", "S", P, m_station / V_station)[0]
         m_transferred += m_transfer
+        if steps is not None:
+            steps.append(P, m_station, m_trailer, m_transfer, Q_step, Q_total)
         
         if step + 1 >= max_steps:
-            print("Step Limit Reached")
+            info("Step Limit Reached")
     
     # print(f"\nFinal results:")
     # print(f"Station mass: {m_station:.12f} kg")
@@ -217,18 +337,16 @@ def offload_with_raising_pressure(P_initial_trailer, P_initial_station, m_initia
     
     return P, m_station, m_trailer
 
-def offload_const_pressure(trailer_mass_initial, station_mass_initial, pressure, station_volume, station_max_fill_fraction):
+def offload_const_pressure_batch(trailer_mass_initial, station_mass_initial, pressure, station_volume, station_max_fill_fraction):
+    props = get_backend()
+    trailer_mass_initial = np.asarray(trailer_mass_initial, dtype=float)
+    station_mass_initial = np.asarray(station_mass_initial, dtype=float)
     # Calculate initial trailer state
     density_trailer_initial = trailer_mass_initial / trailer_volume
-    e_trailer_initial = RP.REFPROPdll("PARAHYD", "PD", "E", MASS_BASE_SI, 0, 0, pressure, density_trailer_initial, [1.0]).Output[0]
-    
-    # Calculate initial station state
-    density_station_initial = station_mass_initial / station_volume
-    e_station_initial = RP.REFPROPdll("PARAHYD", "PD", "E", MASS_BASE_SI, 0, 0, pressure, density_station_initial, [1.0]).Output[0]
+    e_trailer_initial = props.calc_array("PD", "E", pressure, density_trailer_initial)[0]
     
     # Calculate gas and liquid densities
-    density_gas = RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, pressure, 1, [1.0]).Output[0]
-    density_liq = RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, pressure, 0, [1.0]).Output[0]
+    density_liq, density_gas = props.calc_array("PQ", "DLIQ;DVAP", pressure, 0)
     
     # Calculate mass of gas when trailer is empty and liquid available
     mass_gas_trailer_empty = trailer_volume * density_gas
@@ -236,7 +354,7 @@ def offload_const_pressure(trailer_mass_initial, station_mass_initial, pressure,
     
     # Calculate station max mass and mass transfer needed
     station_mass_max = station_volume * density_liq * station_max_fill_fraction
-    mass_transfer_needed = min(station_mass_max - station_mass_initial, mass_liquid_available)
+    mass_transfer_needed = np.minimum(station_mass_max - station_mass_initial, mass_liquid_available)
     
     # Calculate volume transferred and gas vented
     vol_transferred = mass_transfer_needed / density_liq
@@ -247,40 +365,42 @@ def offload_const_pressure(trailer_mass_initial, station_mass_initial, pressure,
     station_mass_final = station_mass_initial + mass_transfer_needed - gas_vented
     
     # Calculate energy transferred
-    e_trailer_final = RP.REFPROPdll("PARAHYD", "PD", "E", MASS_BASE_SI, 0, 0, pressure, trailer_mass_final / trailer_volume, [1.0]).Output[0]
+    e_trailer_final = props.calc_array("PD", "E", pressure, trailer_mass_final / trailer_volume)[0]
     energy_transferred = (e_trailer_final - e_trailer_initial) * trailer_mass_final
     
     return mass_transfer_needed, gas_vented, trailer_mass_final, station_mass_final, energy_transferred
 
-def fill_trailer_const_pressure(mass_initial, mass_final, pressure, trailer_volume):
+def offload_const_pressure(trailer_mass_initial, station_mass_initial, pressure, station_volume, station_max_fill_fraction):
+    return _scalars(offload_const_pressure_batch(trailer_mass_initial, station_mass_initial, pressure, station_volume, station_max_fill_fraction))
+
+def fill_trailer_const_pressure_batch(mass_initial, mass_final, pressure, trailer_volume):
+    props = get_backend()
+    mass_initial = np.asarray(mass_initial, dtype=float)
+    mass_final = np.asarray(mass_final, dtype=float)
     density_initial = mass_initial / trailer_volume
     density_final = mass_final / trailer_volume
     
     # Initial state
-    r_initial = RP.REFPROPdll("PARAHYD", "PD", "E;QMOLE", MASS_BASE_SI, 0, 0, pressure, density_initial, [1.0])
-    e_initial, x_initial = r_initial.Output[0], r_initial.Output[1]
+    e_initial, x_initial = props.calc_array("PD", "E;QMOLE", pressure, density_initial)
     
-    # print(x_initial, density_initial, density_final)
-    if x_initial < 0 or x_initial > 1:
-        x_initial = 1
-        print("Caution Quality is constrained!")
-    else:
-        x_initial = x_initial
+    constrained = (x_initial < 0) | (x_initial > 1)
+    if constrained.any():
+        x_initial = np.where(constrained, 1.0, x_initial)
+        warning("Caution Quality is constrained!")
 
     # Final state
-    r_final = RP.REFPROPdll("PARAHYD", "PD", "E;QMOLE", MASS_BASE_SI, 0, 0, pressure, density_final, [1.0])
-    e_final, x_final = r_final.Output[0], r_final.Output[1]
+    e_final, x_final = props.calc_array("PD", "E;QMOLE", pressure, density_final)
     
-    # print(x_final)
-    if x_final < 0 or x_final > 1:
-        x_final = 1
-        
-        print("Caution Quality is constrained!")
-    else:
-        x_final = x_final
+    constrained = (x_final < 0) | (x_final > 1)
+    if constrained.any():
+        x_final = np.where(constrained, 1.0, x_final)
+        warning("Caution Quality is constrained!")
         
     change_mass = mass_final - mass_initial
     mass_liq_added = mass_final*(1-x_final) - mass_initial*(1-x_initial)
     mass_gas_added = mass_initial*(x_initial) - mass_final*(x_final)
 
     return change_mass, mass_liq_added, mass_gas_added
+
+def fill_trailer_const_pressure(mass_initial, mass_final, pressure, trailer_volume):
+    return _scalars(fill_trailer_const_pressure_batch(mass_initial, mass_final, pressure, trailer_volume))
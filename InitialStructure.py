@@ -1,6 +1,26 @@
-from dataclasses import dataclass
-from typing import List, Dict, Callable
-import enum	
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, fields
+from typing import List, Dict, Optional
+import enum
+import heapq
+import json
+import math
+
+import numpy as np
+
+from AllFunctions import (boil_over_time, boil_over_time_batch, fill_trailer_const_pressure, offload_const_pressure,
+                          offload_with_raising_pressure, vent_trailer, vent_trailer_batch)
+from properties import get_backend
+from tracing import debug, info
+
+# Discrete-event logistics: every trailer follows its own route of events,
+# and the engine keeps one priority queue of pending start/finish times
+# across all trailers. Stations and plants are shared resources; a trailer
+# that finds one busy waits its turn (first come, first served). Physics
+# comes from AllFunctions and is applied when something happens: a trailer
+# boils off between events (venting at its relief pressure), a station
+# delivers to its customers at `demand` kg/s between offloads.
 
 class EventType(enum.Enum):
     DELAY = "Delay"
@@ -10,93 +30,548 @@ class EventType(enum.Enum):
 
 @dataclass
 class Station:
-    volume: float
-    max_pressure: float
-    min_pressure: float
-    current_mass: float = 0
-    current_pressure: float = 0
-    dp_vs_mass_function: Callable[[float], float] = lambda x: x  # Placeholder
+    volume: float = 13.33  # m^3
+    max_pressure: float = 400000  # Pa, limit of the rising-pressure offload
+    vent_pressure: float = 360000  # Pa, vented down to this after an offload above it
+    max_mass: float = 800  # kg
+    max_fill_fraction: float = 0.95
+    current_mass: float = 100  # kg
+    current_pressure: float = 250000  # Pa
+    demand: float = 0.0  # kg/s delivered to customers
+    received: float = 0.0  # kg, totals over the run
+    vented: float = 0.0
+    dispensed: float = 0.0
+    last_update: float = 0.0  # s
 
 @dataclass
 class Trailer:
-    volume: float
-    max_pressure: float
-    min_pressure: float
-    current_mass: float = 0
-    current_pressure: float = 0
-    dp_vs_mass_function: Callable[[float], float] = lambda x: x  # Placeholder
+    # AllFunctions models the 32 m^3 trailer; the volume is passed where the
+    # process functions take one
+    volume: float = 32.0  # m^3
+    max_pressure: float = 1204514.0  # Pa, relief setting
+    fill_pressure: float = 131000  # Pa, vented down to this before a fill
+    max_mass: float = 2100  # kg, filled up to this
+    current_mass: float = 2100  # kg
+    current_pressure: float = 160000  # Pa
+    delivered: float = 0.0  # kg, totals over the run
+    filled: float = 0.0
+    vented: float = 0.0
+    waited: float = 0.0  # s spent queuing for a station or plant bay
+    last_update: float = 0.0  # s
+
+@dataclass
+class Plant:
+    bays: int = 1  # trailers filled at the same time
 
 @dataclass
 class Event:
     type: EventType
-    duration: float
+    duration: float  # s
     target: str = ""  # For OFFLOAD and FILL events
 
 @dataclass
 class SimulationState:
     time: float
-    trailer: Trailer
+    trailers: Dict[str, Trailer]
     stations: Dict[str, Station]
-    temperature: float
-
-def simulate_lh2_refill(events: List[Event], trailer: Trailer, stations: Dict[str, Station], initial_temperature: float) -> List[SimulationState]:
-    state = SimulationState(time=0, trailer=trailer, stations=stations, temperature=initial_temperature)
-    log = [state]
-
-    for event in events:
-        if event.type == EventType.DELAY:
-            state.time += event.duration
-        elif event.type == EventType.TRAVEL:
-            state.time += event.duration
-            # You might want to add some fuel consumption or other effects here
-        elif event.type == EventType.OFFLOAD:
-            station = state.stations[event.target]
-            # Implement offloading logic here
-            # Update trailer and station properties
+    trailer: str = ""  # the trailer whose event just finished
+    event: Optional[Event] = None
+
+class FleetView:
+    # Per-entity access into a FleetState; subclasses made by _view_class add
+    # one property per field
+    __slots__ = ("_columns", "_id")
+
+    def __init__(self, columns, id):
+        self._columns = columns
+        self._id = id
+
+    def _asdict(self):
+        return {name: float(column[self._id]) for name, column in self._columns.items()}
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={value!r}" for name, value in self._asdict().items())
+        return f"{type(self).__name__}({values})"
+
+_view_classes = {}
+
+def _view_class(kind):
+    if kind not in _view_classes:
+        def column(name):
+            def get(self):
+                return float(self._columns[name][self._id])
+            def set(self, value):
+                self._columns[name][self._id] = value
+            return property(get, set)
+        namespace = {f.name: column(f.name) for f in fields(kind)}
+        namespace["__slots__"] = ()
+        _view_classes[kind] = type(kind.__name__ + "View", (FleetView,), namespace)
+    return _view_classes[kind]
+
+class FleetState:
+    """Struct-of-arrays state for many trailers or stations.
+
+    Holds one float NumPy array per field of ``kind`` (Trailer or Station),
+    indexed by entity id in the order of ``names``; fields not given take
+    the dataclass default. ``fleet.current_mass`` is the whole column and
+    ``fleet[name]`` a slotted view that reads and writes it, so a fleet can
+    stand in for the dict of dataclasses in the physics functions and the
+    engine, while age_trailers and age_stations update every entity in one
+    batch.
+    """
+
+    def __init__(self, kind, names, **columns):
+        self.kind = kind
+        self.names = list(names)
+        self.index = {name: id for id, name in enumerate(self.names)}
+        defaults = kind()
+        self.columns = {}
+        for f in fields(kind):
+            value = columns.pop(f.name, getattr(defaults, f.name))
+            self.columns[f.name] = np.array(np.broadcast_to(np.asarray(value, dtype=float), len(self.names)))
+        if columns:
+            raise TypeError(f"{kind.__name__} has no field {next(iter(columns))!r}")
+        view = _view_class(kind)
+        self._views = [view(self.columns, id) for id in range(len(self.names))]
+
+    @classmethod
+    def from_entities(cls, entities: Dict):
+        kinds = {type(entity) for entity in entities.values()}
+        if len(kinds) != 1:
+            raise TypeError("A fleet holds entities of one kind")
+        kind = kinds.pop()
+        return cls(kind, entities, **{f.name: [getattr(entity, f.name) for entity in entities.values()]
+                                      for f in fields(kind)})
+
+    def to_entities(self) -> Dict:
+        return {name: self.kind(**view._asdict()) for name, view in zip(self.names, self._views)}
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get("columns", {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def view(self, id):
+        return self._views[id]
+
+    def __getitem__(self, name):
+        return self._views[self.index[name]]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def values(self):
+        return list(self._views)
+
+    def items(self):
+        return list(zip(self.names, self._views))
+
+    def temperatures(self):
+        return get_backend().calc_array("PD", "T", self.columns["current_pressure"],
+                                        self.columns["current_mass"] / self.columns["volume"])[0]
+
+class StateLog:
+    """Log of the simulation state after every event, stored as deltas.
+
+    Entries are grouped in chunks of ``chunk_size``. Each chunk starts with a
+    keyframe (every field of every trailer and station) and then keeps, per
+    event, only the fields that changed. ``log[i]`` and ``log.state_at(t)``
+    rebuild a SimulationState from the nearest keyframe, so random access
+    costs at most one chunk of deltas; iterating applies the deltas in
+    order. With ``path`` every full chunk is written to that file as one
+    JSON line and dropped from memory, leaving only the event times and
+    file offsets; ``close()`` writes the last, partial chunk.
+    """
+
+    GROUPS = {"trailers": Trailer, "stations": Station}
+
+    def __init__(self, chunk_size: int = 256, path: Optional[str] = None):
+        self.chunk_size = chunk_size
+        self.path = path
+        self.times = array("d")
+        self._chunks = []  # chunk dicts, or file offsets once written
+        self._open = None
+        self._last = {}  # "group/name" -> fields as of the latest entry
+        self._writer = None
+        self._reader = None
+        self._cached = (None, None)
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, time, trailers, stations, trailer="", event=None):
+        delta = {}
+        last = self._last
+        for group, entities in (("trailers", trailers), ("stations", stations)):
+            for name, entity in entities.items():
+                key = f"{group}/{name}"
+                values = entity._asdict() if isinstance(entity, FleetView) else vars(entity)
+                previous = last.get(key)
+                if previous is None:
+                    changed = dict(values)
+                else:
+                    changed = {f: v for f, v in values.items() if previous[f] != v}
+                if changed:
+                    delta[key] = changed
+                    last[key] = dict(values)
+        if self._open is None or len(self._open["entries"]) == self.chunk_size:
+            self._seal()
+            self._open = {"keyframe": {key: dict(fields) for key, fields in last.items()}, "entries": []}
+            delta = {}
+        event = None if event is None else [event.type.name, event.duration, event.target]
+        self._open["entries"].append([time, trailer, event, delta])
+        self.times.append(time)
+
+    def _seal(self):
+        # Store the open chunk: in memory, or on disk when streaming
+        if self._open is None:
+            return
+        if self.path is not None:
+            if self._writer is None:
+                self._writer = open(self.path, "wb")
+            self._chunks.append(self._writer.tell())
+            self._writer.write(json.dumps(self._open).encode() + b"\n")
+            self._writer.flush()
+        else:
+            self._chunks.append(self._open)
+        self._open = None
+
+    def close(self):
+        self._seal()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _chunk(self, number):
+        if number == len(self._chunks):
+            return self._open
+        chunk = self._chunks[number]
+        if not isinstance(chunk, int):
+            return chunk
+        if self._cached[0] != number:
+            if self._reader is None:
+                if self._writer is not None:
+                    self._writer.flush()
+                self._reader = open(self.path, "rb")
+            self._reader.seek(chunk)
+            self._cached = (number, json.loads(self._reader.readline()))
+        return self._cached[1]
+
+    def _state(self, fields, entry):
+        time, trailer, event, _ = entry
+        entities = {group: {} for group in self.GROUPS}
+        for key, values in fields.items():
+            group, name = key.split("/", 1)
+            entities[group][name] = self.GROUPS[group](**values)
+        if event is not None:
+            event = Event(EventType[event[0]], event[1], event[2])
+        return SimulationState(time=time, trailers=entities["trailers"], stations=entities["stations"],
+                               trailer=trailer, event=event)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("state log index out of range")
+        chunk = self._chunk(index // self.chunk_size)
+        fields = {key: dict(values) for key, values in chunk["keyframe"].items()}
+        entries = chunk["entries"]
+        for entry in entries[1:index % self.chunk_size + 1]:
+            for key, changed in entry[3].items():
+                fields.setdefault(key, {}).update(changed)
+        return self._state(fields, entries[index % self.chunk_size])
+
+    def state_at(self, time):
+        # The state after the last event that finished at or before `time`
+        index = bisect_right(self.times, time) - 1
+        if index < 0:
+            raise IndexError(f"no event finished by {time}")
+        return self[index]
+
+    def __iter__(self):
+        for number in range(len(self._chunks) + (self._open is not None)):
+            chunk = self._chunk(number)
+            fields = {key: dict(values) for key, values in chunk["keyframe"].items()}
+            for n, entry in enumerate(chunk["entries"]):
+                if n:
+                    for key, changed in entry[3].items():
+                        fields.setdefault(key, {}).update(changed)
+                yield self._state(fields, entry)
+
+def age_trailer(trailer: Trailer, time: float):
+    # Boil-off since the trailer's last update, venting at the relief pressure
+    dt = time - trailer.last_update
+    if dt > 0:
+        pressure, _ = boil_over_time(trailer.current_mass, trailer.current_pressure, dt)
+        if pressure > trailer.max_pressure:
+            trailer.current_mass, vented, _, _ = vent_trailer(trailer.current_mass, pressure, trailer.max_pressure)
+            trailer.vented += vented
+            pressure = trailer.max_pressure
+        trailer.current_pressure = pressure
+    trailer.last_update = time
+
+def age_trailers(fleet: FleetState, time: float):
+    # age_trailer for every trailer of the fleet in one batch
+    columns = fleet.columns
+    dt = time - columns["last_update"]
+    boiling = np.flatnonzero(dt > 0)
+    if boiling.size:
+        mass = columns["current_mass"][boiling]
+        pressure, _ = boil_over_time_batch(mass, columns["current_pressure"][boiling], dt[boiling])
+        limit = columns["max_pressure"][boiling]
+        relief = pressure > limit
+        if relief.any():
+            columns["current_mass"][boiling[relief]], vented, _, _ = vent_trailer_batch(
+                mass[relief], pressure[relief], limit[relief])
+            columns["vented"][boiling[relief]] += vented
+            pressure = np.where(relief, limit, pressure)
+        columns["current_pressure"][boiling] = pressure
+    columns["last_update"][:] = time
+
+def age_station(station: Station, time: float):
+    # Customer demand since the station's last update, down to vapor only
+    dt = time - station.last_update
+    if dt > 0 and station.demand > 0:
+        rho_vapor = get_backend().calc("PQ", "DVAP", station.current_pressure, 0)[0]
+        drawn = min(station.demand * dt, max(0.0, station.current_mass - station.volume * rho_vapor))
+        station.current_mass -= drawn
+        station.dispensed += drawn
+    station.last_update = time
+
+def age_stations(fleet: FleetState, time: float):
+    # age_station for every station of the fleet in one batch
+    columns = fleet.columns
+    dt = time - columns["last_update"]
+    drawing = np.flatnonzero((dt > 0) & (columns["demand"] > 0))
+    if drawing.size:
+        mass = columns["current_mass"][drawing]
+        rho_vapor = get_backend().calc_array("PQ", "DVAP", columns["current_pressure"][drawing], 0)[0]
+        drawn = np.minimum(columns["demand"][drawing] * dt[drawing],
+                           np.maximum(0.0, mass - columns["volume"][drawing] * rho_vapor))
+        columns["current_mass"][drawing] = mass - drawn
+        columns["dispensed"][drawing] += drawn
+    columns["last_update"][:] = time
+
+def offload(trailer: Trailer, station: Station):
+    # One station stop as in ParametricStudy.run_station_leg: bring the
+    # trailer to station pressure, offload with rising pressure, vent the
+    # station if needed and top it up at constant pressure
+    station_mass_initial = station.current_mass
+    pressure = station.current_pressure
+    pressure, station_mass, trailer_mass = offload_with_raising_pressure(
+        pressure, pressure, trailer.current_mass, station_mass_initial, station.volume, station.max_mass,
+        station.max_pressure, trailer.max_pressure, trailer.volume)
+    if pressure > station.vent_pressure:
+        station_mass, vented, _, _ = vent_trailer(station_mass, pressure, station.vent_pressure)
+        station.vented += vented
+        pressure = station.vent_pressure
+    station_max_mass = station.volume * get_backend().calc("PQ", "D", pressure, 0)[0] * station.max_fill_fraction
+    if station_mass < station_max_mass:
+        _, gas_vented, trailer_mass, station_mass, _ = offload_const_pressure(
+            trailer_mass, station_mass, pressure, station.volume, station.max_fill_fraction)
+        station.vented += gas_vented
+    station.received += station_mass - station_mass_initial
+    trailer.delivered += trailer.current_mass - trailer_mass
+    station.current_mass, station.current_pressure = station_mass, pressure
+    trailer.current_mass, trailer.current_pressure = trailer_mass, pressure
+
+def fill(trailer: Trailer):
+    # Vent to fill pressure, then fill up to the trailer's capacity
+    if trailer.current_pressure > trailer.fill_pressure:
+        trailer.current_mass, vented, _, _ = vent_trailer(trailer.current_mass, trailer.current_pressure,
+                                                          trailer.fill_pressure)
+        trailer.vented += vented
+        trailer.current_pressure = trailer.fill_pressure
+    change_mass, _, _ = fill_trailer_const_pressure(trailer.current_mass, trailer.max_mass,
+                                                    trailer.current_pressure, trailer.volume)
+    trailer.current_mass += change_mass
+    trailer.filled += change_mass
+
+class Simulation:
+    """Priority-queue scheduler for trailers running their routes concurrently.
+
+    ``routes`` maps each trailer name to its list of events; with
+    ``repeat=True`` a trailer starts its route over when it is done, so the
+    run needs an ``until`` time. OFFLOAD targets a station and FILL a plant,
+    each holding one trailer at a time (a plant ``bays`` at a time) for the
+    event's duration; the physics of the transfer is applied when the
+    trailer gets its turn. The state after each event goes to ``log``, a
+    StateLog. ``trailers`` and ``stations`` may be FleetStates, which are
+    brought to the end time in one batch.
+    """
+
+    START, FINISH = 0, 1
+
+    def __init__(self, trailers: Dict[str, Trailer], stations: Dict[str, Station], routes: Dict[str, List[Event]],
+                 plants: Optional[Dict[str, Plant]] = None, repeat: bool = False, log: Optional[StateLog] = None):
+        self.trailers = trailers
+        self.stations = stations
+        self.plants = plants if plants is not None else {}
+        self.routes = routes
+        self.repeat = repeat
+        self.time = 0.0
+        self.log = log if log is not None else StateLog()
+        self._queue = []
+        self._seq = 0
+        self._position = {name: 0 for name in routes}
+        self._busy = {}  # resource -> trailers holding it
+        self._waiting = {}  # resource -> trailers queued, in arrival order
+        for name in routes:
+            self._schedule(0.0, self.START, name)
+
+    def _schedule(self, time, action, name):
+        # The sequence number keeps same-time entries in scheduling order
+        heapq.heappush(self._queue, (time, self._seq, action, name))
+        self._seq += 1
+
+    def _event(self, name):
+        route = self.routes[name]
+        position = self._position[name]
+        if position >= len(route):
+            if not self.repeat or not route:
+                return None
+            position = self._position[name] = 0
+        return route[position]
+
+    def _resource(self, event):
+        if event.type == EventType.OFFLOAD:
+            if event.target not in self.stations:
+                raise KeyError(f"OFFLOAD to unknown station {event.target!r}")
+            return ("station", event.target), 1
+        if event.type == EventType.FILL:
+            if event.target not in self.plants:
+                raise KeyError(f"FILL at unknown plant {event.target!r}")
+            return ("plant", event.target), self.plants[event.target].bays
+        return None, 0
+
+    def _start(self, name, arrived):
+        event = self._event(name)
+        if event is None:
+            return
+        resource, capacity = self._resource(event)
+        if resource is not None:
+            holders = self._busy.setdefault(resource, [])
+            if len(holders) >= capacity:
+                self._waiting.setdefault(resource, []).append((name, arrived))
+                return
+            holders.append(name)
+        trailer = self.trailers[name]
+        trailer.waited += self.time - arrived
+        age_trailer(trailer, self.time)
+        if event.type == EventType.OFFLOAD:
+            station = self.stations[event.target]
+            age_station(station, self.time)
+            offload(trailer, station)
         elif event.type == EventType.FILL:
-            # Implement filling logic here
-            # Update trailer properties
+            fill(trailer)
+        debug("{time:.0f} s: {trailer} starts {event} {target}", time=self.time, trailer=name,
+              event=event.type.value, target=event.target)
+        self._schedule(self.time + event.duration, self.FINISH, name)
 
-        # Update temperature (simplified thermal model)
-        # In the final version, you'd implement a more complex thermal model here
+    def _finish(self, name):
+        event = self._event(name)
+        trailer = self.trailers[name]
+        # Boil-off over a delay or trip is applied when it ends
+        age_trailer(trailer, self.time)
+        resource, _ = self._resource(event)
+        if resource is not None:
+            self._busy[resource].remove(name)
+            waiting = self._waiting.get(resource)
+            if waiting:
+                self._start(*waiting.pop(0))
+        self.log.append(self.time, self.trailers, self.stations, name, event)
+        self._position[name] += 1
+        self._start(name, self.time)
 
-        # Log the new state
-        log.append(SimulationState(
-            time=state.time,
-            trailer=Trailer(**vars(state.trailer)),
-            stations={name: Station(**vars(station)) for name, station in state.stations.items()},
-            temperature=state.temperature
-        ))
+    def run(self, until: float = math.inf) -> StateLog:
+        if self.repeat and math.isinf(until):
+            raise ValueError("Repeating routes need a finite `until` time")
+        while self._queue and self._queue[0][0] <= until:
+            self.time, _, action, name = heapq.heappop(self._queue)
+            if action == self.START:
+                self._start(name, self.time)
+            else:
+                self._finish(name)
+        if not math.isinf(until):
+            # Bring everything to the end time
+            self.time = until
+            if isinstance(self.trailers, FleetState):
+                age_trailers(self.trailers, until)
+            else:
+                for trailer in self.trailers.values():
+                    if trailer.last_update < until:
+                        age_trailer(trailer, until)
+            if isinstance(self.stations, FleetState):
+                age_stations(self.stations, until)
+            else:
+                for station in self.stations.values():
+                    age_station(station, until)
+        return self.log
 
+def simulate_lh2_refill(routes: Dict[str, List[Event]], trailers: Dict[str, Trailer], stations: Dict[str, Station],
+                        plants: Optional[Dict[str, Plant]] = None, until: float = math.inf,
+                        repeat: bool = False, log_path: Optional[str] = None, chunk_size: int = 256) -> StateLog:
+    # With log_path the state log streams to that file as it grows
+    log = StateLog(chunk_size, log_path)
+    Simulation(trailers, stations, routes, plants, repeat, log).run(until)
+    log.close()
     return log
 
 def main():
-    # Define initial conditions
-    trailer = Trailer(volume=100, max_pressure=10, min_pressure=1)
+    hour, day = 3600.0, 24 * 3600.0
+
+    # Two trailers serving three stations from one plant for two weeks
+    trailers = {"T1": Trailer(), "T2": Trailer(current_mass=1500, current_pressure=140000)}
     stations = {
-        "Station1": Station(volume=500, max_pressure=8, min_pressure=2),
-        "Plant": Station(volume=1000, max_pressure=15, min_pressure=5)
+        "Station1": Station(demand=300 / day),
+        "Station2": Station(current_mass=200, demand=250 / day),
+        "Station3": Station(current_mass=150, current_pressure=300000, demand=200 / day),
+    }
+    plants = {"Plant": Plant(bays=1)}
+    routes = {
+        "T1": [
+            Event(EventType.TRAVEL, 6 * hour),
+            Event(EventType.OFFLOAD, 2 * hour, "Station1"),
+            Event(EventType.TRAVEL, 2 * hour),
+            Event(EventType.OFFLOAD, 2 * hour, "Station2"),
+            Event(EventType.TRAVEL, 8 * hour),
+            Event(EventType.FILL, 3 * hour, "Plant"),
+            Event(EventType.DELAY, 1 * day),
+        ],
+        "T2": [
+            Event(EventType.DELAY, 12 * hour),
+            Event(EventType.TRAVEL, 5 * hour),
+            Event(EventType.OFFLOAD, 2 * hour, "Station3"),
+            Event(EventType.TRAVEL, 3 * hour),
+            Event(EventType.OFFLOAD, 2 * hour, "Station1"),
+            Event(EventType.TRAVEL, 6 * hour),
+            Event(EventType.FILL, 3 * hour, "Plant"),
+        ],
     }
-    initial_temperature = 20  # Celsius
-
-    # Define events
-    events = [
-        Event(type=EventType.FILL, duration=2, target="Plant"),
-        Event(type=EventType.TRAVEL, duration=5),
-        Event(type=EventType.OFFLOAD, duration=1, target="Station1"),
-        Event(type=EventType.TRAVEL, duration=5),
-        Event(type=EventType.FILL, duration=2, target="Plant"),
-    ]
 
     # Run simulation
-    simulation_log = simulate_lh2_refill(events, trailer, stations, initial_temperature)
-
-    # Print results (you can modify this to suit your needs)
-    for state in simulation_log:
-        print(f"Time: {state.time}, Trailer Mass: {state.trailer.current_mass}, Temperature: {state.temperature}")
-        for name, station in state.stations.items():
-            print(f"  {name} Mass: {station.current_mass}")
-        print()
+    log = simulate_lh2_refill(routes, trailers, stations, plants, until=14 * day, repeat=True)
+
+    info("{count} events in {days:.0f} days", count=len(log), days=14)
+    for name, trailer in trailers.items():
+        info("{name}: delivered {delivered:.1f} kg, filled {filled:.1f} kg, vented {vented:.1f} kg, waited {waited:.1f} h",
+             name=name, delivered=trailer.delivered, filled=trailer.filled, vented=trailer.vented,
+             waited=trailer.waited / hour)
+    for name, station in stations.items():
+        info("{name}: received {received:.1f} kg, dispensed {dispensed:.1f} kg, vented {vented:.1f} kg, "
+             "now {mass:.1f} kg at {pressure:.0f} Pa", name=name, received=station.received,
+             dispensed=station.dispensed, vented=station.vented, mass=station.current_mass,
+             pressure=station.current_pressure)
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,9 @@
 #onefullcycle.py
-import os
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
 from AllFunctions import (boil_to_pressure, offload_with_raising_pressure, 
                           offload_const_pressure, boil_over_time, vent_trailer, 
                           fill_trailer_const_pressure)
-
-# Initialize REFPROP
-RP = REFPROPFunctionLibrary(os.environ['RPPREFIX'])
-RP.SETPATHdll(os.environ['RPPREFIX'])
-MASS_BASE_SI = RP.GETENUMdll(0, "MASS BASE SI").iEnum
+from properties import cache_stats, get_backend, profile_phase, profile_report
+from tracing import info
 
 # Constants and initial conditions
 trailer_volume = 32.0  # m^3
@@ -27,85 +22,103 @@ trailer_mass_initial = 2100 #kg
 trailer_pressure_initial = 160000 # 
 m_station_max = 870.0 * station_max_fill_fraction 
 
-print("Starting H2 Trailer Cycle Simulation")
+info("Starting H2 Trailer Cycle Simulation")
 
 # Step 1: Heat up to station pressure
-print("\n1. Heating trailer to station pressure")
-target_pressure = station_pressure_initial
-final_enthalpy, time_duration = boil_to_pressure(trailer_mass_initial, trailer_pressure_initial, target_pressure)
-print(f"Heated to: Pressure = {target_pressure:.2f} Pa, Time taken = {time_duration:.2f} seconds")
-print(f"Final trailer mass: {trailer_mass_initial:.2f} kg")
-print(f"Final station mass: {station_mass_initial:.2f} kg")
-print(f"Final trailer pressure: {target_pressure:.2f} Pa")
-print(f"Final station pressure: {station_pressure_initial:.2f} Pa")
+with profile_phase("1. Heat to station pressure"):
+    info("\n1. Heating trailer to station pressure")
+    target_pressure = station_pressure_initial
+    final_enthalpy, time_duration = boil_to_pressure(trailer_mass_initial, trailer_pressure_initial, target_pressure)
+    info("Heated to: Pressure = {target_pressure:.2f} Pa, Time taken = {time_duration:.2f} seconds",
+         target_pressure=target_pressure, time_duration=time_duration)
+    info("Final trailer mass: {trailer_mass_initial:.2f} kg", trailer_mass_initial=trailer_mass_initial)
+    info("Final station mass: {station_mass_initial:.2f} kg", station_mass_initial=station_mass_initial)
+    info("Final trailer pressure: {target_pressure:.2f} Pa", target_pressure=target_pressure)
+    info("Final station pressure: {station_pressure_initial:.2f} Pa", station_pressure_initial=station_pressure_initial)
 
 # Step 2: Offload with rising pressure up to 2.5 atm
-print("\n2. Offloading with rising pressure up to 2.5 atm")
-final_pressure, final_station_mass, final_trailer_mass = offload_with_raising_pressure(
-    target_pressure, station_pressure_initial, trailer_mass_initial, station_mass_initial, station_volume, m_station_max, offload_pressure, trailer_pressure_max, trailer_volume
-)
-print(f"After rising pressure offload: Station mass = {final_station_mass:.2f} kg, Trailer mass = {final_trailer_mass:.2f} kg")
-print(f"Final trailer mass: {final_trailer_mass:.2f} kg")
-print(f"Final station mass: {final_station_mass:.2f} kg")
-print(f"Final trailer pressure: {final_pressure:.2f} Pa")
-print(f"Final station pressure: {final_pressure:.2f} Pa")
-
-# Calculate station maximum mass
-station_max_mass = station_volume * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, offload_pressure, 0, [1.0]).Output[0] * station_max_fill_fraction
+with profile_phase("2. Offload with rising pressure"):
+    info("\n2. Offloading with rising pressure up to 2.5 atm")
+    final_pressure, final_station_mass, final_trailer_mass = offload_with_raising_pressure(
+        target_pressure, station_pressure_initial, trailer_mass_initial, station_mass_initial, station_volume, m_station_max, offload_pressure, trailer_pressure_max, trailer_volume
+    )
+    info("After rising pressure offload: Station mass = {final_station_mass:.2f} kg, Trailer mass = {final_trailer_mass:.2f} kg",
+         final_station_mass=final_station_mass, final_trailer_mass=final_trailer_mass)
+    info("Final trailer mass: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
+    info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    info("Final trailer pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
+    info("Final station pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
 
 # Step 3: Offload with constant pressure at 2.5 atm (if station is not full)
-if final_station_mass < station_max_mass:
-    print("\n3. Offloading with constant pressure at 2.5 atm")
-    mass_transfer, gas_vented, final_trailer_mass, final_station_mass, energy_transferred = offload_const_pressure(
-        final_trailer_mass, final_station_mass, offload_pressure, station_volume, station_max_fill_fraction
-    )
-    print(f"After constant pressure offload: Station mass = {final_station_mass:.2f} kg, Trailer mass = {final_trailer_mass:.2f} kg")
-    print(f"Mass transferred: {mass_transfer:.2f} kg")
-    print(f"Gas vented: {gas_vented:.2f} kg")
-    print(f"Energy transferred: {energy_transferred:.2f} J")
-    print(f"Final trailer mass: {final_trailer_mass:.2f} kg")
-    print(f"Final station mass: {final_station_mass:.2f} kg")
-    print(f"Final trailer pressure: {offload_pressure:.2f} Pa")
-    print(f"Final station pressure: {offload_pressure:.2f} Pa")
-else:
-    print("\n3. Skipping constant pressure offload - station is already full")
-    print(f"Final trailer mass: {final_trailer_mass:.2f} kg")
-    print(f"Final station mass: {final_station_mass:.2f} kg")
-    print(f"Final trailer pressure: {final_pressure:.2f} Pa")
-    print(f"Final station pressure: {final_pressure:.2f} Pa")
+with profile_phase("3. Offload at constant pressure"):
+    # Calculate station maximum mass
+    station_max_mass = station_volume * get_backend().calc("PQ", "D", offload_pressure, 0)[0] * station_max_fill_fraction
+    if final_station_mass < station_max_mass:
+        info("\n3. Offloading with constant pressure at 2.5 atm")
+        mass_transfer, gas_vented, final_trailer_mass, final_station_mass, energy_transferred = offload_const_pressure(
+            final_trailer_mass, final_station_mass, offload_pressure, station_volume, station_max_fill_fraction
+        )
+        info("After constant pressure offload: Station mass = {final_station_mass:.2f} kg, Trailer mass = {final_trailer_mass:.2f} kg",
+             final_station_mass=final_station_mass, final_trailer_mass=final_trailer_mass)
+        info("Mass transferred: {mass_transfer:.2f} kg", mass_transfer=mass_transfer)
+        info("Gas vented: {gas_vented:.2f} kg", gas_vented=gas_vented)
+        info("Energy transferred: {energy_transferred:.2f} J", energy_transferred=energy_transferred)
+        info("Final trailer mass: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
+        info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+        info("Final trailer pressure: {offload_pressure:.2f} Pa", offload_pressure=offload_pressure)
+        info("Final station pressure: {offload_pressure:.2f} Pa", offload_pressure=offload_pressure)
+    else:
+        info("\n3. Skipping constant pressure offload - station is already full")
+        info("Final trailer mass: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
+        info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+        info("Final trailer pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
+        info("Final station pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
 
 # Step 4: Delay boil over 1 day transportation
-print("\n4. Boiling over 1 day transportation")
-pressure_after_transport, quality_final = boil_over_time(final_trailer_mass, final_pressure, time_transportation)
-print(f"After transport: Pressure = {pressure_after_transport:.2f} Pa, Quality = {quality_final:.2f}")
-print(f"Final trailer mass: {final_trailer_mass:.2f} kg")
-print(f"Final station mass: {final_station_mass:.2f} kg")
-print(f"Final trailer pressure: {pressure_after_transport:.2f} Pa")
-print(f"Final station pressure: {final_pressure:.2f} Pa")
+with profile_phase("4. Boil over during transport"):
+    info("\n4. Boiling over 1 day transportation")
+    pressure_after_transport, quality_final = boil_over_time(final_trailer_mass, final_pressure, time_transportation)
+    info("After transport: Pressure = {pressure_after_transport:.2f} Pa, Quality = {quality_final:.2f}",
+         pressure_after_transport=pressure_after_transport, quality_final=quality_final)
+    info("Final trailer mass: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
+    info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    info("Final trailer pressure: {pressure_after_transport:.2f} Pa", pressure_after_transport=pressure_after_transport)
+    info("Final station pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
 
 # Step 5: Venting before filling the trailer
-print("\n5. Venting trailer before filling")
-mass_after_vent, mass_vented, _, _ = vent_trailer(final_trailer_mass, pressure_after_transport, trailer_pressure_fill)  
-print(f"After venting: Mass vented = {mass_vented:.2f} kg, Pressure = {trailer_pressure_fill:.2f} Pa")
-print(f"Final trailer mass: {mass_after_vent:.2f} kg")
-print(f"Final station mass: {final_station_mass:.2f} kg")
-print(f"Final trailer pressure: {trailer_pressure_fill:.2f} Pa")
-print(f"Final station pressure: {final_pressure:.2f} Pa")
+with profile_phase("5. Vent trailer"):
+    info("\n5. Venting trailer before filling")
+    mass_after_vent, mass_vented, _, _ = vent_trailer(final_trailer_mass, pressure_after_transport, trailer_pressure_fill)  
+    info("After venting: Mass vented = {mass_vented:.2f} kg, Pressure = {trailer_pressure_fill:.2f} Pa",
+         mass_vented=mass_vented, trailer_pressure_fill=trailer_pressure_fill)
+    info("Final trailer mass: {mass_after_vent:.2f} kg", mass_after_vent=mass_after_vent)
+    info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    info("Final trailer pressure: {trailer_pressure_fill:.2f} Pa", trailer_pressure_fill=trailer_pressure_fill)
+    info("Final station pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
 
 # Step 6: Fill the trailer
-print("\n6. Filling the trailer")
-mass_change, mass_liq_added, mass_gas_added = fill_trailer_const_pressure(mass_after_vent, trailer_mass_max, trailer_pressure_fill, trailer_volume)
-mass_after_fill = mass_after_vent + mass_change
-print(f"After filling: Mass = {mass_after_fill:.2f} kg, Pressure = {trailer_pressure_fill:.2f} Pa")
-print(f"Final trailer mass: {mass_after_fill:.2f} kg")
-print(f"Final station mass: {final_station_mass:.2f} kg")
-print(f"Final trailer pressure: {trailer_pressure_fill:.2f} Pa")
-print(f"Final station pressure: {final_pressure:.2f} Pa")
+with profile_phase("6. Fill trailer"):
+    info("\n6. Filling the trailer")
+    mass_change, mass_liq_added, mass_gas_added = fill_trailer_const_pressure(mass_after_vent, trailer_mass_max, trailer_pressure_fill, trailer_volume)
+    mass_after_fill = mass_after_vent + mass_change
+    info("After filling: Mass = {mass_after_fill:.2f} kg, Pressure = {trailer_pressure_fill:.2f} Pa",
+         mass_after_fill=mass_after_fill, trailer_pressure_fill=trailer_pressure_fill)
+    info("Final trailer mass: {mass_after_fill:.2f} kg", mass_after_fill=mass_after_fill)
+    info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    info("Final trailer pressure: {trailer_pressure_fill:.2f} Pa", trailer_pressure_fill=trailer_pressure_fill)
+    info("Final station pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
+
+info("\nH2 Trailer Cycle Simulation Complete")
+info("Mass received at station: {received:.2f} kg", received=final_station_mass - station_mass_initial)
+info("Mass lost (venting): {mass_vented:.2f} kg", mass_vented=mass_vented)
+info("Final trailer mass: {mass_after_fill:.2f} kg", mass_after_fill=mass_after_fill)
+info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+info("Final trailer pressure: {trailer_pressure_fill:.2f} Pa", trailer_pressure_fill=trailer_pressure_fill)
+info("Final station pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
 
-print("\nH2 Trailer Cycle Simulation Complete")
-print(f"Mass received at station: {final_station_mass - station_mass_initial:.2f} kg")
-print(f"Mass lost (venting): {mass_vented:.2f} kg")
-print(f"Final trailer mass: {mass_after_fill:.2f} kg")
-print(f"Final station mass: {final_station_mass:.2f} kg")
-print(f"Final trailer pressure: {trailer_pressure_fill:.2f} Pa")
-print(f"Final station pressure: {final_pressure:.2f} Pa")
+stats = cache_stats()
+if stats is not None:
+    info("Property cache: {stats}", stats=stats)
+report = profile_report()
+if report is not None:
+    info("\nProperty calls by phase:\n{report}", report=report)
@@ -1,13 +1,11 @@
-import os
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
 from AllFunctions import (boil_to_pressure, offload_with_raising_pressure, 
                           offload_const_pressure, boil_over_time, vent_trailer, 
                           fill_trailer_const_pressure)
+from collections import namedtuple
 
-# Initialize REFPROP
-RP = REFPROPFunctionLibrary(os.environ['RPPREFIX'])
-RP.SETPATHdll(os.environ['RPPREFIX'])
-MASS_BASE_SI = RP.GETENUMdll(0, "MASS BASE SI").iEnum
+from properties import cache_stats, get_backend, profile_phase, profile_report, quantizer
+from sweep import LegCache, RouteTree, run_sweep
+from tracing import debug, info, warning
 
 # Constants
 TRAILER_VOLUME = 32.0  # m^3
@@ -21,116 +19,193 @@ STATION_MAX_PRESSURE = 400000  # Pa (3.0 barg)
 STATION_VENT_PRESSURE = STATION_MAX_PRESSURE * 0.9  # 90% of max pressure
 trailer_pressure_max = 1204514.0  # Pa (160 psig, 174.7 psia)
 STATION_MAX_FILL_FRACTION = 0.95
+LEG_QUANTIZE_BITS = 24  # legs whose inputs agree to ~6e-8 relative share a result
+OFFLOAD_METHOD = "adaptive"  # offload_with_raising_pressure method of the station legs
 
-def run_study(study_id, num_stations, station_mass_initial, station_pressure_initial):
-    print(f"\nRunning Study {study_id}")
-    print(f"Number of stations: {num_stations}")
-    print(f"Initial station mass: {station_mass_initial} kg")
-    print(f"Initial station pressure: {station_pressure_initial} Pa")
-    print(f"Initial trailer mass: {TRAILER_MASS_INITIAL} kg")
-    print(f"Initial trailer pressure: {TRAILER_PRESSURE_INITIAL} Pa")
+def run_station_leg(trailer_mass, trailer_pressure, station_mass_initial, station_pressure_initial,
+                    vent_pressure=None, max_fill_fraction=None, method=None):
+    # One station stop: heat the trailer to station pressure, offload with
+    # rising pressure, vent the station if needed and top it up at constant
+    # pressure. Returns (trailer_mass, trailer_pressure, mass_received, mass_vented).
+    # vent_pressure, max_fill_fraction and method default to
+    # STATION_VENT_PRESSURE, STATION_MAX_FILL_FRACTION and OFFLOAD_METHOD
+    vent_pressure = STATION_VENT_PRESSURE if vent_pressure is None else vent_pressure
+    max_fill_fraction = STATION_MAX_FILL_FRACTION if max_fill_fraction is None else max_fill_fraction
+    method = OFFLOAD_METHOD if method is None else method
+    debug("Trailer mass before offload: {trailer_mass:.2f} kg", trailer_mass=trailer_mass)
+    debug("Trailer pressure before offload: {trailer_pressure:.2f} Pa", trailer_pressure=trailer_pressure)
+    mass_vented = 0
 
-    total_mass_received = 0
-    total_mass_vented = 0
-    trailer_mass = TRAILER_MASS_INITIAL
-    trailer_pressure = TRAILER_PRESSURE_INITIAL
+    # Step 1: Heat up to station pressure
+    debug("Heating trailer from {trailer_pressure:.2f} Pa to {station_pressure_initial:.2f} Pa",
+          trailer_pressure=trailer_pressure, station_pressure_initial=station_pressure_initial)
+    final_enthalpy, time_duration = boil_to_pressure(trailer_mass, trailer_pressure, station_pressure_initial)
+    debug("Time to heat up: {time_duration:.2f} seconds", time_duration=time_duration)
+    debug("Final enthalpy after heating: {final_enthalpy:.2f} J/kg", final_enthalpy=final_enthalpy)
 
-    for station in range(num_stations):
-        print(f"\nOffloading to Station {station + 1}")
-        print(f"Trailer mass before offload: {trailer_mass:.2f} kg")
-        print(f"Trailer pressure before offload: {trailer_pressure:.2f} Pa")
-
-        # Step 1: Heat up to station pressure
-        print(f"Heating trailer from {trailer_pressure:.2f} Pa to {station_pressure_initial:.2f} Pa")
-        final_enthalpy, time_duration = boil_to_pressure(trailer_mass, trailer_pressure, station_pressure_initial)
-        print(f"Time to heat up: {time_duration:.2f} seconds")
-        print(f"Final enthalpy after heating: {final_enthalpy:.2f} J/kg")
-
-        # Update trailer pressure after heating
-        trailer_pressure = station_pressure_initial
-        print(f"Trailer pressure after heating: {trailer_pressure:.2f} Pa")
-
-        # Step 2: Offload with rising pressure
-        print("Starting offload with raising pressure")
-        final_pressure, final_station_mass, final_trailer_mass = offload_with_raising_pressure(
-            trailer_pressure, station_pressure_initial, trailer_mass, 
-            station_mass_initial, STATION_VOLUME, STATION_MAX_MASS, STATION_MAX_PRESSURE, trailer_pressure_max, TRAILER_VOLUME 
+    # Update trailer pressure after heating
+    trailer_pressure = station_pressure_initial
+    debug("Trailer pressure after heating: {trailer_pressure:.2f} Pa", trailer_pressure=trailer_pressure)
+
+    # Step 2: Offload with rising pressure
+    debug("Starting offload with raising pressure")
+    final_pressure, final_station_mass, final_trailer_mass = offload_with_raising_pressure(
+        trailer_pressure, station_pressure_initial, trailer_mass, 
+        station_mass_initial, STATION_VOLUME, STATION_MAX_MASS, STATION_MAX_PRESSURE, trailer_pressure_max, TRAILER_VOLUME,
+        method=method
+    )
+    debug("After raising pressure offload:")
+    debug("  Final pressure: {final_pressure:.2f} Pa", final_pressure=final_pressure)
+    debug("  Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    debug("  Final trailer mass: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
+    
+    if final_trailer_mass == trailer_mass:
+        warning("Warning: No mass was transferred during offload_with_raising_pressure")
+
+    # Step 3: Vent station if pressure reached STATION_MAX_PRESSURE
+    if final_pressure > vent_pressure:
+        debug("Station pressure {final_pressure:.2f} Pa reached max pressure. Venting station.",
+              final_pressure=final_pressure)
+        final_station_mass, mass_vented_station, _, _ = vent_trailer(final_station_mass, final_pressure, vent_pressure)
+        mass_vented += mass_vented_station
+        debug("Vented {mass_vented_station:.2f} kg from station", mass_vented_station=mass_vented_station)
+        debug("Station mass after venting: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+        final_pressure = vent_pressure
+        debug("Station pressure after venting: {final_pressure:.2f} Pa", final_pressure=final_pressure)
+
+    # Calculate station maximum mass
+    station_max_mass = STATION_VOLUME * get_backend().calc("PQ", "D", final_pressure, 0)[0] * max_fill_fraction
+
+    # Step 4: Offload with constant pressure (if station is not full)
+    if final_station_mass < station_max_mass:
+        debug("Starting offload with constant pressure")
+        mass_transfer, gas_vented, final_trailer_mass, final_station_mass, energy_added = offload_const_pressure(
+            final_trailer_mass, final_station_mass, final_pressure, 
+            STATION_VOLUME, max_fill_fraction
         )
-        print(f"After raising pressure offload:")
-        print(f"  Final pressure: {final_pressure:.2f} Pa")
-        print(f"  Final station mass: {final_station_mass:.2f} kg")
-        print(f"  Final trailer mass: {final_trailer_mass:.2f} kg")
-        
-        if final_trailer_mass == trailer_mass:
-            print("Warning: No mass was transferred during offload_with_raising_pressure")
-
-        # Step 3: Vent station if pressure reached STATION_MAX_PRESSURE
-        if final_pressure > STATION_VENT_PRESSURE:
-            print(f"Station pressure {final_pressure:.2f} Pa reached max pressure. Venting station.")
-            final_station_mass, mass_vented_station, _, _ = vent_trailer(final_station_mass, final_pressure, STATION_VENT_PRESSURE)
-            total_mass_vented += mass_vented_station
-            print(f"Vented {mass_vented_station:.2f} kg from station")
-            print(f"Station mass after venting: {final_station_mass:.2f} kg")
-            final_pressure = STATION_VENT_PRESSURE
-            print(f"Station pressure after venting: {final_pressure:.2f} Pa")
-
-        # Calculate station maximum mass
-        station_max_mass = STATION_VOLUME * RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, final_pressure, 0, [1.0]).Output[0] * STATION_MAX_FILL_FRACTION
-
-        # Step 4: Offload with constant pressure (if station is not full)
-        if final_station_mass < station_max_mass:
-            print("Starting offload with constant pressure")
-            mass_transfer, gas_vented, final_trailer_mass, final_station_mass, energy_added = offload_const_pressure(
-                final_trailer_mass, final_station_mass, final_pressure, 
-                STATION_VOLUME, STATION_MAX_FILL_FRACTION
-            )
-            print(f"Mass transferred during constant pressure: {mass_transfer:.2f} kg")
-            print(f"Gas vented during constant pressure: {gas_vented:.2f} kg")
-            print(f"Energy added during constant pressure: {energy_added:.2f} J")
-            
-            total_mass_vented += gas_vented
-        else:
-            print("Skipping constant pressure offload - station is already full")
+        debug("Mass transferred during constant pressure: {mass_transfer:.2f} kg", mass_transfer=mass_transfer)
+        debug("Gas vented during constant pressure: {gas_vented:.2f} kg", gas_vented=gas_vented)
+        debug("Energy added during constant pressure: {energy_added:.2f} J", energy_added=energy_added)
         
-        mass_received = final_station_mass - station_mass_initial
-        total_mass_received += mass_received
+        mass_vented += gas_vented
+    else:
+        debug("Skipping constant pressure offload - station is already full")
+    
+    mass_received = final_station_mass - station_mass_initial
 
-        print(f"Total mass transferred to station: {mass_received:.2f} kg")
-        print(f"Final station mass: {final_station_mass:.2f} kg")
-        print(f"Trailer mass after offload: {final_trailer_mass:.2f} kg")
-        
-        # Update for next iteration
-        trailer_mass = final_trailer_mass
-        trailer_pressure = final_pressure
+    debug("Total mass transferred to station: {mass_received:.2f} kg", mass_received=mass_received)
+    debug("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    debug("Trailer mass after offload: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
+
+    return final_trailer_mass, final_pressure, mass_received, mass_vented
+
+# A station leg as a hashable value: the quantized trailer state and station
+# inputs, plus the station configuration, the property backend (compared by
+# identity, so set_backend() starts new entries) and the offload method the
+# leg depends on
+Leg = namedtuple("Leg", ["trailer_mass", "trailer_pressure", "station_mass_initial", "station_pressure_initial", "station",
+                         "backend", "method"])
+
+def make_leg(trailer_mass, trailer_pressure, station_mass_initial, station_pressure_initial,
+             vent_pressure=None, max_fill_fraction=None, method=None):
+    quantize = quantizer(LEG_QUANTIZE_BITS)
+    station = (STATION_VOLUME, STATION_MAX_MASS, STATION_MAX_PRESSURE,
+               STATION_VENT_PRESSURE if vent_pressure is None else vent_pressure,
+               STATION_MAX_FILL_FRACTION if max_fill_fraction is None else max_fill_fraction,
+               trailer_pressure_max, TRAILER_VOLUME)
+    return Leg(quantize(trailer_mass), quantize(trailer_pressure), quantize(station_mass_initial),
+               quantize(station_pressure_initial), station, get_backend(), OFFLOAD_METHOD if method is None else method)
+
+# The leg is run on its quantized inputs, so a cached result does not depend
+# on which nearby state reached the cache first
+leg_cache = LegCache(lambda leg: run_station_leg(leg.trailer_mass, leg.trailer_pressure,
+                                                 leg.station_mass_initial, leg.station_pressure_initial,
+                                                 leg.station[3], leg.station[4], leg.method),
+                     name="ParametricStudy.leg_cache")
+
+def station_leg(trailer_mass, trailer_pressure, station_mass_initial, station_pressure_initial,
+                vent_pressure=None, max_fill_fraction=None, method=None):
+    # Cached run_station_leg
+    return leg_cache(make_leg(trailer_mass, trailer_pressure, station_mass_initial, station_pressure_initial,
+                              vent_pressure, max_fill_fraction, method))
+
+def run_return_trip(trailer_mass, trailer_pressure, fill_pressure=None):
+    # Boil-off on the way back, venting to fill pressure and refilling the
+    # trailer. Returns the mass vented from the trailer. fill_pressure
+    # defaults to TRAILER_PRESSURE_FILL
 
     # Step 5: Boil over during transportation
-    print(f"\nSimulating boil-over during transportation")
-    print(f"Initial trailer mass: {trailer_mass:.2f} kg")
-    print(f"Initial trailer pressure: {trailer_pressure:.2f} Pa")
+    debug("\nSimulating boil-over during transportation")
+    debug("Initial trailer mass: {trailer_mass:.2f} kg", trailer_mass=trailer_mass)
+    debug("Initial trailer pressure: {trailer_pressure:.2f} Pa", trailer_pressure=trailer_pressure)
     pressure_after_transport, quality_after_transport = boil_over_time(trailer_mass, trailer_pressure, TIME_TRANSPORTATION)
-    print(f"Pressure after transport: {pressure_after_transport:.2f} Pa")
+    debug("Pressure after transport: {pressure_after_transport:.2f} Pa",
+          pressure_after_transport=pressure_after_transport)
     # print(f"Quality after transport: {quality_after_transport:.4f}")
-    
+
+    return refill_trailer(trailer_mass, pressure_after_transport, fill_pressure)
+
+def refill_trailer(trailer_mass, pressure_after_transport, fill_pressure=None):
+    # Steps 6 and 7 of the return trip, for a caller that already has the
+    # pressure after transport. Returns the mass vented from the trailer
+    fill_pressure = TRAILER_PRESSURE_FILL if fill_pressure is None else fill_pressure
+
     # Step 6: Vent trailer before filling
-    print(f"\nVenting trailer from {pressure_after_transport:.2f} Pa to {TRAILER_PRESSURE_FILL} Pa")
-    mass_after_vent, mass_vented_trailer, mass_liq_final, mass_gas_final = vent_trailer(trailer_mass, pressure_after_transport, TRAILER_PRESSURE_FILL)
-    total_mass_vented += mass_vented_trailer
-    print(f"Mass vented from trailer: {mass_vented_trailer:.2f} kg")
-    print(f"Mass after venting: {mass_after_vent:.2f} kg")
-    print(f"Liquid mass after venting: {mass_liq_final:.2f} kg")
+    debug("\nVenting trailer from {pressure_after_transport:.2f} Pa to {fill_pressure} Pa",
+          pressure_after_transport=pressure_after_transport, fill_pressure=fill_pressure)
+    mass_after_vent, mass_vented_trailer, mass_liq_final, mass_gas_final = vent_trailer(trailer_mass, pressure_after_transport, fill_pressure)
+    debug("Mass vented from trailer: {mass_vented_trailer:.2f} kg", mass_vented_trailer=mass_vented_trailer)
+    debug("Mass after venting: {mass_after_vent:.2f} kg", mass_after_vent=mass_after_vent)
+    debug("Liquid mass after venting: {mass_liq_final:.2f} kg", mass_liq_final=mass_liq_final)
     # print(f"Gas mass after venting: {mass_gas_final:.2f} kg")
     
     # Step 7: Fill the trailer
-    print(f"\nFilling trailer from {mass_after_vent:.2f} kg to {TRAILER_MASS_INITIAL} kg")
-    mass_change, mass_liq_added, mass_gas_added = fill_trailer_const_pressure(mass_after_vent, TRAILER_MASS_INITIAL, TRAILER_PRESSURE_FILL, TRAILER_VOLUME)
-    print(f"Mass added to refill trailer: {mass_change:.2f} kg")
-    print(f"Liquid mass added: {mass_liq_added:.2f} kg")
-    print(f"Gas mass added: {mass_gas_added:.2f} kg")
+    debug("\nFilling trailer from {mass_after_vent:.2f} kg to {TRAILER_MASS_INITIAL} kg",
+          mass_after_vent=mass_after_vent, TRAILER_MASS_INITIAL=TRAILER_MASS_INITIAL)
+    mass_change, mass_liq_added, mass_gas_added = fill_trailer_const_pressure(mass_after_vent, TRAILER_MASS_INITIAL, fill_pressure, TRAILER_VOLUME)
+    debug("Mass added to refill trailer: {mass_change:.2f} kg", mass_change=mass_change)
+    debug("Liquid mass added: {mass_liq_added:.2f} kg", mass_liq_added=mass_liq_added)
+    debug("Gas mass added: {mass_gas_added:.2f} kg", mass_gas_added=mass_gas_added)
+
+    return mass_vented_trailer
+
+def run_study(study_id, num_stations, station_mass_initial, station_pressure_initial):
+    debug("\nRunning Study {study_id}", study_id=study_id)
+    debug("Number of stations: {num_stations}", num_stations=num_stations)
+    debug("Initial station mass: {station_mass_initial} kg", station_mass_initial=station_mass_initial)
+    debug("Initial station pressure: {station_pressure_initial} Pa", station_pressure_initial=station_pressure_initial)
+    debug("Initial trailer mass: {TRAILER_MASS_INITIAL} kg", TRAILER_MASS_INITIAL=TRAILER_MASS_INITIAL)
+    debug("Initial trailer pressure: {TRAILER_PRESSURE_INITIAL} Pa", TRAILER_PRESSURE_INITIAL=TRAILER_PRESSURE_INITIAL)
+
+    legs = []
+    trailer_mass = TRAILER_MASS_INITIAL
+    trailer_pressure = TRAILER_PRESSURE_INITIAL
+
+    for station in range(num_stations):
+        debug("\nOffloading to Station {station}", station=station + 1)
+        with profile_phase(f"station leg {station + 1}"):
+            trailer_mass, trailer_pressure, mass_received, mass_vented = station_leg(
+                trailer_mass, trailer_pressure, station_mass_initial, station_pressure_initial)
+        legs.append((mass_received, mass_vented))
+
+    return finish_study(study_id, legs, trailer_mass, trailer_pressure)
 
-    print(f"\nStudy {study_id} Results:")
-    print(f"Total mass received by stations: {total_mass_received:.2f} kg")
-    print(f"Total mass vented: {total_mass_vented:.2f} kg")
-    print("----------------------------------------")
+def finish_study(study_id, legs, trailer_mass, trailer_pressure):
+    # Return trip after the station legs, whose (mass_received, mass_vented)
+    # are in `legs`; returns the study totals
+    total_mass_received = 0
+    total_mass_vented = 0
+    for mass_received, mass_vented in legs:
+        total_mass_received += mass_received
+        total_mass_vented += mass_vented
+
+    with profile_phase("return trip"):
+        total_mass_vented += run_return_trip(trailer_mass, trailer_pressure)
+
+    info("\nStudy {study_id} Results:", study_id=study_id)
+    info("Total mass received by stations: {total_mass_received:.2f} kg", total_mass_received=total_mass_received)
+    info("Total mass vented: {total_mass_vented:.2f} kg", total_mass_vented=total_mass_vented)
+    info("----------------------------------------")
 
     return total_mass_received, total_mass_vented
 
@@ -159,14 +234,44 @@ def run_single_study(study_id):
     if study:
         return run_study(study["id"], study["num_stations"], study["starting_mass"], study["pressure"])
     else:
-        print(f"Study {study_id} not found.")
+        warning("Study {study_id} not found.", study_id=study_id)
         return None
 
-# Function to run all studies
-def run_all_studies():
+# A study's route: the same station configuration at every stop
+def study_route(study):
+    return ((study["starting_mass"], study["pressure"]),) * study["num_stations"]
+
+# Function to run a list of studies as one tree, running legs shared by
+# several studies (same stations in the same order) only once
+def run_study_tree(study_list):
+    tree = RouteTree([study_route(study) for study in study_list])
+
+    def run_leg(state, config, depth):
+        with profile_phase(f"station leg {depth}"):
+            trailer_mass, trailer_pressure, mass_received, mass_vented = station_leg(*state, *config)
+        return (trailer_mass, trailer_pressure), (mass_received, mass_vented)
+
+    def finish(index, state, legs):
+        return finish_study(study_list[index]["id"], legs, *state)
+
+    return tree.run(run_leg, finish, (TRAILER_MASS_INITIAL, TRAILER_PRESSURE_INITIAL))
+
+# Function to run all studies, in parallel across `processes` worker processes
+# (default: one per core); each independent branch of the study tree is one task
+def run_all_studies(study_list=None, processes=None):
+    study_list = studies if study_list is None else study_list
+    tree = RouteTree([study_route(study) for study in study_list])
+    groups = tree.branches()
+    info("Running {legs} distinct station legs instead of {total}",
+         legs=tree.leg_count, total=sum(len(route) for route in tree.routes))
+    group_outcomes, _ = run_sweep(run_study_tree, [([study_list[i] for i in group],) for group in groups],
+                                  processes=processes, count=len(study_list))
+    outcomes = [None] * len(study_list)
+    for group, group_outcome in zip(groups, group_outcomes):
+        for i, outcome in zip(group, group_outcome):
+            outcomes[i] = outcome
     results = {}
-    for study in studies:
-        mass_received, mass_vented = run_study(study["id"], study["num_stations"], study["starting_mass"], study["pressure"])
+    for study, (mass_received, mass_vented) in zip(study_list, outcomes):
         results[study["id"]] = {
             "num_stations": study["num_stations"],
             "starting_mass": study["starting_mass"],
@@ -178,23 +283,32 @@ def run_all_studies():
 
 # Analysis function
 def analyze_results(results):
-    print("\nFinal Results for All Studies:")
+    info("\nFinal Results for All Studies:")
     for study_id, data in results.items():
-        print(f"\nStudy {study_id}:")
-        print(f"  Number of stations: {data['num_stations']}")
-        print(f"  Starting mass: {data['starting_mass']} kg")
-        print(f"  Pressure: {data['pressure']} Pa")
-        print(f"  Total mass received: {data['mass_received']:.2f} kg")
-        print(f"  Total mass vented: {data['mass_vented']:.2f} kg")
-
-    print("\nAnalysis:")
+        info("\nStudy {study_id}:", study_id=study_id)
+        info("  Number of stations: {num_stations}", num_stations=data['num_stations'])
+        info("  Starting mass: {starting_mass} kg", starting_mass=data['starting_mass'])
+        info("  Pressure: {pressure} Pa", pressure=data['pressure'])
+        info("  Total mass received: {mass_received:.2f} kg", mass_received=data['mass_received'])
+        info("  Total mass vented: {mass_vented:.2f} kg", mass_vented=data['mass_vented'])
+
+    info("\nAnalysis:")
     max_received = max(results.items(), key=lambda x: x[1]['mass_received'])
     min_vented = min(results.items(), key=lambda x: x[1]['mass_vented'])
 
-    print(f"Most efficient for mass received: Study {max_received[0]}")
-    print(f"  Mass Received: {max_received[1]['mass_received']:.2f} kg")
-    print(f"Least mass vented: Study {min_vented[0]}")
-    print(f"  Mass Vented: {min_vented[1]['mass_vented']:.2f} kg")
+    info("Most efficient for mass received: Study {study_id}", study_id=max_received[0])
+    info("  Mass Received: {mass:.2f} kg", mass=max_received[1]['mass_received'])
+    info("Least mass vented: Study {study_id}", study_id=min_vented[0])
+    info("  Mass Vented: {mass:.2f} kg", mass=min_vented[1]['mass_vented'])
+
+    stats = cache_stats()
+    if stats is not None and stats.calls:
+        info("\nProperty cache: {stats}", stats=stats)
+    if leg_cache.stats.calls:
+        info("Leg cache: {stats}", stats=leg_cache.stats)
+    report = profile_report()
+    if report is not None:
+        info("\nProperty calls by phase:\n{report}", report=report)
 
 # Main execution
 if __name__ == "__main__":
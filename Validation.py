@@ -1,14 +1,7 @@
-import os
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
 from AllFunctions import (boil_to_pressure, offload_with_raising_pressure, 
                           offload_const_pressure, boil_over_time, vent_trailer, 
                           fill_trailer_const_pressure)
 
-# Initialize REFPROP
-RP = REFPROPFunctionLibrary(os.environ['RPPREFIX'])
-RP.SETPATHdll(os.environ['RPPREFIX'])
-MASS_BASE_SI = RP.GETENUMdll(0, "MASS BASE SI").iEnum
-
 # Constants
 TRAILER_VOLUME = 32.0  # m^3
 STATION_VOLUME = 13.33  # m^3
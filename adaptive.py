@@ -0,0 +1,166 @@
+"""Adaptive sampling of study outputs over a box of inputs.
+
+Instead of a hand-written grid of studies, ``adaptive_sample`` starts from
+a coarse grid of cells over the input box and refines only where the
+outputs change quickly, such as the boundary between the station filling
+up and the trailer running dry, or where venting starts. Each cell is
+checked at the points halfway between its corners (edge midpoints and
+center): if the model value at any of them differs from the multilinear
+interpolation of the corners by more than ``tolerance`` in any output, the
+cell is split in half along every input, and the checked points become the
+corners of its children. Points sit on a dyadic lattice, so neighbouring
+cells share them and no point runs twice; every refinement round runs its
+new points as one ``run_sweep``. Flat regions stay at the starting
+resolution, while a jump in the outputs is followed down to the finest
+level.
+
+``SampleMap`` holds the points and outputs and interpolates them linearly
+(Delaunay) for maps. ``adaptive_studies`` maps ParametricStudy's
+``run_study`` over station mass and pressure for each number of stations
+and returns the results in the form of ``run_all_studies``:
+
+    python adaptive.py [--stations N] [--tolerance KG] [--max-level L] [--reference N]
+"""
+import argparse
+import itertools
+
+import numpy as np
+
+from ParametricStudy import run_study
+from sweep import run_sweep
+from tracing import info
+
+
+class SampleMap:
+    def __init__(self, bounds, points, values):
+        self.bounds = [tuple(map(float, bound)) for bound in bounds]
+        self.points = np.asarray(points, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self._interpolator = None
+
+    @property
+    def runs(self):
+        return len(self.points)
+
+    def predict(self, points):
+        # Linear interpolation of the outputs, (n, inputs) to (n, outputs)
+        if self._interpolator is None:
+            from scipy.interpolate import LinearNDInterpolator
+            lo = np.array([lo for lo, _ in self.bounds])
+            span = np.array([hi for _, hi in self.bounds]) - lo
+            interpolator = LinearNDInterpolator((self.points - lo) / span, self.values)
+            self._interpolator = lambda x: interpolator((np.atleast_2d(x) - lo) / span)
+        return self._interpolator(np.asarray(points, dtype=float))
+
+
+def adaptive_sample(func, bounds, tolerance, args=(), initial_level=2, max_level=6, processes=None):
+    """Sample func(*args, *point) over ``bounds``, refining where it varies; returns a SampleMap.
+
+    ``tolerance`` is the allowed interpolation error, a number or one per
+    output. The grid starts with 2**initial_level cells per input and is refined
+    down to 2**max_level.
+    """
+    dims = len(bounds)
+    lo = np.array([lo for lo, _ in bounds], dtype=float)
+    span = np.array([hi for _, hi in bounds], dtype=float) - lo
+    resolution = 2 ** max_level
+    tolerance = np.asarray(tolerance, dtype=float)
+    values = {}  # lattice point -> outputs
+    corners = list(itertools.product((0, 1), repeat=dims))
+    # Halfway points of a cell and the weights of its corners there
+    halfway = [offset for offset in itertools.product((0, 1, 2), repeat=dims) if 1 in offset]
+    weights = np.array([[np.prod([(1 - c, c)[o // 2] if o != 1 else 0.5 for o, c in zip(offset, corner)])
+                         for corner in corners] for offset in halfway])
+
+    def evaluate(lattice_points):
+        new = [point for point in dict.fromkeys(lattice_points) if point not in values]
+        if new:
+            coordinates = lo + np.array(new, dtype=float) / resolution * span
+            outputs, _ = run_sweep(func, [tuple(args) + tuple(row) for row in coordinates.tolist()],
+                                   processes=processes)
+            values.update(zip(new, (np.atleast_1d(np.asarray(output, dtype=float)) for output in outputs)))
+
+    def cell_points(origin, size, offsets):
+        return [tuple(o + size * c for o, c in zip(origin, offset)) for offset in offsets]
+
+    size = resolution // 2 ** initial_level
+    cells = [(tuple(size * i for i in index), size) for index in itertools.product(range(2 ** initial_level), repeat=dims)]
+    while cells:
+        evaluate([point for origin, size in cells for point in cell_points(origin, size, corners)
+                  + cell_points(origin, size // 2, halfway)])
+        refined = []
+        for origin, size in cells:
+            half = size // 2
+            predicted = weights @ np.array([values[point] for point in cell_points(origin, size, corners)])
+            actual = np.array([values[point] for point in cell_points(origin, half, halfway)])
+            if half >= 2 and np.any(np.abs(actual - predicted) > tolerance):
+                refined += [(point, half) for point in cell_points(origin, half, corners)]
+        cells = refined
+        info("Adaptive sampling: {runs} runs, {cells} cells to refine", runs=len(values), cells=len(cells))
+
+    points = lo + np.array(list(values), dtype=float) / resolution * span
+    return SampleMap(bounds, points, np.array(list(values.values())))
+
+
+def grid_sample(func, bounds, per_input, args=(), processes=None, centered=False):
+    # Dense uniform grid with ``per_input`` points along each input, from
+    # bound to bound, or with centered=True at the centers of ``per_input``
+    # equal cells (half a cell in from the bounds)
+    if centered:
+        axes = [lo + (np.arange(per_input) + 0.5) / per_input * (hi - lo) for lo, hi in bounds]
+    else:
+        axes = [np.linspace(lo, hi, per_input) for lo, hi in bounds]
+    points = np.array(list(itertools.product(*axes)))
+    outputs, _ = run_sweep(func, [tuple(args) + tuple(row) for row in points.tolist()], processes=processes)
+    return SampleMap(bounds, points, outputs)
+
+
+def adaptive_studies(num_stations=(2, 3, 4, 5, 6), mass=(100.0, 500.0), pressure=(250000.0, 350000.0), tolerance=10.0,
+                     initial_level=2, max_level=5, processes=None):
+    # Adaptive maps of (mass received, mass vented) over station mass and
+    # pressure for each number of stations, as run_all_studies results
+    results = {}
+    for count in num_stations:
+        sample_map = adaptive_sample(run_study, [mass, pressure], tolerance, ("adaptive", count), initial_level,
+                                     max_level, processes)
+        for n, ((station_mass, station_pressure), (mass_received, mass_vented)) in enumerate(
+                zip(sample_map.points.tolist(), sample_map.values.tolist())):
+            results[f"{count}.{n + 1}"] = {
+                "num_stations": count,
+                "starting_mass": station_mass,
+                "pressure": station_pressure,
+                "mass_received": mass_received,
+                "mass_vented": mass_vented
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adaptive map of a study over station mass and pressure")
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=10.0, help="kg, allowed error at cell centers")
+    parser.add_argument("--initial-level", type=int, default=2)
+    parser.add_argument("--max-level", type=int, default=5)
+    parser.add_argument("--reference", type=int, help="points per input of the reference grid, at cell centers "
+                        "(default: 2**max-level, all off the sampling lattice; 0 to skip)")
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
+
+    bounds = [(50.0, 600.0), (200000.0, 380000.0)]
+    study = ("adaptive", args.stations)
+    sample_map = adaptive_sample(run_study, bounds, args.tolerance, study, args.initial_level, args.max_level,
+                                 args.processes)
+    info("Adaptive map: {runs} runs", runs=sample_map.runs)
+    if args.reference is None:
+        args.reference = 2 ** args.max_level
+    if args.reference:
+        # Cell centers: a reference point on the sampling lattice would be a
+        # sample point of the adaptive map, exact by construction
+        reference = grid_sample(run_study, bounds, args.reference, study, args.processes, centered=True)
+        per_input = max(2, int(round(sample_map.runs ** 0.5)))
+        uniform = grid_sample(run_study, bounds, per_input, study, args.processes)
+        for name, candidate in (("adaptive", sample_map), (f"uniform {per_input}x{per_input}", uniform)):
+            error = np.abs(candidate.predict(reference.points) - reference.values)
+            info("{name}: {runs} runs, error against the {n}x{n} grid: max {max:.2f} kg, mean {mean:.2f} kg "
+                 "(received, vented)", name=name, runs=candidate.runs, n=args.reference,
+                 max=error.max(), mean=error.mean())
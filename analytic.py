@@ -0,0 +1,260 @@
+"""Closed-form para-hydrogen stand-in for benchmarks and offline runs.
+
+A deterministic property backend that needs no REFPROP license and no
+CoolProp: saturation follows Clausius-Clapeyron with a constant latent heat
+anchored at the normal boiling point, the vapor is an ideal gas with
+constant heat capacity and the liquid is incompressible with a density
+linear in temperature. Two-phase states mix the saturated ends by quality.
+Numbers are within tens of percent of real para-hydrogen near the trailer
+and station envelope (1-12 bar), enough to exercise every code path with
+realistic magnitudes, not for results. Select it with
+``TRUEZERO_PROPERTY_BACKEND=analytic`` or ``set_backend("analytic")``.
+
+Since the liquid is incompressible, a liquid "DE" state is placed at its
+saturation pressure. The saturated liquid and vapor densities meet at
+T_CRIT (about 57 K, where the linear liquid density is still positive), so
+only energies at or below the saturated liquid's there (E_LIQ_MAX) can be
+liquid; above it a "DE" state is vapor or two-phase. Quality outside the
+dome is flagged like REFPROP: -998 for liquid, 998 for vapor. Scalar calls
+branch on the phase in plain Python; batches mask whole arrays with NumPy.
+"""
+import math
+
+import numpy as np
+
+from properties import PropertyBackend
+
+R = 4124.2  # J/kg/K
+T_REF = 20.28  # K, normal boiling point
+P_REF = 101325.0  # Pa
+LATENT = 445.6e3  # J/kg
+RHO_LIQ_REF = 70.85  # kg/m^3 at T_REF
+DRHO_LIQ_DT = 1.55  # kg/m^3/K
+C_LIQ = 9.7e3  # J/kg/K
+CP_VAP = 2.5 * R  # J/kg/K
+CV_VAP = CP_VAP - R
+H_VAP_REF = LATENT + P_REF / RHO_LIQ_REF  # J/kg, liquid at T_REF has e = s = 0
+S_VAP_REF = LATENT / T_REF  # J/kg/K
+LIQUID = -998.0
+VAPOR = 998.0
+
+
+def _log(x):
+    return math.log(x) if isinstance(x, float) else np.log(x)
+
+
+def _exp(x):
+    return math.exp(x) if isinstance(x, float) else np.exp(x)
+
+
+def saturation_temperature(P):
+    return 1 / (1 / T_REF - (R / LATENT) * _log(P / P_REF))
+
+
+def saturation_pressure(T):
+    return P_REF * _exp((LATENT / R) * (1 / T_REF - 1 / T))
+
+
+def liquid_density(T):
+    return RHO_LIQ_REF - DRHO_LIQ_DT * (T - T_REF)
+
+
+def liquid_temperature(rho):
+    return T_REF + (RHO_LIQ_REF - rho) / DRHO_LIQ_DT
+
+
+def liquid_energy(T):
+    return C_LIQ * (T - T_REF)
+
+
+def liquid_entropy(T):
+    return C_LIQ * _log(T / T_REF)
+
+
+def vapor_energy(T):
+    return H_VAP_REF + CP_VAP * (T - T_REF) - R * T
+
+
+def vapor_entropy(T, P):
+    return S_VAP_REF + CP_VAP * _log(T / T_REF) - R * _log(P / P_REF)
+
+
+def _critical_temperature():
+    # Bisection for the saturated liquid and vapor densities meeting, below
+    # the temperature where the liquid density reaches zero
+    lo, hi = T_REF, liquid_temperature(0.0)
+    for _ in range(100):
+        T = 0.5 * (lo + hi)
+        if liquid_density(T) > saturation_pressure(T) / (R * T):
+            lo = T
+        else:
+            hi = T
+    return 0.5 * (lo + hi)
+
+
+T_CRIT = _critical_temperature()  # K
+E_LIQ_MAX = liquid_energy(T_CRIT)  # J/kg
+
+
+def _mixture_density(rho_L, rho_V, x):
+    return 1 / (1 / rho_L + x * (1 / rho_V - 1 / rho_L))
+
+
+def _quality(rho_L, rho_V, rho):
+    return (1 / rho - 1 / rho_L) / (1 / rho_V - 1 / rho_L)
+
+
+class AnalyticBackend(PropertyBackend):
+    name = "analytic"
+    version = "1"
+    vectorized = True
+
+    def _calc(self, hin, outputs, a, b):
+        try:
+            flash = getattr(self, "_state_" + hin)
+        except AttributeError:
+            raise ValueError(f"The analytic stand-in has no {hin!r} flash")
+        state = flash(float(a), float(b))
+        return tuple(self._scalar_output(name, *state) for name in outputs)
+
+    def _scalar_output(self, name, T, P, D, x):
+        if name in ("D", "P", "T", "QMASS", "QMOLE"):
+            return {"D": D, "P": P, "T": T, "QMASS": x, "QMOLE": x}[name]
+        T_sat = saturation_temperature(P)
+        if name == "DLIQ":
+            return liquid_density(T_sat)
+        if name == "DVAP":
+            return P / (R * T_sat)
+        if x == LIQUID:
+            e, s = liquid_energy(T), liquid_entropy(T)
+        elif x == VAPOR:
+            e, s = vapor_energy(T), vapor_entropy(T, P)
+        else:
+            e_L, e_V = liquid_energy(T_sat), vapor_energy(T_sat)
+            e = e_L + x * (e_V - e_L)
+            s = liquid_entropy(T_sat) + x * (vapor_entropy(T_sat, P) - liquid_entropy(T_sat))
+        if name == "E":
+            return e
+        if name == "H":
+            return e + P / D
+        if name == "S":
+            return s
+        raise ValueError(f"The analytic stand-in has no {name!r} output")
+
+    def _state_PQ(self, P, x):
+        T = saturation_temperature(P)
+        return T, P, _mixture_density(liquid_density(T), P / (R * T), x), x
+
+    def _state_PD(self, P, D):
+        T_sat = saturation_temperature(P)
+        rho_L, rho_V = liquid_density(T_sat), P / (R * T_sat)
+        if D >= rho_L:
+            return liquid_temperature(D), P, D, LIQUID
+        if D <= rho_V:
+            return P / (R * D), P, D, VAPOR
+        return T_sat, P, D, _quality(rho_L, rho_V, D)
+
+    def _state_PS(self, P, s):
+        T_sat = saturation_temperature(P)
+        s_L, s_V = liquid_entropy(T_sat), vapor_entropy(T_sat, P)
+        if s < s_L:
+            T = T_REF * math.exp(s / C_LIQ)
+            return T, P, liquid_density(T), LIQUID
+        if s > s_V:
+            T = T_REF * math.exp((s - S_VAP_REF + R * math.log(P / P_REF)) / CP_VAP)
+            return T, P, P / (R * T), VAPOR
+        x = (s - s_L) / (s_V - s_L)
+        return T_sat, P, _mixture_density(liquid_density(T_sat), P / (R * T_sat), x), x
+
+    def _state_DE(self, D, e):
+        T = T_REF + e / C_LIQ
+        if e <= E_LIQ_MAX and D >= liquid_density(T):
+            return T, saturation_pressure(T), D, LIQUID
+        T = (e - H_VAP_REF + CP_VAP * T_REF) / CV_VAP
+        if T > 0 and R * T * D <= saturation_pressure(T):
+            return T, R * T * D, D, VAPOR
+        lo, hi = 10.0, 60.0
+        while hi - lo > 1e-10:
+            T = 0.5 * (lo + hi)
+            x = _quality(liquid_density(T), saturation_pressure(T) / (R * T), D)
+            if liquid_energy(T) + x * (vapor_energy(T) - liquid_energy(T)) > e:
+                hi = T
+            else:
+                lo = T
+        T = 0.5 * (lo + hi)
+        P = saturation_pressure(T)
+        return T, P, D, _quality(liquid_density(T), P / (R * T), D)
+
+    def _calc_array(self, hin, outputs, a, b):
+        try:
+            flash = getattr(self, "_flash_" + hin)
+        except AttributeError:
+            raise ValueError(f"The analytic stand-in has no {hin!r} flash")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            T, P, D, x = flash(a, b)
+            return np.array([self._output(name, T, P, D, x) for name in outputs]).reshape(len(outputs), len(a))
+
+    def _output(self, name, T, P, D, x):
+        # Single-phase states use their own temperature, two-phase ones mix
+        # the saturated ends by quality
+        liquid, vapor = x == LIQUID, x == VAPOR
+        if name in ("D", "P", "T", "QMASS", "QMOLE"):
+            return {"D": D, "P": P, "T": T, "QMASS": x, "QMOLE": x}[name]
+        T_sat = saturation_temperature(P)
+        if name == "DLIQ":
+            return liquid_density(T_sat)
+        if name == "DVAP":
+            return P / (R * T_sat)
+        T_L = np.where(liquid, T, T_sat)
+        T_V = np.where(vapor, T, T_sat)
+        w = np.where(liquid, 0.0, np.where(vapor, 1.0, x))
+        if name == "E":
+            return (1 - w) * liquid_energy(T_L) + w * vapor_energy(T_V)
+        if name == "H":
+            return (1 - w) * liquid_energy(T_L) + w * vapor_energy(T_V) + P / D
+        if name == "S":
+            return (1 - w) * liquid_entropy(T_L) + w * vapor_entropy(T_V, P)
+        raise ValueError(f"The analytic stand-in has no {name!r} output")
+
+    def _flash_PQ(self, P, x):
+        T = saturation_temperature(P)
+        return T, P, _mixture_density(liquid_density(T), P / (R * T), x), x
+
+    def _flash_PD(self, P, D):
+        T_sat = saturation_temperature(P)
+        rho_L, rho_V = liquid_density(T_sat), P / (R * T_sat)
+        liquid, vapor = D >= rho_L, D <= rho_V
+        T = np.where(liquid, liquid_temperature(D), np.where(vapor, P / (R * D), T_sat))
+        x = np.where(liquid, LIQUID, np.where(vapor, VAPOR, _quality(rho_L, rho_V, D)))
+        return T, P, D, x
+
+    def _flash_PS(self, P, s):
+        T_sat = saturation_temperature(P)
+        s_L, s_V = liquid_entropy(T_sat), vapor_entropy(T_sat, P)
+        liquid, vapor = s < s_L, s > s_V
+        T_liquid = T_REF * np.exp(s / C_LIQ)
+        T_vapor = T_REF * np.exp((s - S_VAP_REF + R * np.log(P / P_REF)) / CP_VAP)
+        x = (s - s_L) / (s_V - s_L)
+        D = np.where(liquid, liquid_density(T_liquid), np.where(
+            vapor, P / (R * T_vapor), _mixture_density(liquid_density(T_sat), P / (R * T_sat), x)))
+        T = np.where(liquid, T_liquid, np.where(vapor, T_vapor, T_sat))
+        return T, P, D, np.where(liquid, LIQUID, np.where(vapor, VAPOR, x))
+
+    def _flash_DE(self, D, e):
+        T_liquid = T_REF + e / C_LIQ
+        T_vapor = (e - H_VAP_REF + CP_VAP * T_REF) / CV_VAP
+        liquid = (e <= E_LIQ_MAX) & (D >= liquid_density(T_liquid))
+        vapor = ~liquid & (T_vapor > 0) & (R * T_vapor * D <= saturation_pressure(T_vapor))
+        # Two-phase: bisect on the saturation temperature for the energy
+        lo, hi = np.full(D.shape, 10.0), np.full(D.shape, 60.0)
+        for _ in range(60):
+            T = 0.5 * (lo + hi)
+            P = saturation_pressure(T)
+            rho_L, rho_V = liquid_density(T), P / (R * T)
+            x = _quality(rho_L, rho_V, D)
+            high = liquid_energy(T) + x * (vapor_energy(T) - liquid_energy(T)) > e
+            hi = np.where(high, T, hi)
+            lo = np.where(high, lo, T)
+        T = np.where(liquid, T_liquid, np.where(vapor, T_vapor, T))
+        P = np.where(liquid, saturation_pressure(T_liquid), np.where(vapor, R * T_vapor * D, P))
+        return T, P, D, np.where(liquid, LIQUID, np.where(vapor, VAPOR, x))
@@ -0,0 +1,259 @@
+"""Benchmark suite for the process functions and the full-cycle drivers.
+
+Microbenchmarks call each process function of AllFunctions.py (scalar and
+batched forms) and coolprop.py on representative trailer and station
+states; macrobenchmarks run the OneFullCycle cycle and
+``ParametricStudy.run_all_studies``. Properties come from the closed-form
+stand-in in analytic.py by default, so the numbers are deterministic and
+need no REFPROP license; ``--backend`` picks any other backend name.
+
+Every repetition starts with empty property and leg caches and is timed
+separately; the report gives the median time per operation (a call, a
+batch state or a scenario), property calls and flashed states per
+operation, and operations per second. Each run is appended to a JSON
+history file and compared with the previous run on the same backend:
+
+    python benchmarks.py [--level micro|macro] [--filter NAME] [--repeat N]
+                         [--backend NAME] [--history PATH | --no-history]
+"""
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+
+from properties import CachedBackend, InstrumentedBackend, build_backend, find_layer, get_backend, set_backend
+import tracing
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_history.json")
+BATCH_SIZE = 1000
+
+
+class Benchmark:
+    def __init__(self, name, level, func, ops=1, unit="call", setup=None):
+        self.name = name
+        self.level = level
+        self.func = func
+        self.ops = ops
+        self.unit = unit
+        self.setup = setup
+
+
+def _offload_args():
+    import AllFunctions as af
+    return (af.station_pressure_initial, af.station_pressure_initial, af.trailer_mass_initial, af.station_mass_initial,
+            af.station_volume, af.m_station_max, af.offload_pressure, af.trailer_pressure_max, af.trailer_volume)
+
+
+def micro_benchmarks():
+    import AllFunctions as af
+    offload = _offload_args()
+    masses = np.linspace(900.0, 2100.0, BATCH_SIZE)
+    benchmarks = [
+        Benchmark("af.boil_to_pressure", "micro", lambda: af.boil_to_pressure(2100, 160000, 202650)),
+        Benchmark("af.boil_over_time", "micro", lambda: af.boil_over_time(1423.5, 333935.0, 86400)),
+        Benchmark("af.vent_trailer", "micro", lambda: af.vent_trailer(1423.5, 420000.0, 131000)),
+        Benchmark("af.offload_with_raising_pressure", "micro", lambda: af.offload_with_raising_pressure(*offload)),
+        Benchmark("af.offload_with_raising_pressure[ode]", "micro",
+                  lambda: af.offload_with_raising_pressure(*offload, method="ode")),
+        Benchmark("af.offload_with_raising_pressure[stepwise]", "micro",
+                  lambda: af.offload_with_raising_pressure(*offload, method="stepwise")),
+        Benchmark("af.offload_const_pressure", "micro", lambda: af.offload_const_pressure(1900, 500, 353312, 13.33, 0.95)),
+        Benchmark("af.fill_trailer_const_pressure", "micro",
+                  lambda: af.fill_trailer_const_pressure(700, 2100, 131000, af.trailer_volume)),
+        Benchmark("af.boil_to_pressure_batch", "micro", lambda: af.boil_to_pressure_batch(masses, 160000, 202650),
+                  BATCH_SIZE, "state"),
+        Benchmark("af.boil_over_time_batch", "micro", lambda: af.boil_over_time_batch(masses, 333935.0, 86400),
+                  BATCH_SIZE, "state"),
+        Benchmark("af.vent_trailer_batch", "micro", lambda: af.vent_trailer_batch(masses, 420000.0, 131000),
+                  BATCH_SIZE, "state"),
+        Benchmark("af.offload_const_pressure_batch", "micro",
+                  lambda: af.offload_const_pressure_batch(masses, 500, 353312, 13.33, 0.95), BATCH_SIZE, "state"),
+        Benchmark("af.fill_trailer_const_pressure_batch", "micro",
+                  lambda: af.fill_trailer_const_pressure_batch(masses - 800, 2100, 131000, af.trailer_volume),
+                  BATCH_SIZE, "state"),
+    ]
+    try:
+        import coolprop as cp
+    except ImportError:
+        # coolprop.py imports CoolProp at the top
+        return benchmarks
+    benchmarks += [
+        Benchmark("cp.boil_to_pressure", "micro", lambda: cp.boil_to_pressure(1680.0, 202650, 506625)),
+        Benchmark("cp.boil_over_time", "micro", lambda: cp.boil_over_time(1680.0, 202650, 5 * 24 * 3600)),
+        Benchmark("cp.vent_trailer", "micro", lambda: cp.vent_trailer(1680.0, 506625, 202650)),
+        Benchmark("cp.offload_parahydrogen", "micro",
+                  lambda: cp.offload_parahydrogen(31.7 * 6894.76 + 101325, 101325, 1680, 80, 12)),
+        Benchmark("cp.offload_const_pressure", "micro", lambda: cp.offload_const_pressure(1680.0, 80.0, 253312, 15.0, 0.95)),
+        Benchmark("cp.fill_trailer_const_pressure", "micro", lambda: cp.fill_trailer_const_pressure(80, 1680, 506625)),
+    ]
+    return benchmarks
+
+
+def full_cycle():
+    # The OneFullCycle sequence: heat, offload with rising then constant
+    # pressure, one day of transport, vent and refill
+    import AllFunctions as af
+    _, _ = af.boil_to_pressure(af.trailer_mass_initial, af.trailer_pressure_initial, af.station_pressure_initial)
+    P, m_station, m_trailer = af.offload_with_raising_pressure(*_offload_args())
+    station_max_mass = af.station_volume * get_backend().calc("PQ", "D", af.offload_pressure, 0)[0] * af.station_max_fill_fraction
+    if m_station < station_max_mass:
+        _, _, m_trailer, m_station, _ = af.offload_const_pressure(
+            m_trailer, m_station, af.offload_pressure, af.station_volume, af.station_max_fill_fraction)
+    P_transport, _ = af.boil_over_time(m_trailer, P, af.time_transportation)
+    m_trailer, m_vented, _, _ = af.vent_trailer(m_trailer, P_transport, af.trailer_pressure_fill)
+    af.fill_trailer_const_pressure(m_trailer, af.trailer_mass_max, af.trailer_pressure_fill, af.trailer_volume)
+    return m_station - af.station_mass_initial, m_vented
+
+
+def macro_benchmarks():
+    import ParametricStudy as ps
+    return [
+        Benchmark("cycle.one_full_cycle", "macro", full_cycle, 1, "scenario"),
+        Benchmark("study.run_all_studies", "macro", lambda: ps.run_all_studies(processes=1), len(ps.studies), "scenario",
+                  setup=ps.leg_cache.clear),
+    ]
+
+
+def run_benchmark(benchmark, backend, repeat):
+    counter = InstrumentedBackend(backend)
+    set_backend(counter)
+    cache = find_layer(backend, CachedBackend)
+    times = []
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull), tracing.capture(tracing.NullSink(), tracing.OFF):
+            # The first run is a warm-up (imports, saturation table) and is
+            # not timed
+            for n in range(repeat + 1):
+                if cache is not None:
+                    cache.clear()
+                if benchmark.setup is not None:
+                    benchmark.setup()
+                counter.clear()
+                start = time.perf_counter()
+                benchmark.func()
+                elapsed = time.perf_counter() - start
+                if n:
+                    times.append(elapsed)
+    finally:
+        set_backend(backend)
+    median = statistics.median(times)
+    total = counter.total()
+    return {
+        "level": benchmark.level,
+        "unit": benchmark.unit,
+        "ops": benchmark.ops,
+        "repeat": repeat,
+        "time_per_op": median / benchmark.ops,
+        "best_per_op": min(times) / benchmark.ops,
+        "ops_per_second": benchmark.ops / median if median > 0 else float("inf"),
+        "property_calls_per_op": total.calls / benchmark.ops,
+        "property_states_per_op": total.states / benchmark.ops,
+        "property_time_per_op": total.backend_time / benchmark.ops,
+    }
+
+
+def run_suite(level=None, name_filter=None, repeat=7, backend_name="analytic"):
+    """Run the selected benchmarks; returns a history entry (a JSON-ready dict)."""
+    backend = build_backend(backend_name)
+    previous = get_backend()
+    benchmarks = []
+    if level in (None, "micro"):
+        benchmarks += micro_benchmarks()
+    if level in (None, "macro"):
+        benchmarks += macro_benchmarks()
+    if name_filter:
+        benchmarks = [b for b in benchmarks if name_filter in b.name]
+    results = {}
+    try:
+        for benchmark in benchmarks:
+            results[benchmark.name] = run_benchmark(benchmark, backend, repeat)
+    finally:
+        set_backend(previous)
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "backend": backend_name,
+        "backend_version": str(_exact_layer(backend).version),
+        "results": results,
+    }
+
+
+def _exact_layer(backend):
+    # The innermost backend under the cache and table layers
+    while getattr(backend, "source", None) is not None:
+        backend = backend.source
+    return backend
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    with open(path + ".tmp", "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def format_report(entry, baseline=None):
+    lines = [f"Backend {entry['backend']} ({entry['backend_version']}), commit {entry['commit']}, "
+             f"Python {entry['python']}, NumPy {entry['numpy']}"]
+    if baseline is not None:
+        lines.append(f"Compared with {baseline['time']} (commit {baseline['commit']})")
+    lines.append(f"{'benchmark':45} {'time/op':>12} {'props/op':>10} {'states/op':>10} {'ops/s':>12} {'change':>8}")
+    for name, result in entry["results"].items():
+        change = ""
+        before = (baseline or {}).get("results", {}).get(name)
+        if before is not None and before["time_per_op"] > 0:
+            change = f"{result['time_per_op'] / before['time_per_op'] - 1:+.1%}"
+        lines.append(f"{name:45} {_format_time(result['time_per_op']):>12} {result['property_calls_per_op']:>10.3g} "
+                     f"{result['property_states_per_op']:>10.3g} {result['ops_per_second']:>12.1f} {change:>8}"
+                     f"  per {result['unit']}")
+    return "\n".join(lines)
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the process functions and cycle drivers")
+    parser.add_argument("--level", choices=("micro", "macro"))
+    parser.add_argument("--filter", dest="name_filter", help="only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--backend", default="analytic")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-history", action="store_true")
+    args = parser.parse_args()
+
+    entry = run_suite(args.level, args.name_filter, args.repeat, args.backend)
+    history = [] if args.no_history else load_history(args.history)
+    baseline = next((e for e in reversed(history) if e["backend"] == entry["backend"]), None)
+    print(format_report(entry, baseline))
+    if not args.no_history:
+        history.append(entry)
+        save_history(args.history, history)
+        print(f"Appended to {args.history}")
@@ -1,20 +1,108 @@
+from operator import methodcaller
+
+import CoolProp
 import CoolProp.CoolProp as CP
+import numpy as np
+from properties import PropertyBackend, get_backend
+from tracing import debug, info
 
 # Constants
 TANK_VOLUME = 32.0  # m^3
 TRAILER_HEAT_LOAD = 40.7  # W
 TRAILER_P_MAX = 1204514.0  # Pa (160 psig, 174.7 psia)
 
+
+class CoolPropBackend(PropertyBackend):
+    """CoolProp through one long-lived AbstractState per process.
+
+    Each call is a single ``update`` of the state followed by reading every
+    requested output, instead of one string-parsing PropsSI call (and one
+    flash) per output. ``state_backend`` is any CoolProp backend string:
+    "HEOS" (the default, full equation of state) or "BICUBIC&HEOS" for
+    CoolProp's bicubic tables. Those are several times faster but have no
+    "DE"/"DS" flashes and are far off in parts of the compressed liquid next
+    to the dome, so calls they reject go to a HEOS state and results should
+    be checked against HEOS before relying on them. The default factory
+    reads the backend string from ``TRUEZERO_COOLPROP_BACKEND``.
+    """
+    name = "coolprop"
+    coolprop_fluid = "parahydrogen"
+    vectorized = True
+
+    # REFPROP-style input pairs and outputs mapped to CoolProp keys
+    INPUTS = {"PD": ("P", "D"), "PQ": ("P", "Q"), "PS": ("P", "S"), "DE": ("D", "U"), "DS": ("D", "S")}
+    OUTPUTS = {"D": "D", "P": "P", "E": "U", "H": "H", "S": "S", "T": "T", "W": "A", "QMASS": "Q", "QMOLE": "Q"}
+    # Liquid and vapor densities of a saturated state, as REFPROP names them
+    PHASE_OUTPUTS = {"DLIQ": ("saturated_liquid_keyed_output", "D"), "DVAP": ("saturated_vapor_keyed_output", "D")}
+
+    def __init__(self, state_backend="HEOS"):
+        self.state_backend = state_backend
+        self._state = None
+        self._exact_state = None
+        self._pairs = {hin: _update_pair(*keys) for hin, keys in self.INPUTS.items()}
+        self._readers = {name: methodcaller("keyed_output", CP.get_parameter_index(key)) for name, key in self.OUTPUTS.items()}
+        self._readers.update({name: methodcaller(method, CP.get_parameter_index(key))
+                              for name, (method, key) in self.PHASE_OUTPUTS.items()})
+
+    @property
+    def version(self):
+        return f"{CoolProp.__version__} {self.state_backend}"
+
+    def _abstract_state(self):
+        if self._state is None:
+            self._state = CP.AbstractState(self.state_backend, self.coolprop_fluid)
+        return self._state
+
+    def _update(self, pair, a, b):
+        state = self._abstract_state()
+        try:
+            state.update(pair, a, b)
+        except ValueError:
+            if self.state_backend == "HEOS":
+                raise
+            if self._exact_state is None:
+                self._exact_state = CP.AbstractState("HEOS", self.coolprop_fluid)
+            state = self._exact_state
+            state.update(pair, a, b)
+        return state
+
+    def _calc(self, hin, outputs, a, b):
+        pair, swap = self._pairs[hin]
+        state = self._update(pair, b, a) if swap else self._update(pair, a, b)
+        return tuple(self._readers[o](state) for o in outputs)
+
+    def _calc_array(self, hin, outputs, a, b):
+        # A tight update loop on the shared state is as fast per state as
+        # vectorized PropsSI, and reads all outputs from one flash
+        pair, swap = self._pairs[hin]
+        readers = [self._readers[o] for o in outputs]
+        if swap:
+            a, b = b, a
+        values = np.empty((len(outputs), len(a)))
+        for n, (x, y) in enumerate(zip(a.tolist(), b.tolist())):
+            state = self._update(pair, x, y)
+            values[:, n] = [read(state) for read in readers]
+        return values
+
+    def reset(self):
+        self._state = None
+        self._exact_state = None
+
+
+def _update_pair(key_a, key_b):
+    # CoolProp's input pair for two keys, and whether it wants them swapped
+    pair, first, _ = CP.generate_update_pair(CP.get_parameter_index(key_a), 1.0, CP.get_parameter_index(key_b), 2.0)
+    return pair, first != 1.0
+
+
 def boil_to_pressure(mass_initial, pressure_initial, pressure_final):
+    props = get_backend()
 
     density = mass_initial / TANK_VOLUME
     
     # Calculate initial and final states
-    h_initial = CP.PropsSI('H', 'D', density, 'P', pressure_initial, 'parahydrogen')
-    u_initial = CP.PropsSI('U', 'D', density, 'P', pressure_initial, 'parahydrogen')
-    
-    u_final = CP.PropsSI('U', 'D', density, 'P', pressure_final, 'parahydrogen')
-    h_final = CP.PropsSI('H', 'D', density, 'P', pressure_final, 'parahydrogen')
+    h_initial, u_initial = props.calc("PD", "H;E", pressure_initial, density)
+    h_final, u_final = props.calc("PD", "H;E", pressure_final, density)
     
     # Calculate energy change and time duration
     du = u_final - u_initial
@@ -23,30 +111,31 @@ def boil_to_pressure(mass_initial, pressure_initial, pressure_final):
     return h_final, dt
 
 def boil_over_time(mass_initial, pressure_initial, time_duration):
+    props = get_backend()
 
     density = mass_initial / TANK_VOLUME
     
     # Calculate initial state
-    u_initial = CP.PropsSI('U', 'D', density, 'P', pressure_initial, 'parahydrogen')
+    u_initial = props.calc("PD", "E", pressure_initial, density)[0]
     
     # Calculate final internal energy
     u_final = u_initial + (TRAILER_HEAT_LOAD * time_duration) / mass_initial
     
     # Find final pressure
-    pressure_final = CP.PropsSI('P', 'D', density, 'U', u_final, 'parahydrogen')
+    pressure_final = props.calc("DE", "P", density, u_final)[0]
     
     return pressure_final
 
 def vent_trailer(mass_initial, pressure_initial, pressure_final):
+    props = get_backend()
 
     density_initial = mass_initial / TANK_VOLUME
     
     # Calculate initial entropy
-    s_initial = CP.PropsSI('S', 'D', density_initial, 'P', pressure_initial, 'parahydrogen')
+    s_initial = props.calc("PD", "S", pressure_initial, density_initial)[0]
         
     # Calculate new density at final pressure, with same entropy
-    density_final = CP.PropsSI('D', 'P', pressure_final, 'S', s_initial, 'parahydrogen')
-    x_final = CP.PropsSI('Q', 'D', density_final, 'S', s_initial, 'parahydrogen')
+    density_final, x_final = props.calc("PS", "D;QMASS", pressure_final, s_initial)
 
     if x_final < 0 or x_final > 1:
         x_final = 1
@@ -61,6 +150,7 @@ def vent_trailer(mass_initial, pressure_initial, pressure_final):
     return total_mass_final, mass_vented, mass_liq_final, mass_gas_final
 
 def offload_parahydrogen(P_initial_trailer, P_initial_station, m_initial_trailer, m_initial_station, V_station):
+    props = get_backend()
     P_gauge_limit = 253312  # 2.5 bar gauge converted to Pa absolute
     P_diff = 0.4 * 100000  # 0.4 bar gauge converted to Pa
     max_iterations = 1000
@@ -69,28 +159,29 @@ def offload_parahydrogen(P_initial_trailer, P_initial_station, m_initial_trailer
     P_station = P_initial_station
     m_trailer = m_initial_trailer
     m_station = m_initial_station
+    m_station_limit = props.calc("PQ", "D", P_gauge_limit, 0)[0] * TANK_VOLUME
     
     for step in range(max_iterations):
         # Calculate densities
-        rho_trailer = CP.PropsSI('D', 'P', P_trailer, 'Q', 0, 'parahydrogen')
+        rho_trailer = props.calc("PQ", "D", P_trailer, 0)[0]
         rho_station = m_station / V_station
         
         # Calculate new pressure in station
         P_new_station = P_station + 1000  # Increase by 1 kPa each step
         
         # Calculate mass transfer
-        rho_new_station = CP.PropsSI('D', 'P', P_new_station, 'Q', 0, 'parahydrogen')
+        rho_new_station = props.calc("PQ", "D", P_new_station, 0)[0]
         m_transferred = V_station * (rho_new_station - rho_station)
         
         # Check stop conditions
         if m_transferred > m_trailer:
-            print(f"Stop: Trailer empty at step {step}")
+            debug("Stop: Trailer empty at step {step}", step=step)
             break
         if P_new_station > P_gauge_limit:
-            print(f"Stop: Station pressure limit reached at step {step}")
+            debug("Stop: Station pressure limit reached at step {step}", step=step)
             break
-        if m_station + m_transferred > CP.PropsSI('D', 'P', P_gauge_limit, 'Q', 0, 'parahydrogen') * TANK_VOLUME:
-            print(f"Stop: Station mass limit reached at step {step}")
+        if m_station + m_transferred > m_station_limit:
+            debug("Stop: Station mass limit reached at step {step}", step=step)
             break
         
         # Update values
@@ -99,32 +190,33 @@ def offload_parahydrogen(P_initial_trailer, P_initial_station, m_initial_trailer
         P_station = P_new_station
         P_trailer = P_station + P_diff
         
-        print(f"Step {step}")
-        print(f"Pressure: {P_station:.1f}")
+        debug("Step {step}", step=step)
+        debug("Pressure: {P_station:.1f}", P_station=P_station)
     
-    print("Pressure Halt")
-    print(f"station mass: {m_station:.12f}")
-    print(f"station pressure: {P_station:.1f}")
+    debug("Pressure Halt")
+    debug("station mass: {m_station:.12f}", m_station=m_station)
+    debug("station pressure: {P_station:.1f}", P_station=P_station)
     
     return P_station, m_station, m_trailer
 
 def offload_const_pressure(mass_trailer_initial, mass_station_initial, pressure, station_volume, max_station_fill_fraction):
+    props = get_backend()
 
     # Calculate initial trailer state
     density_trailer_initial = mass_trailer_initial / TANK_VOLUME
-    u_trailer_initial = CP.PropsSI('U', 'D', density_trailer_initial, 'P', pressure, 'parahydrogen')
+    u_trailer_initial = props.calc("PD", "E", pressure, density_trailer_initial)[0]
     
     # Calculate initial station state
     density_station_initial = mass_station_initial / station_volume
-    u_station_initial = CP.PropsSI('U', 'D', density_station_initial, 'P', pressure, 'parahydrogen')
+    u_station_initial = props.calc("PD", "E", pressure, density_station_initial)[0]
     
     # Calculate maximum mass that can be transferred
-    density_gas = CP.PropsSI('D', 'P', pressure, 'Q', 1, 'parahydrogen')
+    density_gas = props.calc("PQ", "D", pressure, 1)[0]
     mass_gas_trailer_empty = TANK_VOLUME * density_gas
     mass_liquid_available = mass_trailer_initial - mass_gas_trailer_empty
     
     # Calculate mass needed to fill station
-    density_liquid = CP.PropsSI('D', 'P', pressure, 'Q', 0, 'parahydrogen')
+    density_liquid = props.calc("PQ", "D", pressure, 0)[0]
     mass_station_max = station_volume * density_liquid * max_station_fill_fraction
     mass_transfer_needed = mass_station_max - mass_station_initial
     
@@ -135,8 +227,8 @@ def offload_const_pressure(mass_trailer_initial, mass_station_initial, pressure,
     mass_trailer_final = mass_trailer_initial - mass_transfer
     mass_station_final = mass_station_initial + mass_transfer
     
-    u_trailer_final = CP.PropsSI('U', 'D', mass_trailer_final/TANK_VOLUME, 'P', pressure, 'parahydrogen')
-    u_station_final = CP.PropsSI('U', 'D', mass_station_final/station_volume, 'P', pressure, 'parahydrogen')
+    u_trailer_final = props.calc("PD", "E", pressure, mass_trailer_final/TANK_VOLUME)[0]
+    u_station_final = props.calc("PD", "E", pressure, mass_station_final/station_volume)[0]
     
     # Calculate energy required
     energy_added = (u_trailer_final - u_trailer_initial) * mass_trailer_final
@@ -144,11 +236,11 @@ def offload_const_pressure(mass_trailer_initial, mass_station_initial, pressure,
     return mass_transfer, energy_added, u_trailer_final, u_station_final
 
 def fill_trailer_const_pressure(mass_initial, mass_final, pressure):
+    props = get_backend()
 
     # Initial state
     density_initial = mass_initial / TANK_VOLUME
-    u_initial = CP.PropsSI('U', 'D', density_initial, 'P', pressure, 'parahydrogen')
-    x_initial = CP.PropsSI('Q', 'D', density_initial, 'P', pressure, 'parahydrogen')
+    u_initial, x_initial = props.calc("PD", "E;QMASS", pressure, density_initial)
     
     if x_initial < 0 or x_initial > 1:
         x_initial = 1
@@ -157,8 +249,7 @@ def fill_trailer_const_pressure(mass_initial, mass_final, pressure):
 
     # Final state
     density_final = mass_final / TANK_VOLUME
-    u_final = CP.PropsSI('U', 'D', density_final, 'P', pressure, 'parahydrogen')
-    x_final = CP.PropsSI('Q', 'D', density_final, 'P', pressure, 'parahydrogen')
+    u_final, x_final = props.calc("PD", "E;QMASS", pressure, density_final)
     
     if x_final < 0 or x_final > 1:
         x_final = 1
@@ -180,16 +271,18 @@ if __name__ == "__main__":
     
     # Test boil_to_pressure
     final_enthalpy, time_duration = boil_to_pressure(mass_initial, pressure_initial, pressure_final)
-    print(f"Boil to pressure: Final enthalpy = {final_enthalpy:.2f} J/kg, Time duration = {time_duration:.2f} seconds")
+    info("Boil to pressure: Final enthalpy = {final_enthalpy:.2f} J/kg, Time duration = {time_duration:.2f} seconds",
+         final_enthalpy=final_enthalpy, time_duration=time_duration)
     
     # Test boil_over_time
     time_duration = 5 * 24 * 3600  # 5 days in seconds
     final_pressure = boil_over_time(mass_initial, pressure_initial, time_duration)
-    print(f"Boil over time: Final pressure = {final_pressure:.2f} Pa")
+    info("Boil over time: Final pressure = {final_pressure:.2f} Pa", final_pressure=final_pressure)
     
     # Test vent_trailer
     mass_final, mass_vented, mass_liq_final, mass_gas_final = vent_trailer(mass_initial, pressure_final, pressure_initial)
-    print(f"Vent trailer: Final mass = {mass_final:.2f} kg, Vented mass = {mass_vented:.2f} kg, mass_liq_final = {mass_liq_final:.2f} kg, mass_gas_final = {mass_gas_final:.2f} kg")
+    info("Vent trailer: Final mass = {mass_final:.2f} kg, Vented mass = {mass_vented:.2f} kg, mass_liq_final = {mass_liq_final:.2f} kg, mass_gas_final = {mass_gas_final:.2f} kg",
+         mass_final=mass_final, mass_vented=mass_vented, mass_liq_final=mass_liq_final, mass_gas_final=mass_gas_final)
     
     # Test offload_varying_pressure
     P_initial_trailer = 31.7 * 6894.76 + 101325  # 31.7 psig converted to Pa absolute
@@ -202,10 +295,10 @@ if __name__ == "__main__":
         P_initial_trailer, P_initial_station, m_initial_trailer, m_initial_station, V_station
     )
 
-    print(f"\nFinal Results:")
-    print(f"Final station pressure: {final_pressure:.1f} Pa")
-    print(f"Final station mass: {final_station_mass:.2f} kg")
-    print(f"Final trailer mass: {final_trailer_mass:.2f} kg")
+    info("\nFinal Results:")
+    info("Final station pressure: {final_pressure:.1f} Pa", final_pressure=final_pressure)
+    info("Final station mass: {final_station_mass:.2f} kg", final_station_mass=final_station_mass)
+    info("Final trailer mass: {final_trailer_mass:.2f} kg", final_trailer_mass=final_trailer_mass)
 
     # Test offload_const_pressure
     # Assumptions:
@@ -217,14 +310,15 @@ if __name__ == "__main__":
     mass_transfer, energy_added, u_trailer_final, u_station_final = offload_const_pressure(
         mass_initial, mass_station_initial, offload_pressure, station_volume, max_station_fill_fraction
     )
-    print(f"Offload const pressure: Mass transferred = {mass_transfer:.2f} kg")
-    print(f"Energy added to trailer = {energy_added:.2f} J")
-    print(f"Final trailer enthalpy = {u_trailer_final:.2f} J/kg")
-    print(f"Final station enthalpy = {u_station_final:.2f} J/kg")
+    info("Offload const pressure: Mass transferred = {mass_transfer:.2f} kg", mass_transfer=mass_transfer)
+    info("Energy added to trailer = {energy_added:.2f} J", energy_added=energy_added)
+    info("Final trailer enthalpy = {u_trailer_final:.2f} J/kg", u_trailer_final=u_trailer_final)
+    info("Final station enthalpy = {u_station_final:.2f} J/kg", u_station_final=u_station_final)
         
     # Test fill_trailer_const_pressure
     mass_offload_final = 1680  # kg
     mass_offload_initial = 80
     change_mass, mass_liq_added, mass_gas_added = fill_trailer_const_pressure(mass_offload_initial, mass_offload_final, pressure_final)
-    print(f"Fill trailer const pressure: Change in mass = {change_mass:.2f} kg")
-    print(f"Mass of liquid added = {mass_liq_added:.2f} kg, Mass of gas added = {mass_gas_added:.2f} kg")
\ No newline at end of file
+    info("Fill trailer const pressure: Change in mass = {change_mass:.2f} kg", change_mass=change_mass)
+    info("Mass of liquid added = {mass_liq_added:.2f} kg, Mass of gas added = {mass_gas_added:.2f} kg",
+         mass_liq_added=mass_liq_added, mass_gas_added=mass_gas_added)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""Monte Carlo fleet simulation: many independent trailer-years at once.
+
+Each replicate is one trailer running the OneFullCycle sequence over and
+over: an outbound trip (boil-off), heating to station pressure if it
+arrives below it, offload with rising and then constant pressure, a return
+trip, venting to fill pressure and a fill at the plant. Trips vent at the
+relief pressure when the boil-off reaches it. Transport times and the
+station's starting mass are drawn for every delivery and the trailer's heat
+load (TRAILER_HEAT_LOAD varies from trailer to trailer) once per replicate.
+
+Replicates still inside their horizon advance together, one cycle per
+iteration, through the *_batch process functions of AllFunctions, so a
+cycle costs the same handful of NumPy property calls for any number of
+replicates. A cycle counts if it starts within the horizon. The result is
+a structured array (RESULT_DTYPE) with one row per replicate:
+
+    python montecarlo.py [--replicates N] [--years Y] [--seed S] [--steps N]
+"""
+import argparse
+
+import numpy as np
+
+from AllFunctions import (TRAILER_HEAT_LOAD, boil_over_time_batch, boil_to_pressure_batch,
+                          fill_trailer_const_pressure_batch, offload_const_pressure_batch,
+                          offload_with_raising_pressure_batch, vent_trailer_batch,
+                          m_station_max, offload_pressure, station_max_fill_fraction, station_pressure_initial,
+                          station_volume, trailer_mass_initial, trailer_mass_max, trailer_pressure_fill,
+                          trailer_pressure_initial, trailer_pressure_max, trailer_volume)
+from properties import get_backend, profile_phase, profile_report
+from tracing import info
+
+DAY = 24 * 3600.0  # s
+YEAR = 365 * DAY
+
+RESULT_DTYPE = np.dtype([
+    ("heat_load", "f8"),  # W
+    ("cycles", "i8"),
+    ("delivered", "f8"),  # kg received by the stations
+    ("vented", "f8"),  # kg, trailer venting and gas displaced at the stations
+    ("waited", "f8"),  # s spent heating to station pressure
+])
+
+
+def _trip(mass, pressure, duration, heat_load, vented):
+    # Boil-off over a trip, venting down to the relief pressure if it gets there
+    pressure, _ = boil_over_time_batch(mass, pressure, duration, heat_load)
+    relief = np.flatnonzero(pressure > trailer_pressure_max)
+    if relief.size:
+        mass[relief], vent, _, _ = vent_trailer_batch(mass[relief], pressure[relief], trailer_pressure_max)
+        vented[relief] += vent
+        pressure[relief] = trailer_pressure_max
+    return mass, pressure
+
+
+def simulate_fleet(replicates=10000, years=1.0, transport_time=(0.5 * DAY, 1.5 * DAY), station_mass=(50.0, 300.0),
+                   heat_load_spread=0.2, seed=None, steps=32):
+    """Simulate ``replicates`` trailers for ``years``; returns a RESULT_DTYPE array.
+
+    Transport times (s, each way) and station starting masses (kg) are
+    uniform on the given ranges; the heat load is lognormal around
+    TRAILER_HEAT_LOAD with ``heat_load_spread`` the sigma of its logarithm.
+    ``steps`` is the number of Runge-Kutta steps of the rising-pressure
+    offload.
+    """
+    rng = np.random.default_rng(seed)
+    results = np.zeros(replicates, dtype=RESULT_DTYPE)
+    results["heat_load"] = TRAILER_HEAT_LOAD * rng.lognormal(0.0, heat_load_spread, replicates)
+    mass = np.full(replicates, float(trailer_mass_initial))
+    pressure = np.full(replicates, float(trailer_pressure_initial))
+    clock = np.zeros(replicates)
+    horizon = years * YEAR
+
+    active = np.flatnonzero(clock < horizon)
+    while active.size:
+        count = active.size
+        heat_load = results["heat_load"][active]
+        m, P = mass[active], pressure[active]
+        vented = np.zeros(count)
+        outbound = rng.uniform(*transport_time, count)
+        inbound = rng.uniform(*transport_time, count)
+        m_station = rng.uniform(*station_mass, count)
+
+        with profile_phase("1. Outbound trip"):
+            m, P = _trip(m, P, outbound, heat_load, vented)
+            below = np.flatnonzero(P < station_pressure_initial)
+            waited = np.zeros(count)
+            if below.size:
+                _, waited[below] = boil_to_pressure_batch(m[below], P[below], station_pressure_initial, heat_load[below])
+                P[below] = station_pressure_initial
+
+        with profile_phase("2. Offload with rising pressure"):
+            m_station_start = m_station
+            P, m_station, m = offload_with_raising_pressure_batch(
+                P, station_pressure_initial, m, m_station, station_volume, m_station_max, offload_pressure,
+                trailer_pressure_max, trailer_volume, steps)
+
+        with profile_phase("3. Offload at constant pressure"):
+            # Only stations below their fill limit, and only while the
+            # trailer has liquid to give
+            rho_L = get_backend().calc_array("PQ", "D", P, 0)[0]
+            topped = np.flatnonzero(m_station < station_volume * rho_L * station_max_fill_fraction)
+            if topped.size:
+                transfer, gas_vented, m_after, m_station_after, _ = offload_const_pressure_batch(
+                    m[topped], m_station[topped], P[topped], station_volume, station_max_fill_fraction)
+                moved = transfer > 0
+                m[topped[moved]] = m_after[moved]
+                m_station[topped[moved]] = m_station_after[moved]
+                vented[topped[moved]] += gas_vented[moved]
+
+        with profile_phase("4. Return trip"):
+            m, P = _trip(m, P, inbound, heat_load, vented)
+
+        with profile_phase("5. Vent trailer"):
+            high = np.flatnonzero(P > trailer_pressure_fill)
+            if high.size:
+                m[high], vent, _, _ = vent_trailer_batch(m[high], P[high], trailer_pressure_fill)
+                vented[high] += vent
+                P[high] = trailer_pressure_fill
+
+        with profile_phase("6. Fill trailer"):
+            change, _, _ = fill_trailer_const_pressure_batch(m, trailer_mass_max, P, trailer_volume)
+            m = m + change
+
+        mass[active], pressure[active] = m, P
+        clock[active] += outbound + waited + inbound
+        results["cycles"][active] += 1
+        results["delivered"][active] += m_station - m_station_start
+        results["vented"][active] += vented
+        results["waited"][active] += waited
+        active = active[clock[active] < horizon]
+    return results
+
+
+def summarize(results, percentiles=(5, 50, 95)):
+    # Mean, standard deviation and percentiles of delivered and vented mass
+    summary = {}
+    for name in ("delivered", "vented"):
+        values = results[name]
+        summary[name] = dict(mean=float(values.mean()), std=float(values.std()),
+                             **{f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))})
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of independent trailer-years")
+    parser.add_argument("--replicates", type=int, default=10000)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--steps", type=int, default=32, help="Runge-Kutta steps per rising-pressure offload")
+    args = parser.parse_args()
+
+    results = simulate_fleet(args.replicates, args.years, seed=args.seed, steps=args.steps)
+    info("{replicates} trailers, {years:g} years, {cycles:.1f} cycles each on average",
+         replicates=len(results), years=args.years, cycles=results["cycles"].mean())
+    for name, stats in summarize(results).items():
+        info("{name:>9}: mean {mean:.0f} kg, std {std:.0f} kg, 5% {p5:.0f} kg, median {p50:.0f} kg, 95% {p95:.0f} kg",
+             name=name, **stats)
+    report = profile_report()
+    if report is not None:
+        info("\nProperty calls by phase:\n{report}", report=report)
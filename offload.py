@@ -0,0 +1,423 @@
+"""Engines for the rising-pressure offload (see offload_with_raising_pressure).
+
+While the trailer pushes liquid into the station, the station contents are
+compressed isentropically and the freed volume fills with saturated liquid.
+The original model marches that mass balance in fixed 1 kPa steps; in the
+limit of small steps it is the ODE in pressure
+
+    dm_station/dP = V_station * rho_L(P) * (d ln rho / dP)_s
+
+with rho = m_station / V_station and s = s(P, rho). The trailer holds the
+rest of the fixed total mass. ``integrate_adaptive`` solves it with an
+embedded Bogacki-Shampine 3(2) pair whose step size is set by ``rtol`` and
+``atol``, and locates the stop conditions (pressure limit, station full,
+trailer down to vapor) exactly instead of at the next grid point.
+
+``solve_ode`` integrates the same model as a system in station mass and
+station entropy with scipy's ``solve_ivp`` (LSODA by default, which switches
+between stiff and non-stiff methods), using terminal events for the stop
+conditions. It returns an ``OffloadSolution`` whose dense output gives the
+station mass and entropy at any pressure along the way.
+
+``integrate_batch`` advances many independent offloads together, one
+NumPy property call per stage for all of them: classic Runge-Kutta with
+``steps`` steps between each offload's starting pressure and its limit.
+A step that crosses a stop condition is rejected and taken again just
+short of the crossing estimated by linear interpolation, so the station
+fill and the trailer running dry are located to within ``xtol`` of the
+pressure, and stage masses are held at the station capacity. It is
+for Monte Carlo sweeps, where thousands of offloads at modest accuracy
+beat a few at tight tolerances.
+
+Both single-offload engines take an optional ``Trajectory``, which receives the starting
+state and every accepted step as rows of a NumPy structured array
+(``TRAJECTORY_DTYPE``) for plotting and post-processing.
+"""
+import math
+
+import numpy as np
+
+from properties import get_backend
+
+PRESSURE_HALT = "pressure"
+STATION_FULL = "station_full"
+TRAILER_EMPTY = "trailer_empty"
+STEP_LIMIT = "step_limit"
+
+TRAJECTORY_DTYPE = np.dtype([
+    ("P", "f8"),  # Pa
+    ("m_station", "f8"),  # kg
+    ("m_trailer", "f8"),  # kg
+    ("m_transfer", "f8"),  # kg moved into the station since the previous row
+    ("Q_step", "f8"),  # J of heat into the combined contents since the previous row
+    ("Q_total", "f8"),  # J since the start
+])
+
+
+class Trajectory:
+    # Offload states appended row by row into a preallocated structured
+    # array, which doubles in size when full
+
+    def __init__(self, capacity=256):
+        self._rows = np.zeros(max(1, capacity), dtype=TRAJECTORY_DTYPE)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size):
+        capacity = len(self._rows)
+        if size > capacity:
+            while capacity < size:
+                capacity *= 2
+            rows = np.zeros(capacity, dtype=TRAJECTORY_DTYPE)
+            rows[:self._size] = self._rows[:self._size]
+            self._rows = rows
+
+    def append(self, P, m_station, m_trailer, m_transfer=0.0, Q_step=0.0, Q_total=0.0):
+        self._reserve(self._size + 1)
+        self._rows[self._size] = (P, m_station, m_trailer, m_transfer, Q_step, Q_total)
+        self._size += 1
+
+    def extend(self, P, m_station, m_trailer):
+        # Rows for arrays of states; transfers and heat stay zero
+        P = np.asarray(P, dtype=float)
+        self._reserve(self._size + len(P))
+        rows = self._rows[self._size:self._size + len(P)]
+        rows["P"] = P
+        rows["m_station"] = m_station
+        rows["m_trailer"] = m_trailer
+        self._size += len(P)
+
+    @property
+    def rows(self):
+        # View of the filled part; copy it to keep it past further appends
+        return self._rows[:self._size]
+
+
+class RisingPressureOffload:
+    # Right-hand side and stop functions for one offload
+
+    def __init__(self, m_total, V_station, V_trailer, m_station_max, P_max, props=None, dP_rel=1e-3):
+        self.m_total = m_total
+        self.V_station = V_station
+        self.V_trailer = V_trailer
+        self.m_station_max = m_station_max
+        self.P_max = P_max
+        self.props = props or get_backend()
+        self.dP_rel = dP_rel
+        self._saturation = (None, None)
+
+    def saturated(self, P):
+        # Liquid density, vapor density and liquid entropy at P from one
+        # flash; the trailer check reuses it from the rate at the same P
+        if self._saturation[0] != P:
+            self._saturation = (P, self.props.calc("PQ", "DLIQ;DVAP;S", P, 0))
+        return self._saturation[1]
+
+    def rate(self, P, m_station):
+        # dm_station/dP, with the isentropic compressibility of the station
+        # contents from a central difference of two "PS" flashes
+        props = self.props
+        rho = m_station / self.V_station
+        s = props.calc("PD", "S", P, rho)[0]
+        dP = self.dP_rel * P
+        rho_hi = props.calc("PS", "D", P + dP, s)[0]
+        rho_lo = props.calc("PS", "D", P - dP, s)[0]
+        rho_L = self.saturated(P)[0]
+        return self.V_station * rho_L * (math.log(rho_hi) - math.log(rho_lo)) / (2 * dP)
+
+    def ode_rate(self, P, y):
+        # d(m_station, s_station)/dP: the station contents follow their
+        # isentrope while saturated liquid at entropy s_L is added. Same as
+        # rate() for a saturated station; a superheated one would also gain
+        # mixing entropy, which this leaves out
+        m_station, s = y
+        props = self.props
+        dP = self.dP_rel * P
+        rho_hi = props.calc("PS", "D", P + dP, s)[0]
+        rho_lo = props.calc("PS", "D", P - dP, s)[0]
+        rho_L, _, s_L = self.saturated(P)
+        dm = self.V_station * rho_L * (math.log(rho_hi) - math.log(rho_lo)) / (2 * dP)
+        return [dm, (s_L - s) * dm / m_station]
+
+    def trailer_margin(self, P, m_station):
+        # Trailer mass above what its volume holds as saturated vapor
+        return self.m_total - m_station - self.V_trailer * self.saturated(P)[1]
+
+    def station_margin(self, m_station):
+        return self.m_station_max - m_station
+
+
+def _bs23_step(problem, P, m, h, f0):
+    # One Bogacki-Shampine step; returns the 3rd-order solution, the
+    # embedded error estimate and the derivative at the end (FSAL)
+    k2 = problem.rate(P + 0.5 * h, m + 0.5 * h * f0)
+    k3 = problem.rate(P + 0.75 * h, m + 0.75 * h * k2)
+    m_new = m + h * (2 * f0 + 3 * k2 + 4 * k3) / 9
+    f_new = problem.rate(P + h, m_new)
+    m_low = m + h * (7 * f0 / 24 + k2 / 4 + k3 / 3 + f_new / 8)
+    return m_new, m_new - m_low, f_new
+
+
+def _hermite(P0, m0, f0, P1, m1, f1, P):
+    # Cubic Hermite interpolant of the accepted step
+    h = P1 - P0
+    t = (P - P0) / h
+    return ((2 * t ** 3 - 3 * t ** 2 + 1) * m0 + (t ** 3 - 2 * t ** 2 + t) * h * f0
+            + (3 * t ** 2 - 2 * t ** 3) * m1 + (t ** 3 - t ** 2) * h * f1)
+
+
+def _locate(g, lo, hi, g_lo, g_hi, xtol):
+    # Illinois regula falsi for a sign change of g on [lo, hi]
+    side = 0
+    x = hi
+    for _ in range(100):
+        x = (lo * g_hi - hi * g_lo) / (g_hi - g_lo)
+        gx = g(x)
+        if gx == 0 or hi - lo < xtol:
+            break
+        if gx * g_hi > 0:
+            hi, g_hi = x, gx
+            if side == 1:
+                g_lo *= 0.5
+            side = 1
+        else:
+            lo, g_lo = x, gx
+            if side == -1:
+                g_hi *= 0.5
+            side = -1
+    return x
+
+
+def integrate_adaptive(problem, P_initial, m_station_initial, rtol=1e-6, atol=1e-3, max_steps=10000,
+                       trajectory=None):
+    """Integrate from P_initial until a stop condition; returns (P, m_station, reason).
+
+    ``trajectory`` (a ``Trajectory``) receives the pressure and masses at the
+    start, after every accepted step and at the stop.
+    """
+    P, m = P_initial, m_station_initial
+    record = trajectory.append if trajectory is not None else None
+    if record:
+        record(P, m, problem.m_total - m)
+    if P >= problem.P_max:
+        return P, m, PRESSURE_HALT
+    if problem.station_margin(m) <= 0:
+        return P, m, STATION_FULL
+    if problem.trailer_margin(P, m) <= 0:
+        return P, m, TRAILER_EMPTY
+
+    f = problem.rate(P, m)
+    h = min(problem.P_max - P, 0.05 * P)
+    for _ in range(max_steps):
+        h = min(h, problem.P_max - P)
+        m_new, error, f_new = _bs23_step(problem, P, m, h, f)
+        scale = atol + rtol * max(abs(m), abs(m_new))
+        ratio = abs(error) / scale
+        if ratio > 1:
+            h *= max(0.2, 0.9 * ratio ** (-1 / 3))
+            continue
+
+        P_new = P + h
+        g_station = problem.station_margin(m_new)
+        g_trailer = problem.trailer_margin(P_new, m_new)
+        if g_station <= 0 or g_trailer <= 0:
+            # Find the first crossing on the step's interpolant. A full
+            # station is at its capacity there; an empty trailer takes one
+            # step of exactly that length to land on it
+            xtol = 1e-9 * P_new
+            events = []
+            if g_station <= 0:
+                events.append((_locate(lambda x: problem.station_margin(_hermite(P, m, f, P_new, m_new, f_new, x)),
+                                       P, P_new, problem.station_margin(m), g_station, xtol), STATION_FULL))
+            if g_trailer <= 0:
+                events.append((_locate(lambda x: problem.trailer_margin(x, _hermite(P, m, f, P_new, m_new, f_new, x)),
+                                       P, P_new, problem.trailer_margin(P, m), g_trailer, xtol), TRAILER_EMPTY))
+            P_event, reason = min(events)
+            if reason == STATION_FULL:
+                m_event = problem.m_station_max
+            else:
+                m_event = _bs23_step(problem, P, m, P_event - P, f)[0] if P_event > P else m
+            if record and P_event > P:
+                record(P_event, m_event, problem.m_total - m_event)
+            return P_event, m_event, reason
+
+        P, m, f = P_new, m_new, f_new
+        if P >= problem.P_max:
+            P = problem.P_max
+        if record:
+            record(P, m, problem.m_total - m)
+        if P >= problem.P_max:
+            return P, m, PRESSURE_HALT
+        h *= min(5.0, 0.9 * ratio ** (-1 / 3)) if ratio > 0 else 5.0
+    return P, m, STEP_LIMIT
+
+
+class OffloadSolution:
+    """Result of ``solve_ode`` with a continuous trajectory in pressure.
+
+    ``P``, ``m_station`` and ``reason`` describe where the offload stopped;
+    ``station_mass(P)``, ``station_entropy(P)`` and ``trailer_mass(P)``
+    evaluate the trajectory at any pressure between ``P_initial`` and ``P``
+    (scalars or arrays).
+    """
+
+    def __init__(self, P_initial, P, m_station, s_station, m_total, reason, sol=None, nfev=0):
+        self.P_initial = P_initial
+        self.P = P
+        self.m_station = m_station
+        self.s_station = s_station
+        self.m_total = m_total
+        self.reason = reason
+        self.sol = sol
+        self.nfev = nfev
+
+    @property
+    def m_trailer(self):
+        return self.m_total - self.m_station
+
+    def _state(self, P):
+        P = np.clip(P, self.P_initial, self.P)
+        if self.sol is None:
+            return np.full(np.shape(P), self.m_station), np.full(np.shape(P), self.s_station)
+        m, s = self.sol(P)
+        return m, s
+
+    def station_mass(self, P):
+        return self._state(P)[0]
+
+    def station_entropy(self, P):
+        return self._state(P)[1]
+
+    def trailer_mass(self, P):
+        return self.m_total - self.station_mass(P)
+
+
+def solve_ode(problem, P_initial, m_station_initial, rtol=1e-6, atol=1e-3, method="LSODA", trajectory=None):
+    """Solve the offload with solve_ivp and terminal events; returns an OffloadSolution.
+
+    ``trajectory`` (a ``Trajectory``) receives the solver's accepted steps.
+    """
+    from scipy.integrate import solve_ivp
+
+    s_initial = problem.props.calc("PD", "S", P_initial, m_station_initial / problem.V_station)[0]
+
+    def stopped(reason):
+        if trajectory is not None:
+            trajectory.append(P_initial, m_station_initial, problem.m_total - m_station_initial)
+        return OffloadSolution(P_initial, P_initial, m_station_initial, s_initial, problem.m_total, reason)
+
+    if P_initial >= problem.P_max:
+        return stopped(PRESSURE_HALT)
+    if problem.station_margin(m_station_initial) <= 0:
+        return stopped(STATION_FULL)
+    if problem.trailer_margin(P_initial, m_station_initial) <= 0:
+        return stopped(TRAILER_EMPTY)
+
+    def station_full(P, y):
+        return problem.station_margin(y[0])
+
+    def trailer_empty(P, y):
+        return problem.trailer_margin(P, y[0])
+
+    for event in (station_full, trailer_empty):
+        event.terminal = True
+        event.direction = -1
+
+    # Entropy and mass differ by orders of magnitude, so atol applies to the
+    # mass and a matching relative tolerance to the entropy
+    atol_s = rtol * abs(s_initial) or atol
+    result = solve_ivp(problem.ode_rate, (P_initial, problem.P_max), [m_station_initial, s_initial],
+                       method=method, events=(station_full, trailer_empty), dense_output=True,
+                       rtol=rtol, atol=[atol, atol_s])
+    if not result.success:
+        raise RuntimeError(f"Offload integration failed: {result.message}")
+
+    reason = PRESSURE_HALT
+    P, (m_station, s_station) = result.t[-1], result.y[:, -1]
+    if result.status == 1:
+        # The earliest terminal event ends the integration
+        for events, name in zip(result.t_events, (STATION_FULL, TRAILER_EMPTY)):
+            if len(events):
+                reason = name
+        if reason == STATION_FULL:
+            m_station = problem.m_station_max
+    if trajectory is not None:
+        m_steps = result.y[0].copy()
+        m_steps[-1] = m_station
+        trajectory.extend(result.t, m_steps, problem.m_total - m_steps)
+    return OffloadSolution(P_initial, float(P), float(m_station), float(s_station), problem.m_total,
+                           reason, result.sol, result.nfev)
+
+
+def _batch_rate(props, V_station, m_station_max, P, m_station, dP_rel):
+    # RisingPressureOffload.rate for arrays of states, with both sides of the
+    # central difference in one "PS" call. Stages of a step that ends near
+    # the fill are evaluated at no more than the station capacity
+    s = props.calc_array("PD", "S", P, np.minimum(m_station, m_station_max) / V_station)[0]
+    dP = dP_rel * P
+    rho = props.calc_array("PS", "D", np.concatenate([P + dP, P - dP]), np.concatenate([s, s]))[0]
+    rho_L = props.calc_array("PQ", "DLIQ", P, 0)[0]
+    return V_station * rho_L * (np.log(rho[:len(P)]) - np.log(rho[len(P):])) / (2 * dP)
+
+
+def integrate_batch(m_total, V_station, V_trailer, m_station_max, P_max, P_initial, m_station_initial, steps=32,
+                    props=None, dP_rel=1e-3, xtol=1e-6):
+    """Integrate many offloads at once; returns arrays (P, m_station, reason).
+
+    Every argument but ``steps`` may be a scalar or an array with one entry
+    per offload. ``reason`` holds PRESSURE_HALT, STATION_FULL or
+    TRAILER_EMPTY for each offload. Stop conditions are located to within
+    ``xtol`` times the limiting pressure.
+    """
+    props = props or get_backend()
+    m_total, V_station, V_trailer, m_station_max, P_max, P, m = (
+        np.array(a, dtype=float, ndmin=1) for a in np.broadcast_arrays(
+            m_total, V_station, V_trailer, m_station_max, P_max, P_initial, m_station_initial))
+    reason = np.full(P.shape, PRESSURE_HALT, dtype=object)
+    g_station = m_station_max - m
+    g_trailer = m_total - m - V_trailer * props.calc_array("PQ", "DVAP", P, 0)[0]
+    reason[g_trailer <= 0] = TRAILER_EMPTY
+    reason[g_station <= 0] = STATION_FULL
+    active = (P < P_max) & (g_station > 0) & (g_trailer > 0)
+    h = np.where(active, (P_max - P) / steps, 0.0)
+    h_min = xtol * P_max
+    while active.any():
+        i = np.flatnonzero(active)
+        P0, m0, V, cap = P[i], m[i], V_station[i], m_station_max[i]
+        hi = np.minimum(h[i], P_max[i] - P0)
+        k1 = _batch_rate(props, V, cap, P0, m0, dP_rel)
+        k2 = _batch_rate(props, V, cap, P0 + 0.5 * hi, m0 + 0.5 * hi * k1, dP_rel)
+        k3 = _batch_rate(props, V, cap, P0 + 0.5 * hi, m0 + 0.5 * hi * k2, dP_rel)
+        k4 = _batch_rate(props, V, cap, P0 + hi, m0 + hi * k3, dP_rel)
+        P1, m1 = P0 + hi, m0 + hi * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+        station_new = cap - m1
+        trailer_new = m_total[i] - m1 - V_trailer[i] * props.calc_array("PQ", "DVAP", P1, 0)[0]
+
+        # Fraction of the step at which each margin reaches zero (1 if not)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_station = np.where(station_new <= 0, g_station[i] / (g_station[i] - station_new), 1.0)
+            t_trailer = np.where(trailer_new <= 0, g_trailer[i] / (g_trailer[i] - trailer_new), 1.0)
+        t = np.minimum(t_station, t_trailer)
+
+        # A step that crosses a stop condition is taken again, shortened to
+        # just before the estimated crossing, until it is shorter than h_min
+        retry = (t < 1) & (hi > h_min[i])
+        h[i[retry]] = hi[retry] * np.clip(0.98 * t[retry], 0.05, 0.9)
+        keep = ~retry
+        i, P0, m0, hi, P1, m1, t = i[keep], P0[keep], m0[keep], hi[keep], P1[keep], m1[keep], t[keep]
+        station_new, trailer_new = station_new[keep], trailer_new[keep]
+        t_station, t_trailer = t_station[keep], t_trailer[keep]
+        P[i] = np.where(t < 1, P0 + t * hi, P1)
+        m[i] = np.where(t < 1, m0 + t * (m1 - m0), m1)
+        g_station[i], g_trailer[i] = station_new, trailer_new
+        full = (station_new <= 0) & (t_station <= t_trailer)
+        empty = (trailer_new <= 0) & ~full
+        m[i[full]] = m_station_max[i[full]]
+        reason[i[full]] = STATION_FULL
+        reason[i[empty]] = TRAILER_EMPTY
+        halted = P[i] >= P_max[i] * (1 - 1e-12)
+        P[i[halted & ~full & ~empty]] = P_max[i[halted & ~full & ~empty]]
+        active[i[full | empty | halted]] = False
+    return P, m, reason
@@ -1,16 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import os
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
 from AllFunctions import (boil_to_pressure, offload_with_raising_pressure,
                           offload_const_pressure, boil_over_time, vent_trailer,
                           fill_trailer_const_pressure)
+from properties import get_backend
+from sweep import run_sweep
+from tracing import debug
 
-# Initialize REFPROP
-os.environ['RPPREFIX']=r'C:\Program Files\REFPROP'
-RP = REFPROPFunctionLibrary(os.environ['RPPREFIX'])
-RP.SETPATHdll(os.environ['RPPREFIX'])
-MASS_BASE_SI = RP.GETENUMdll(0, "MASS BASE SI").iEnum
+# Use the default REFPROP install when present, otherwise the property layer falls back to CoolProp
+if os.path.isdir(r'C:\Program Files\REFPROP'):
+    os.environ.setdefault('RPPREFIX', r'C:\Program Files\REFPROP')
 
 # Constants
 TRAILER_VOLUME = 32.0  # m^3
@@ -27,7 +27,7 @@ STATION_MAX_FILL_FRACTION = 0.95
 
 # Function to run a study
 def run_study(study_id, num_stations, station_mass_initial, station_pressure_initial):
-    print(f"\nRunning Study {study_id}")
+    debug("\nRunning Study {study_id}", study_id=study_id)
     total_mass_received = 0
     total_mass_vented = 0
     trailer_mass = TRAILER_MASS_INITIAL
@@ -50,16 +50,14 @@ def run_study(study_id, num_stations, station_mass_initial, station_pressure_ini
             final_pressure = STATION_VENT_PRESSURE
 
         station_max_mass = STATION_VOLUME * \
-                           RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, final_pressure, 0, [1.0]).Output[
-                               0] * STATION_MAX_FILL_FRACTION
+                           get_backend().calc("PQ", "D", final_pressure, 0)[0] * STATION_MAX_FILL_FRACTION
 
         if final_station_mass < station_max_mass:
-            mass_transfer, energy_added = offload_const_pressure(
+            mass_transfer, gas_vented, final_trailer_mass, final_station_mass, energy_added = offload_const_pressure(
                 final_trailer_mass, final_station_mass, final_pressure,
                 STATION_VOLUME, STATION_MAX_FILL_FRACTION
             )
-            final_trailer_mass -= mass_transfer
-            final_station_mass += mass_transfer
+            total_mass_vented += gas_vented
 
         mass_received = final_station_mass - station_mass_initial
         total_mass_received += mass_received
@@ -108,12 +106,12 @@ def run_single_study():
         messagebox.showerror("Error", f"Study {study_id} not found.")
         return None
 
-# Function to run all studies
+# Function to run all studies, in parallel across the cores
 def run_all_studies():
+    params = [(study["id"], study["num_stations"], study["starting_mass"], study["pressure"]) for study in studies]
+    outcomes, _ = run_sweep(run_study, params)
     results = {}
-    for study in studies:
-        mass_received, mass_vented = run_study(study["id"], study["num_stations"], study["starting_mass"],
-                                               study["pressure"])
+    for study, (mass_received, mass_vented) in zip(studies, outcomes):
         results[study["id"]] = {
             "num_stations": study["num_stations"],
             "starting_mass": study["starting_mass"],
@@ -154,29 +152,31 @@ def on_run_all_studies():
     output_text.insert(tk.END, f"Least mass vented: Study {min_vented[0]}\n")
     output_text.insert(tk.END, f"  Mass Vented: {min_vented[1]['mass_vented']:.2f} kg\n")
 
-# Create main window
-root = tk.Tk()
-root.title("H2 Trailer Cycle Study")
-
-# Study selection
-study_id_var = tk.StringVar()
-tk.Label(root, text="Select Study ID:").grid(row=0, column=0, sticky="e")
-study_id_dropdown = ttk.Combobox(root, textvariable=study_id_var)
-study_id_dropdown['values'] = [study["id"] for study in studies]
-study_id_dropdown.grid(row=0, column=1)
-study_id_dropdown.current(0)  # Default to the first study ID
-
-# Run single study button
-run_single_button = ttk.Button(root, text="Run Single Study", command=on_run_single_study)
-run_single_button.grid(row=1, column=0, columnspan=2, pady=10)
-
-# Run all studies button
-run_all_button = ttk.Button(root, text="Run All Studies", command=on_run_all_studies)
-run_all_button.grid(row=2, column=0, columnspan=2, pady=10)
-
-# Output text area
-output_text = tk.Text(root, height=20, width=60)
-output_text.grid(row=3, column=0, columnspan=2, pady=10)
-
-# Start the application
-root.mainloop()
+# Worker processes re-import this module, so only build the GUI when run as a script
+if __name__ == "__main__":
+    # Create main window
+    root = tk.Tk()
+    root.title("H2 Trailer Cycle Study")
+
+    # Study selection
+    study_id_var = tk.StringVar()
+    tk.Label(root, text="Select Study ID:").grid(row=0, column=0, sticky="e")
+    study_id_dropdown = ttk.Combobox(root, textvariable=study_id_var)
+    study_id_dropdown['values'] = [study["id"] for study in studies]
+    study_id_dropdown.grid(row=0, column=1)
+    study_id_dropdown.current(0)  # Default to the first study ID
+
+    # Run single study button
+    run_single_button = ttk.Button(root, text="Run Single Study", command=on_run_single_study)
+    run_single_button.grid(row=1, column=0, columnspan=2, pady=10)
+
+    # Run all studies button
+    run_all_button = ttk.Button(root, text="Run All Studies", command=on_run_all_studies)
+    run_all_button.grid(row=2, column=0, columnspan=2, pady=10)
+
+    # Output text area
+    output_text = tk.Text(root, height=20, width=60)
+    output_text.grid(row=3, column=0, columnspan=2, pady=10)
+
+    # Start the application
+    root.mainloop()
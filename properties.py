@@ -0,0 +1,656 @@
+"""Thermodynamic property backends for the trailer/station process functions.
+
+Every process function asks for properties through ``get_backend().calc``
+with a REFPROP-style input pair and output list, e.g.
+``calc("PD", "H;E", pressure, density)``. The concrete backend (REFPROP,
+CoolProp or a tabulated one) is chosen on first use and created once per
+process, so importing a module never loads a DLL and a forked worker builds
+its own copy instead of sharing the parent's handles.
+
+Backend selection, in order: ``set_backend()``, the
+``TRUEZERO_PROPERTY_BACKEND`` environment variable ("refprop", "coolprop",
+"table", or "analytic" for the closed-form stand-in in analytic.py), then
+"table". The tabulated backend wraps REFPROP if ``RPPREFIX``
+is set and CoolProp otherwise, and serves saturation ("PQ") calls from a
+spline table built once per process (see saturation.py). If a (P, D) table
+file exists (``TRUEZERO_PD_TABLE``, default parahyd_pd.table next to
+property_table.py) it is memory-mapped and also answers "PD", "DE" and "PS"
+calls inside the operating envelope (see property_table.py). Whatever is
+selected sits behind a bounded LRU memo (CachedBackend); ``cache_stats()``
+reports how many calls it saved. Setting ``TRUEZERO_PROPERTY_STORE`` adds a
+SQLite cache of exact calls shared across processes and runs (see
+property_store.py).
+
+``calc_array`` is the batched form of ``calc``: the inputs are NumPy arrays
+(broadcast against each other) and it returns one array per output. Each
+backend evaluates a batch in as few native calls as it can.
+
+A flash computes every property of a state, so ask for all the outputs a
+state needs in one call. Saturated liquid and vapor densities come from one
+"PQ" flash as "DLIQ;DVAP". ``PropertyBatch`` does this merging for a set of
+requests collected over one step.
+
+``TRUEZERO_PROPERTY_PROFILE=1`` (or ``instrument()``) puts an
+InstrumentedBackend on top of the stack, which counts calls and times them
+per input pair. Code marks its phases with ``with profile_phase("name"):``,
+which does nothing when the layer is absent, and ``profile_report()``
+formats the per-phase table. ``take_counters()`` and ``merge_counters()``
+carry the cache and profiling counts of a pool worker back to the parent.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+FLUID = "PARAHYD"
+
+# Input pairs are spelled a few different ways in the process functions
+INPUT_ALIASES = {
+    "P;QMASS": "PQ",
+    "P;Q": "PQ",
+    "PQMASS": "PQ",
+    "DP": "PD",
+    "SP": "PS",
+    "ED": "DE",
+    "DU": "DE",
+    "UD": "DE",
+}
+OUTPUT_ALIASES = {"U": "E", "Q": "QMASS"}
+
+
+def normalize_inputs(hin):
+    hin = hin.upper()
+    return INPUT_ALIASES.get(hin, hin)
+
+
+def normalize_outputs(hout):
+    if isinstance(hout, str):
+        hout = hout.split(";")
+    return tuple(OUTPUT_ALIASES.get(o.strip().upper(), o.strip().upper()) for o in hout)
+
+
+class PropertyBackend:
+    name = "base"
+    fluid = FLUID
+    version = ""
+    vectorized = False  # True if _calc_array evaluates a batch natively
+
+    def calc(self, hin, hout, a, b):
+        # Returns one float per requested output, in request order
+        return self._calc(normalize_inputs(hin), normalize_outputs(hout), a, b)
+
+    def calc_array(self, hin, hout, a, b):
+        # One array per requested output, shaped like the broadcast inputs
+        outputs = normalize_outputs(hout)
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+        values = self._calc_array(normalize_inputs(hin), outputs, a.ravel(), b.ravel())
+        return tuple(values.reshape((len(outputs),) + a.shape))
+
+    def _calc(self, hin, outputs, a, b):
+        raise NotImplementedError
+
+    def _calc_array(self, hin, outputs, a, b):
+        # Flat input arrays in, (len(outputs), n) array out; backends with a
+        # vectorized path override this
+        values = np.empty((len(outputs), len(a)))
+        for n, (x, y) in enumerate(zip(a.tolist(), b.tolist())):
+            values[:, n] = self._calc(hin, outputs, x, y)
+        return values
+
+    def reset(self):
+        # Drop anything bound to the current process (DLL handles, connections)
+        pass
+
+
+class RefpropBackend(PropertyBackend):
+    name = "refprop"
+
+    def __init__(self, path=None):
+        self.path = path
+        self._rp = None
+        self._mass_base_si = None
+
+    def _library(self):
+        if self._rp is None:
+            path = self.path or os.environ.get("RPPREFIX")
+            if not path:
+                raise RuntimeError("REFPROP backend needs RPPREFIX to point at the REFPROP install")
+            from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
+            rp = REFPROPFunctionLibrary(path)
+            rp.SETPATHdll(path)
+            self._mass_base_si = rp.GETENUMdll(0, "MASS BASE SI").iEnum
+            self._rp = rp
+        return self._rp
+
+    @property
+    def version(self):
+        return self._library().RPVersion()
+
+    def _calc(self, hin, outputs, a, b):
+        rp = self._library()
+        r = rp.REFPROPdll(self.fluid, hin, ";".join(outputs), self._mass_base_si, 0, 0, a, b, [1.0])
+        return tuple(r.Output[:len(outputs)])
+
+    def reset(self):
+        self._rp = None
+        self._mass_base_si = None
+
+
+class TabulatedBackend(PropertyBackend):
+    """Answers calls from precomputed tables and falls back to ``source``.
+
+    A table is any object with ``lookup(hin, outputs, a, b)`` returning a
+    tuple of outputs, or ``None`` when the state or an output is not covered.
+    Tables may also offer ``lookup_array(hin, outputs, a, b)`` returning a
+    (values, covered) pair of arrays for a whole batch, or ``None`` if they
+    have no vectorized path for that call; such calls go to ``source`` in
+    one batch if it is vectorized and through ``lookup`` per state if not.
+    With ``saturation=True`` a SaturationTable is built from ``source`` on
+    the first "PQ" call.
+    """
+    name = "table"
+
+    def __init__(self, source, tables=(), saturation=True):
+        self.source = source
+        self.tables = list(tables)
+        self.use_saturation = saturation
+        self._saturation = None
+
+    def add_table(self, table):
+        self.tables.append(table)
+
+    def set_saturation_table(self, table):
+        self._saturation = table
+
+    def saturation_table(self):
+        if self._saturation is None:
+            from saturation import SaturationTable
+            self._saturation = SaturationTable.build(self.source)
+        return self._saturation
+
+    def _calc(self, hin, outputs, a, b):
+        if hin == "PQ" and self.use_saturation:
+            result = self.saturation_table().lookup(hin, outputs, a, b)
+            if result is not None:
+                return result
+        for table in self.tables:
+            result = table.lookup(hin, outputs, a, b)
+            if result is not None:
+                return result
+        return self.source._calc(hin, outputs, a, b)
+
+    def _calc_array(self, hin, outputs, a, b):
+        values = np.empty((len(outputs), len(a)))
+        pending = np.ones(len(a), dtype=bool)
+        tables = list(self.tables)
+        if hin == "PQ" and self.use_saturation:
+            tables.insert(0, self.saturation_table())
+        for table in tables:
+            index = np.flatnonzero(pending)
+            if not len(index):
+                return values
+            lookup_array = getattr(table, "lookup_array", None)
+            result = lookup_array(hin, outputs, a[index], b[index]) if lookup_array else None
+            if result is not None:
+                found, covered = result
+                values[:, index[covered]] = found[:, covered]
+                pending[index[covered]] = False
+                continue
+            if self.source.vectorized:
+                break
+            for n in index.tolist():
+                found = table.lookup(hin, outputs, float(a[n]), float(b[n]))
+                if found is not None:
+                    values[:, n] = found
+                    pending[n] = False
+        index = np.flatnonzero(pending)
+        if len(index):
+            values[:, index] = self.source._calc_array(hin, outputs, a[index], b[index])
+        return values
+
+    def reset(self):
+        self.source.reset()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def calls(self):
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.calls if self.calls else 0.0
+
+    def merge(self, other):
+        self.hits += other.hits
+        self.misses += other.misses
+        self.evictions += other.evictions
+
+    def __repr__(self):
+        return (f"CacheStats(calls={self.calls}, hits={self.hits}, misses={self.misses}, "
+                f"evictions={self.evictions}, hit_rate={self.hit_rate:.1%})")
+
+
+def quantizer(bits):
+    # Rounds a float to ``bits`` significant mantissa bits (40 bits is about
+    # 12 significant digits), so nearly identical inputs share a cache entry
+    def quantize(x):
+        m, e = math.frexp(x)
+        return math.ldexp(round(math.ldexp(m, bits)), e - bits)
+    return quantize
+
+
+class CachedBackend(PropertyBackend):
+    """Size-bounded LRU memo of ``source`` keyed on the quantized call.
+
+    A hit returns the outputs computed for the first input that quantized
+    to the same key. ``stats`` counts hits, misses (calls forwarded to
+    ``source``) and evictions.
+    """
+
+    def __init__(self, source, maxsize=100000, bits=40, quantize=None):
+        self.source = source
+        self.name = source.name
+        self.maxsize = maxsize
+        self.quantize = quantize or quantizer(bits)
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+
+    def _calc(self, hin, outputs, a, b):
+        key = (self.fluid, hin, outputs, self.quantize(a), self.quantize(b))
+        entries = self._entries
+        result = entries.get(key)
+        if result is not None:
+            entries.move_to_end(key)
+            self.stats.hits += 1
+            return result
+        self.stats.misses += 1
+        result = self.source._calc(hin, outputs, a, b)
+        entries[key] = result
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.stats.evictions += 1
+        return result
+
+    def _calc_array(self, hin, outputs, a, b):
+        # A single state goes through the memo like a scalar call; a real
+        # batch goes straight to the vectorized source, where a per-state
+        # dict lookup would cost about as much as the evaluation itself
+        if len(a) == 1:
+            return np.array(self._calc(hin, outputs, float(a[0]), float(b[0]))).reshape(len(outputs), 1)
+        return self.source._calc_array(hin, outputs, a, b)
+
+    def clear(self):
+        self._entries.clear()
+        self.stats = CacheStats()
+
+    def reset(self):
+        self.source.reset()
+
+
+class PhaseStats:
+    # Property calls of one profiling phase, per input pair
+    def __init__(self):
+        self.entries = 0
+        self.wall_time = 0.0  # seconds inside the phase, without nested phases
+        self.pairs = {}  # input pair -> [calls, states, seconds in the backend]
+
+    @property
+    def calls(self):
+        return sum(entry[0] for entry in self.pairs.values())
+
+    @property
+    def states(self):
+        return sum(entry[1] for entry in self.pairs.values())
+
+    @property
+    def backend_time(self):
+        return sum(entry[2] for entry in self.pairs.values())
+
+    @property
+    def python_time(self):
+        return max(0.0, self.wall_time - self.backend_time)
+
+    def merge(self, other):
+        self.entries += other.entries
+        self.wall_time += other.wall_time
+        for hin, (calls, states, seconds) in other.pairs.items():
+            entry = self.pairs.setdefault(hin, [0, 0, 0.0])
+            entry[0] += calls
+            entry[1] += states
+            entry[2] += seconds
+
+
+class InstrumentedBackend(PropertyBackend):
+    """Counts and times the calls into ``source`` per phase and input pair.
+
+    Calls are charged to the innermost open ``phase(name)``, or to
+    "(unscoped)" outside any; re-entering a phase name adds to it. A phase's
+    wall time excludes its nested phases, and the time it spent outside the
+    backend is reported as Python time. The bookkeeping is two clock reads
+    and a dict update per call.
+    """
+    UNSCOPED = "(unscoped)"
+
+    def __init__(self, source):
+        self.source = source
+        self.name = source.name
+        self.vectorized = source.vectorized
+        self.clear()
+
+    @property
+    def version(self):
+        return self.source.version
+
+    def clear(self):
+        self.phases = OrderedDict()
+        self._stack = []
+        self._pairs = self._phase(self.UNSCOPED).pairs
+
+    def _phase(self, name):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        return stats
+
+    def _record(self, hin, states, seconds):
+        entry = self._pairs.get(hin)
+        if entry is None:
+            entry = self._pairs[hin] = [0, 0, 0.0]
+        entry[0] += 1
+        entry[1] += states
+        entry[2] += seconds
+
+    def _calc(self, hin, outputs, a, b):
+        start = time.perf_counter()
+        result = self.source._calc(hin, outputs, a, b)
+        self._record(hin, 1, time.perf_counter() - start)
+        return result
+
+    def _calc_array(self, hin, outputs, a, b):
+        start = time.perf_counter()
+        values = self.source._calc_array(hin, outputs, a, b)
+        self._record(hin, len(a), time.perf_counter() - start)
+        return values
+
+    @contextmanager
+    def phase(self, name):
+        stats = self._phase(name)
+        stats.entries += 1
+        # frame: [stats, time in nested phases]
+        frame = [stats, 0.0]
+        self._stack.append(frame)
+        self._pairs = stats.pairs
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.wall_time += elapsed - frame[1]
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] += elapsed
+                self._pairs = self._stack[-1][0].pairs
+            else:
+                self._pairs = self._phase(self.UNSCOPED).pairs
+
+    def merge(self, phases):
+        # Adds the per-phase counters of another instance, e.g. a worker's
+        for name, stats in phases.items():
+            self._phase(name).merge(stats)
+
+    @property
+    def recorded(self):
+        return any(stats.entries or stats.pairs for stats in self.phases.values())
+
+    def total(self):
+        total = PhaseStats()
+        for stats in self.phases.values():
+            total.merge(stats)
+        return total
+
+    def report(self):
+        pairs = sorted({hin for stats in self.phases.values() for hin in stats.pairs})
+        header = f"{'phase':32} {'runs':>5} {'calls':>7} {'states':>8} " + "".join(f"{hin:>7}" for hin in pairs)
+        header += f" {'backend s':>10} {'python s':>10}"
+        lines = [header]
+        rows = [(name, stats) for name, stats in self.phases.items() if stats.entries or stats.pairs]
+        for name, stats in rows + [("total", self.total())]:
+            lines.append(f"{name[:32]:32} {stats.entries:>5} {stats.calls:>7} {stats.states:>8} "
+                         + "".join(f"{stats.pairs.get(hin, (0,))[0]:>7}" for hin in pairs)
+                         + f" {stats.backend_time:>10.4f} {stats.python_time:>10.4f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        self.source.reset()
+
+
+class PropertyBatch:
+    """Collects the property requests of one step and flashes each state once.
+
+    ``add`` queues a request and returns its index into the list ``run``
+    returns. Requests with the same input pair and values are merged into
+    one multi-output call, and density-only requests for saturated liquid
+    (Q=0) and vapor (Q=1) at the same pressure share one "DLIQ;DVAP" flash.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self._states = {}
+        self._requests = []
+
+    def add(self, hin, hout, a, b):
+        hin = normalize_inputs(hin)
+        outputs = normalize_outputs(hout)
+        if hin == "PQ" and (b == 0 or b == 1) and set(outputs) == {"D"}:
+            outputs = ("DLIQ" if b == 0 else "DVAP",) * len(outputs)
+            b = 0
+        key = (hin, a, b)
+        merged = self._states.setdefault(key, [])
+        merged.extend(o for o in outputs if o not in merged)
+        self._requests.append((key, outputs))
+        return len(self._requests) - 1
+
+    def __len__(self):
+        # Number of flashes run() will make
+        return len(self._states)
+
+    def run(self):
+        values = {}
+        for key, outputs in self._states.items():
+            hin, a, b = key
+            values[key] = dict(zip(outputs, self.backend.calc(hin, outputs, a, b)))
+        return [tuple(values[key][o] for o in outputs) for key, outputs in self._requests]
+
+
+def find_layer(backend, cls):
+    # Walks the ``source`` chain of wrapper backends for an instance of cls
+    while backend is not None:
+        if isinstance(backend, cls):
+            return backend
+        backend = getattr(backend, "source", None)
+    return None
+
+
+def cache_stats():
+    layer = find_layer(get_backend(), CachedBackend)
+    return None if layer is None else layer.stats
+
+
+def profile_phase(name):
+    # Scopes the property calls inside a with block to a named phase; a
+    # no-op unless the backend is instrumented
+    layer = find_layer(get_backend(), InstrumentedBackend)
+    return nullcontext() if layer is None else layer.phase(name)
+
+
+def profile_report():
+    # The per-phase table, or None if the backend is not instrumented or
+    # recorded nothing
+    layer = find_layer(get_backend(), InstrumentedBackend)
+    return None if layer is None or not layer.recorded else layer.report()
+
+
+def take_counters():
+    # The cache and profiling counters recorded since the last call, which
+    # starts them over; merge_counters() adds them to another process's
+    # backend, so a parent can report the calls made by its pool workers
+    backend = get_backend()
+    cache = find_layer(backend, CachedBackend)
+    profile = find_layer(backend, InstrumentedBackend)
+    counters = (None if cache is None else cache.stats, None if profile is None else profile.phases)
+    if cache is not None:
+        cache.stats = CacheStats()
+    if profile is not None:
+        profile.clear()
+    return counters
+
+
+def merge_counters(counters):
+    cache_counts, phases = counters
+    backend = get_backend()
+    cache = find_layer(backend, CachedBackend)
+    profile = find_layer(backend, InstrumentedBackend)
+    if cache is not None and cache_counts is not None:
+        cache.stats.merge(cache_counts)
+    if profile is not None and phases is not None:
+        profile.merge(phases)
+
+
+def instrument():
+    # Puts an InstrumentedBackend on top of the current backend (once)
+    layer = find_layer(get_backend(), InstrumentedBackend)
+    return layer if layer is not None else set_backend(InstrumentedBackend(get_backend()))
+
+
+def _create_coolprop():
+    from coolprop import CoolPropBackend
+    return CoolPropBackend(os.environ.get("TRUEZERO_COOLPROP_BACKEND", "HEOS"))
+
+
+def open_store(backend):
+    # Puts the persistent cache named by TRUEZERO_PROPERTY_STORE, if any, in
+    # front of an exact backend
+    path = os.environ.get("TRUEZERO_PROPERTY_STORE")
+    if not path:
+        return backend
+    from property_store import PersistentBackend
+    return PersistentBackend(backend, path)
+
+
+def _create_analytic():
+    from analytic import AnalyticBackend
+    return AnalyticBackend()
+
+
+def _create_table():
+    backend = TabulatedBackend(open_store(create_backend(_exact_backend_name())))
+    path = os.environ.get("TRUEZERO_PD_TABLE")
+    if path is None:
+        from property_table import DEFAULT_PATH as path
+    if os.path.exists(path):
+        from property_table import PDTable
+        table = PDTable.open(path)
+        backend.add_table(table)
+        backend.set_saturation_table(table.saturation)
+    return backend
+
+
+BACKEND_FACTORIES = {
+    "refprop": RefpropBackend,
+    "coolprop": _create_coolprop,
+    "table": _create_table,
+    "analytic": _create_analytic,
+}
+
+
+def _exact_backend_name():
+    return "refprop" if os.environ.get("RPPREFIX") else "coolprop"
+
+
+def default_backend_name():
+    name = os.environ.get("TRUEZERO_PROPERTY_BACKEND")
+    if name:
+        return name.strip().lower()
+    return "table"
+
+
+def create_backend(name):
+    try:
+        factory = BACKEND_FACTORIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown property backend {name!r}, expected one of {sorted(BACKEND_FACTORIES)}")
+    return factory()
+
+
+def build_backend(name):
+    # The named backend behind the default LRU memo layer, with its exact
+    # source behind the optional persistent store; set
+    # TRUEZERO_PROPERTY_CACHE_SIZE=0 to turn the memo off and
+    # TRUEZERO_PROPERTY_PROFILE=1 to instrument the whole stack
+    backend = create_backend(name)
+    if name != "table":
+        backend = open_store(backend)
+    maxsize = int(os.environ.get("TRUEZERO_PROPERTY_CACHE_SIZE", 100000))
+    if maxsize > 0:
+        backend = CachedBackend(backend, maxsize=maxsize)
+    if os.environ.get("TRUEZERO_PROPERTY_PROFILE", "").strip().lower() in ("1", "true", "yes", "on"):
+        backend = InstrumentedBackend(backend)
+    return backend
+
+
+_lock = threading.Lock()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    backend = _backend
+    if backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = build_backend(default_backend_name())
+            backend = _backend
+    return backend
+
+
+def set_backend(backend):
+    # Accepts a backend instance or a name from BACKEND_FACTORIES
+    global _backend
+    if isinstance(backend, str):
+        backend = build_backend(backend)
+    with _lock:
+        _backend = backend
+    return backend
+
+
+def reset_backend():
+    global _backend
+    with _lock:
+        _backend = None
+
+
+def _after_fork_in_child():
+    # The parent's lock may have been held mid-fork, and its DLL handles are
+    # not ours to use; keep the configured backend but let it re-initialize.
+    global _lock
+    _lock = threading.Lock()
+    if _backend is not None:
+        _backend.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def calc(hin, hout, a, b):
+    return get_backend().calc(hin, hout, a, b)
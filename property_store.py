@@ -0,0 +1,110 @@
+"""Persistent on-disk cache of exact property calls, shared across runs.
+
+Wraps an exact backend (REFPROP or CoolProp) and stores every result in a
+SQLite file keyed on backend name, backend version, fluid, input pair,
+outputs and the quantized inputs. The database runs in WAL mode, so any
+number of worker processes can read while one writes. Each process
+buffers new results and writes them in one transaction every
+``flush_every`` misses and at exit. Enable it for the default backend with
+``TRUEZERO_PROPERTY_STORE=/path/to/cache.sqlite``.
+"""
+import atexit
+import os
+import sqlite3
+import struct
+
+from properties import PropertyBackend, quantizer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS properties (
+    backend TEXT NOT NULL,
+    version TEXT NOT NULL,
+    fluid TEXT NOT NULL,
+    hin TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    a REAL NOT NULL,
+    b REAL NOT NULL,
+    result BLOB NOT NULL,
+    PRIMARY KEY (backend, version, fluid, hin, outputs, a, b)
+) WITHOUT ROWID
+"""
+
+# Connections inherited over fork must not be closed by the child
+_inherited = []
+
+
+class PersistentBackend(PropertyBackend):
+    def __init__(self, source, path, bits=40, flush_every=500, timeout=30.0):
+        self.source = source
+        self.name = source.name
+        self.path = path
+        self.quantize = quantizer(bits)
+        self.flush_every = flush_every
+        self.timeout = timeout
+        self.reads = 0
+        self.writes = 0
+        self._connection = None
+        self._pid = None
+        self._pending = {}
+        self._version = None
+        atexit.register(self.flush)
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = str(self.source.version)
+        return self._version
+
+    def _db(self):
+        if self._connection is None or self._pid != os.getpid():
+            if self._connection is not None:
+                _inherited.append(self._connection)
+                self._pending = {}
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _calc(self, hin, outputs, a, b):
+        key = (self.name, self.version, self.fluid, hin, ";".join(outputs), self.quantize(a), self.quantize(b))
+        result = self._pending.get(key)
+        if result is not None:
+            return result
+        row = self._db().execute(
+            "SELECT result FROM properties WHERE backend=? AND version=? AND fluid=? AND hin=? "
+            "AND outputs=? AND a=? AND b=?", key).fetchone()
+        if row is not None:
+            self.reads += 1
+            return struct.unpack(f"<{len(outputs)}d", row[0])
+        result = tuple(self.source._calc(hin, outputs, a, b))
+        self._pending[key] = result
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+        return result
+
+    def flush(self):
+        if not self._pending or self._pid != os.getpid():
+            return
+        rows = [key + (struct.pack(f"<{len(result)}d", *result),) for key, result in self._pending.items()]
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR IGNORE INTO properties VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self.writes += len(rows)
+        self._pending = {}
+
+    def reset(self):
+        # Keep the parent's buffered rows and connection out of the child
+        if self._pid != os.getpid():
+            if self._connection is not None:
+                _inherited.append(self._connection)
+            self._connection = None
+            self._pending = {}
+        self.source.reset()
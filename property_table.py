@@ -0,0 +1,713 @@
+"""Memory-mapped (P, D) property table for parahydrogen.
+
+Covers the trailer/station operating envelope (0.1-1.3 MPa, 0.5-75 kg/m^3)
+and answers "PD" flashes for E, H, S, T and QMASS, plus the inverse "DE"
+(-> P) and "PS" (-> D) flashes used by boil_over_time and vent_trailer.
+Batched lookups solve the inverse flashes for all states at once, the
+same way as a single lookup (same bracketing cell, same tolerance), so a
+batch agrees with state-by-state calls to within that tolerance.
+
+Two-phase states are computed exactly from the saturation table with the
+lever rule. Single-phase states use a bicubic Hermite patch over
+(P, ln D) with node derivatives from finite differences. Cells that cross
+the saturation dome, or whose centre misses the source by more than
+``rtol`` when the table is built, are marked invalid and those lookups
+return None so the caller falls back to the exact backend.
+
+The table is one binary file: a fixed header, the node grid, the validity
+mask and the saturation table it was built with. ``PDTable.open`` maps it
+read-only, so parallel workers share the pages and open it in milliseconds.
+Build it once with ``python property_table.py [path]``.
+"""
+import math
+import os
+import struct
+import sys
+
+import numpy as np
+
+from saturation import P_CRIT, PROPERTIES as SAT_PROPERTIES, SaturationTable, cubic
+from tracing import warning
+
+MAGIC = b"TZPD"
+FORMAT_VERSION = 1
+PROPERTIES = ("E", "H", "S", "T")
+HEADER = struct.Struct("<4sIIIIdddddd16s")  # padded to a multiple of 8 bytes
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parahyd_pd.table")
+
+# REFPROP's quality flags for single-phase states
+Q_LIQUID = -998.0
+Q_VAPOR = 998.0
+Q_SUPERCRITICAL = 999.0
+
+
+def _hermite(t):
+    # Cubic Hermite basis: (value at 0, slope at 0, value at 1, slope at 1)
+    t2 = t * t
+    t3 = t2 * t
+    return 2 * t3 - 3 * t2 + 1, t3 - 2 * t2 + t, 3 * t2 - 2 * t3, t3 - t2
+
+
+class PDTable:
+    def __init__(self, p_range, lnd_range, grid, valid, saturation, max_error=None, source_name=""):
+        self.p_min, self.p_max = p_range
+        self.lnd_min, self.lnd_max = lnd_range
+        self.grid = grid  # (nP, nD, len(PROPERTIES), 4): value, d/di, d/dj, d2/didj
+        self.valid = valid  # (nP - 1, nD - 1) cell mask
+        self.saturation = saturation
+        self.max_error = max_error
+        self.source_name = source_name
+        # Plain ndarray views skip np.memmap's per-slice overhead
+        self._grid = np.asarray(grid).view(np.ndarray)
+        self._valid = np.asarray(valid).view(np.ndarray)
+        self.n_p, self.n_d = grid.shape[:2]
+        self.dp = (self.p_max - self.p_min) / (self.n_p - 1)
+        self.dlnd = (self.lnd_max - self.lnd_min) / (self.n_d - 1)
+        self.d_min = math.exp(self.lnd_min)
+        self.d_max = math.exp(self.lnd_max)
+        # Conservative dome bounds between the top of the saturation table and Pc
+        self._rho_l_top, self._rho_v_top = self._saturated_densities(saturation.p_max)
+
+    # Building and storage
+
+    @classmethod
+    def build(cls, source, saturation=None, p_range=(1.0e5, 1.3e6), d_range=(0.5, 75.0), shape=(241, 241), rtol=1e-4):
+        if saturation is None:
+            saturation = SaturationTable.build(source)
+        n_p, n_d = shape
+        pressures = np.linspace(p_range[0], p_range[1], n_p)
+        lnd = np.linspace(math.log(d_range[0]), math.log(d_range[1]), n_d)
+
+        def flash(p, d):
+            try:
+                return source.calc("PD", PROPERTIES, p, d)
+            except ValueError:
+                return (math.nan,) * len(PROPERTIES)
+
+        values = np.array([[flash(p, math.exp(x)) for x in lnd] for p in pressures])
+        grid = np.empty((n_p, n_d, len(PROPERTIES), 4))
+        grid[..., 0] = values
+        grid[..., 1] = np.gradient(values, axis=0)
+        grid[..., 2] = np.gradient(values, axis=1)
+        grid[..., 3] = np.gradient(grid[..., 2], axis=0)
+
+        table = cls(p_range, (lnd[0], lnd[-1]), grid, np.ones((n_p - 1, n_d - 1), dtype=np.uint8),
+                    saturation, source_name=source.name)
+        floor = 0.01 * np.nanmax(np.abs(values), axis=(0, 1))
+        max_error = 0.0
+        for i in range(n_p - 1):
+            for j in range(n_d - 1):
+                if not table._single_phase_cell(i, j) or not np.all(np.isfinite(grid[i:i + 2, j:j + 2])):
+                    table.valid[i, j] = 0
+                    continue
+                p = 0.5 * (pressures[i] + pressures[i + 1])
+                d = math.exp(0.5 * (lnd[j] + lnd[j + 1]))
+                exact = np.array(flash(p, d))
+                error = np.max(np.abs(np.array(table._interpolate(i, j, p, d, PROPERTIES)) - exact)
+                               / np.maximum(np.abs(exact), floor))
+                if not error <= rtol:
+                    table.valid[i, j] = 0
+                else:
+                    max_error = max(max_error, float(error))
+        table.max_error = max_error
+        return table
+
+    def _single_phase_cell(self, i, j):
+        p_lo = self.p_min + i * self.dp
+        d_lo = math.exp(self.lnd_min + j * self.dlnd)
+        d_hi = math.exp(self.lnd_min + (j + 1) * self.dlnd)
+        if p_lo >= P_CRIT:
+            return True
+        if p_lo > self.saturation.p_max:
+            rho_l, rho_v = self._rho_l_top, self._rho_v_top
+        else:
+            # Vapor density rises and liquid density falls with pressure
+            rho_l, rho_v = self._saturated_densities(p_lo)
+        return d_hi <= rho_v or d_lo >= rho_l
+
+    def save(self, path=DEFAULT_PATH):
+        sat = self.saturation
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, self.n_p, self.n_d, len(sat.pressure),
+                             self.p_min, self.p_max, self.lnd_min, self.lnd_max,
+                             math.nan if self.max_error is None else self.max_error,
+                             math.nan if sat.max_error is None else sat.max_error,
+                             self.source_name.encode()[:16])
+        valid = np.ascontiguousarray(self.valid, dtype=np.uint8).tobytes()
+        valid += b"\0" * (-len(valid) % 8)
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(np.ascontiguousarray(self.grid, dtype="<f8").tobytes())
+            f.write(valid)
+            for array in (sat.pressure, sat.liquid, sat.vapor):
+                f.write(np.ascontiguousarray(array, dtype="<f8").tobytes())
+
+    @classmethod
+    def open(cls, path=DEFAULT_PATH):
+        with open(path, "rb") as f:
+            fields = HEADER.unpack(f.read(HEADER.size))
+        magic, version, n_p, n_d, n_sat, p_min, p_max, lnd_min, lnd_max, max_error, sat_error, source = fields
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} (P, D) property table")
+
+        offset = HEADER.size
+        grid = np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(n_p, n_d, len(PROPERTIES), 4))
+        offset += grid.nbytes
+        valid = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(n_p - 1, n_d - 1))
+        offset += valid.nbytes + (-valid.nbytes % 8)
+        sat = np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(n_sat * (1 + 2 * len(SAT_PROPERTIES)),))
+        pressure = sat[:n_sat]
+        liquid = sat[n_sat:n_sat * (1 + len(SAT_PROPERTIES))].reshape(n_sat, -1)
+        vapor = sat[n_sat * (1 + len(SAT_PROPERTIES)):].reshape(n_sat, -1)
+        saturation = SaturationTable(pressure, liquid, vapor, None if math.isnan(sat_error) else sat_error)
+        return cls((p_min, p_max), (lnd_min, lnd_max), grid, valid, saturation,
+                   None if math.isnan(max_error) else max_error, source.rstrip(b"\0").decode())
+
+    # Lookups
+
+    def _saturated(self, pressure, name):
+        # (liquid, vapor) value of one saturation property
+        dx, row = self.saturation.row(pressure)
+        k = SAT_PROPERTIES.index(name)
+        return cubic(row[k], dx), cubic(row[k + len(SAT_PROPERTIES)], dx)
+
+    def _saturated_densities(self, pressure):
+        return self._saturated(pressure, "D")
+
+    def _interpolate(self, i, j, pressure, density, names):
+        u = (pressure - self.p_min) / self.dp - i
+        v = (math.log(density) - self.lnd_min) / self.dlnd - j
+        hu = _hermite(u)
+        hv = _hermite(v)
+        # Corner (a, b) weights for value, d/di, d/dj and the cross term
+        weights = [[(hu[2 * a] * hv[2 * b], hu[2 * a + 1] * hv[2 * b],
+                     hu[2 * a] * hv[2 * b + 1], hu[2 * a + 1] * hv[2 * b + 1]) for b in (0, 1)] for a in (0, 1)]
+        block = self._grid[i:i + 2, j:j + 2].tolist()
+        result = []
+        for name in names:
+            k = PROPERTIES.index(name)
+            total = 0.0
+            for a in (0, 1):
+                for b in (0, 1):
+                    w = weights[a][b]
+                    c = block[a][b][k]
+                    total += w[0] * c[0] + w[1] * c[1] + w[2] * c[2] + w[3] * c[3]
+            result.append(total)
+        return result
+
+    def _forward(self, pressure, density, names):
+        # Values of ``names`` (PROPERTIES and/or QMASS) at (P, D), or None
+        if not (self.p_min <= pressure <= self.p_max and self.d_min <= density <= self.d_max):
+            return None
+        sat = self.saturation
+        if pressure <= sat.p_max:
+            dx, row = sat.row(pressure)
+            n = len(SAT_PROPERTIES)
+            rho_l, rho_v = cubic(row[0], dx), cubic(row[n], dx)
+            if rho_v <= density <= rho_l:
+                q = (1 / density - 1 / rho_l) / (1 / rho_v - 1 / rho_l)
+                result = []
+                for name in names:
+                    if name == "QMASS":
+                        result.append(q)
+                    else:
+                        k = SAT_PROPERTIES.index(name)
+                        result.append((1 - q) * cubic(row[k], dx) + q * cubic(row[k + n], dx))
+                return result
+            quality = Q_VAPOR if density < rho_v else Q_LIQUID
+        elif pressure < P_CRIT:
+            if self._rho_v_top <= density <= self._rho_l_top:
+                return None
+            quality = Q_VAPOR if density < self._rho_v_top else Q_LIQUID
+        else:
+            quality = Q_SUPERCRITICAL
+
+        i = min(int((pressure - self.p_min) / self.dp), self.n_p - 2)
+        j = min(int((math.log(density) - self.lnd_min) / self.dlnd), self.n_d - 2)
+        if not self._valid[i, j]:
+            return None
+        grid_names = [name for name in names if name != "QMASS"]
+        values = iter(self._interpolate(i, j, pressure, density, grid_names))
+        return [quality if name == "QMASS" else next(values) for name in names]
+
+    def _isobar_nodes(self, pressure, name):
+        # Property at every density node along an isobar
+        i = min(int((pressure - self.p_min) / self.dp), self.n_p - 2)
+        hu = _hermite((pressure - self.p_min) / self.dp - i)
+        rows = self._grid[i:i + 2, :, PROPERTIES.index(name)]
+        return hu[0] * rows[0, :, 0] + hu[1] * rows[0, :, 1] + hu[2] * rows[1, :, 0] + hu[3] * rows[1, :, 1]
+
+    def _isochore_nodes(self, density, name):
+        # Property at every pressure node along an isochore
+        j = min(int((math.log(density) - self.lnd_min) / self.dlnd), self.n_d - 2)
+        hv = _hermite((math.log(density) - self.lnd_min) / self.dlnd - j)
+        cols = self._grid[:, j:j + 2, PROPERTIES.index(name)]
+        return hv[0] * cols[:, 0, 0] + hv[1] * cols[:, 0, 2] + hv[2] * cols[:, 1, 0] + hv[3] * cols[:, 1, 2]
+
+    def _solve_on_line(self, residual, nodes, target, x0, dx, lo, hi, r_lo=None, r_hi=None, xtol=1e-12):
+        # Narrow [lo, hi] to the one grid interval where the node residuals
+        # change sign, so the iteration only touches a single cell
+        k_lo = max(int(math.floor((lo - x0) / dx)) + 1, 0)
+        k_hi = min(int(math.ceil((hi - x0) / dx)) - 1, len(nodes) - 1)
+        def end_residual(x):
+            k = round((x - x0) / dx)
+            if 0 <= k < len(nodes) and abs(x0 + k * dx - x) <= 1e-9 * abs(dx):
+                return float(nodes[k]) - target
+            return residual(x)
+
+        if r_lo is None:
+            r_lo = end_residual(lo)
+        if r_hi is None:
+            r_hi = end_residual(hi)
+        points = [(lo, r_lo)] + [(x0 + k * dx, float(nodes[k]) - target) for k in range(k_lo, k_hi + 1)] + [(hi, r_hi)]
+        for (a, r_a), (b, r_b) in zip(points, points[1:]):
+            if r_a is None or r_b is None or math.isnan(r_a) or math.isnan(r_b):
+                continue
+            if r_a * r_b <= 0:
+                return _regula_falsi(residual, a, b, xtol, f_lo=r_a, f_hi=r_b)
+        return None
+
+    def _dome_exit_pressure(self, density):
+        # Pressure where an isochore leaves the two-phase dome, or None if it
+        # is single-phase over the whole table
+        sat = self.saturation
+        rho_l, rho_v = self._saturated_densities(self.p_min)
+        if not rho_v <= density <= rho_l:
+            return None
+        side = 1 if density <= 0.5 * (self._rho_l_top + self._rho_v_top) else 0
+        top = self._saturated_densities(sat.p_max)[side]
+        if (side == 1 and density >= top) or (side == 0 and density <= top):
+            return sat.p_max
+
+        def residual(x):
+            return self._saturated_densities(math.exp(x))[side] - density
+
+        x = _regula_falsi(residual, math.log(self.p_min), math.log(sat.p_max), 1e-12)
+        return None if x is None else math.exp(x)
+
+    def _two_phase(self, pressure, density, name):
+        # Lever rule with the quality clamped, so round-off at the dome edge
+        # does not push the state into a single-phase cell
+        rho_l, rho_v = self._saturated_densities(pressure)
+        liquid, vapor = self._saturated(pressure, name)
+        q = (1 / density - 1 / rho_l) / (1 / rho_v - 1 / rho_l)
+        q = min(max(q, 0.0), 1.0)
+        return (1 - q) * liquid + q * vapor
+
+    def _solve_de(self, density, energy):
+        # Internal energy rises with pressure along an isochore; the
+        # two-phase part comes straight from the saturation table
+        if not self.d_min <= density <= self.d_max:
+            return None
+
+        def residual(p):
+            value = self._forward(p, density, ("E",))
+            return None if value is None else value[0] - energy
+
+        xtol = 1e-10 * self.p_max
+        p_lo, r_lo = self.p_min, None
+        p_exit = self._dome_exit_pressure(density)
+        if p_exit is not None:
+            r_exit = self._two_phase(p_exit, density, "E") - energy
+            if r_exit >= 0:
+                return _regula_falsi(lambda p: self._two_phase(p, density, "E") - energy,
+                                     self.p_min, p_exit, xtol, f_hi=r_exit)
+            p_lo, r_lo = p_exit, r_exit
+        nodes = self._isochore_nodes(density, "E")
+        return self._solve_on_line(residual, nodes, energy, self.p_min, self.dp, p_lo, self.p_max, r_lo=r_lo, xtol=xtol)
+
+    def _solve_ps(self, pressure, entropy):
+        # Entropy falls with density along an isobar
+        if not self.p_min <= pressure <= self.p_max:
+            return None
+
+        def residual(x):
+            value = self._forward(pressure, math.exp(x), ("S",))
+            return None if value is None else value[0] - entropy
+
+        nodes = self._isobar_nodes(pressure, "S")
+        if pressure >= P_CRIT:
+            x = self._solve_on_line(residual, nodes, entropy, self.lnd_min, self.dlnd, self.lnd_min, self.lnd_max)
+        elif pressure > self.saturation.p_max:
+            return None
+        else:
+            rho_l, rho_v = self._saturated_densities(pressure)
+            s_l, s_v = self._saturated(pressure, "S")
+            if s_l <= entropy <= s_v:
+                q = (entropy - s_l) / (s_v - s_l)
+                return 1.0 / ((1 - q) / rho_l + q / rho_v)
+            if entropy > s_v:
+                x = self._solve_on_line(residual, nodes, entropy, self.lnd_min, self.dlnd,
+                                        self.lnd_min, math.log(rho_v), r_hi=s_v - entropy)
+            else:
+                x = self._solve_on_line(residual, nodes, entropy, self.lnd_min, self.dlnd,
+                                        math.log(rho_l), self.lnd_max, r_lo=s_l - entropy)
+        return None if x is None else math.exp(x)
+
+    def lookup(self, hin, outputs, a, b):
+        if hin == "PD":
+            pressure, density = a, b
+        elif hin == "DE":
+            density = a
+            pressure = self._solve_de(a, b)
+        elif hin == "PS":
+            pressure = a
+            density = self._solve_ps(a, b)
+        else:
+            return None
+        if pressure is None or density is None:
+            return None
+        names = [name for name in outputs if name not in ("P", "D")]
+        if any(name not in PROPERTIES and name not in ("QMASS", "QMOLE") for name in names):
+            return None
+        values = self._forward(pressure, density, ["QMASS" if name == "QMOLE" else name for name in names])
+        if values is None:
+            return None
+        values = iter(values)
+        return tuple(pressure if name == "P" else density if name == "D" else next(values) for name in outputs)
+
+    def lookup_array(self, hin, outputs, a, b):
+        # Batched lookup(); returns (values, covered) with one row per output
+        names = [name for name in outputs if name not in ("P", "D")]
+        if any(name not in PROPERTIES and name not in ("QMASS", "QMOLE") for name in names):
+            return None
+        if hin == "PD":
+            pressure, density, solved = a, b, np.ones(len(a), dtype=bool)
+        elif hin == "DE":
+            density = a
+            pressure, solved = self._solve_de_array(a, b)
+        elif hin == "PS":
+            pressure = a
+            density, solved = self._solve_ps_array(a, b)
+        else:
+            return None
+        index = np.flatnonzero(solved)
+        values = np.full((len(names), len(a)), np.nan)
+        covered = np.zeros(len(a), dtype=bool)
+        found, covered[index] = self._forward_array(pressure[index], density[index],
+                                                    ["QMASS" if name == "QMOLE" else name for name in names])
+        values[:, index] = found
+        rows = iter(values)
+        return np.array([pressure if name == "P" else density if name == "D" else next(rows)
+                         for name in outputs]), covered
+
+    def _saturated_array(self, pressure, name):
+        # Array form of _saturated()
+        dx, coef = self.saturation.rows(pressure)
+        both = cubic(coef, dx[:, None])
+        k = SAT_PROPERTIES.index(name)
+        return both[:, k], both[:, k + len(SAT_PROPERTIES)]
+
+    def _two_phase_array(self, pressure, density, name):
+        # Array form of _two_phase()
+        rho_l, rho_v = self._saturated_array(pressure, "D")
+        liquid, vapor = self._saturated_array(pressure, name)
+        q = np.clip((1 / density - 1 / rho_l) / (1 / rho_v - 1 / rho_l), 0.0, 1.0)
+        return (1 - q) * liquid + q * vapor
+
+    def _dome_exit_pressure_array(self, density):
+        # Array form of _dome_exit_pressure(), NaN for None
+        sat = self.saturation
+        p_exit = np.full(len(density), np.nan)
+        rho_l, rho_v = self._saturated_array(np.full(len(density), self.p_min), "D")
+        dome = np.flatnonzero((density >= rho_v) & (density <= rho_l))
+        d = density[dome]
+        vapor_side = d <= 0.5 * (self._rho_l_top + self._rho_v_top)
+        top = np.where(vapor_side, d >= self._rho_v_top, d <= self._rho_l_top)
+        p_exit[dome[top]] = sat.p_max
+        at, d, vapor_side = dome[~top], d[~top], vapor_side[~top]
+        if len(at):
+            def residual(x, k):
+                liquid, vapor = self._saturated_array(np.exp(x), "D")
+                return np.where(vapor_side[k], vapor, liquid) - d[k]
+
+            every = np.arange(len(at))
+            lo, hi = np.full(len(at), math.log(self.p_min)), np.full(len(at), math.log(sat.p_max))
+            x, ok = _regula_falsi_array(residual, lo, hi, 1e-12, residual(lo, every), residual(hi, every))
+            p_exit[at[ok]] = np.exp(x[ok])
+        return p_exit
+
+    def _isochore_node_residual(self, density, name, target):
+        # Residual at pressure node k along each state's isochore, for an
+        # array k with one node per state
+        lnd = np.log(density)
+        j = np.minimum(((lnd - self.lnd_min) / self.dlnd).astype(int), self.n_d - 2)
+        hv = _hermite((lnd - self.lnd_min) / self.dlnd - j)
+        prop = PROPERTIES.index(name)
+
+        def residual(k):
+            lo, hi = self._grid[k, j, prop], self._grid[k, j + 1, prop]
+            return hv[0] * lo[:, 0] + hv[1] * lo[:, 2] + hv[2] * hi[:, 0] + hv[3] * hi[:, 2] - target
+        return residual
+
+    def _isobar_node_residual(self, pressure, name, target):
+        # Residual at density node k along each state's isobar
+        i = np.minimum(((pressure - self.p_min) / self.dp).astype(int), self.n_p - 2)
+        hu = _hermite((pressure - self.p_min) / self.dp - i)
+        prop = PROPERTIES.index(name)
+
+        def residual(k):
+            lo, hi = self._grid[i, k, prop], self._grid[i + 1, k, prop]
+            return hu[0] * lo[:, 0] + hu[1] * lo[:, 1] + hu[2] * hi[:, 0] + hu[3] * hi[:, 1] - target
+        return residual
+
+    def _solve_de_array(self, density, energy):
+        # Array form of _solve_de(); returns (pressure, solved)
+        n = len(density)
+        pressure = np.full(n, np.nan)
+        solved = np.zeros(n, dtype=bool)
+        pending = (density >= self.d_min) & (density <= self.d_max)
+        xtol = 1e-10 * self.p_max
+        p_lo, r_lo = np.full(n, self.p_min), np.full(n, np.nan)
+        p_exit = self._dome_exit_pressure_array(np.where(pending, density, np.nan))
+        dome = np.flatnonzero(pending & ~np.isnan(p_exit))
+        if len(dome):
+            r_exit = self._two_phase_array(p_exit[dome], density[dome], "E") - energy[dome]
+            two_phase = r_exit >= 0
+            at = dome[two_phase]
+            if len(at):
+                def two_phase_residual(p, k):
+                    return self._two_phase_array(p, density[at[k]], "E") - energy[at[k]]
+
+                lo = np.full(len(at), self.p_min)
+                pressure[at], solved[at] = _regula_falsi_array(
+                    two_phase_residual, lo, p_exit[at], xtol, two_phase_residual(lo, np.arange(len(at))),
+                    r_exit[two_phase])
+                pending[at] = False
+            above = dome[~two_phase]
+            p_lo[above], r_lo[above] = p_exit[above], r_exit[~two_phase]
+
+        at = np.flatnonzero(pending)
+        if len(at):
+            d, e = density[at], energy[at]
+            nodes = self._isochore_node_residual(d, "E", e)
+            r_lo = np.where(np.isnan(r_lo[at]), nodes(np.zeros(len(at), dtype=int)), r_lo[at])
+            r_hi = nodes(np.full(len(at), self.n_p - 1))
+            a, b, r_a, r_b, found = _bracket_array(nodes, self.p_min, self.dp, self.n_p, p_lo[at],
+                                                   np.full(len(at), self.p_max), r_lo, r_hi)
+            at, d, e = at[found], d[found], e[found]
+
+            def residual(p, k):
+                values, covered = self._forward_array(p, d[k], ("E",))
+                return np.where(covered, values[0] - e[k], np.nan)
+
+            pressure[at], solved[at] = _regula_falsi_array(residual, a[found], b[found], xtol, r_a[found], r_b[found])
+        return pressure, solved
+
+    def _solve_ps_array(self, pressure, entropy):
+        # Array form of _solve_ps(); returns (density, solved)
+        n = len(pressure)
+        density = np.full(n, np.nan)
+        solved = np.zeros(n, dtype=bool)
+        inside = (pressure >= self.p_min) & (pressure <= self.p_max)
+        supercritical = inside & (pressure >= P_CRIT)
+        dome = np.flatnonzero(inside & (pressure <= self.saturation.p_max))
+        lo, hi = np.full(n, self.lnd_min), np.full(n, self.lnd_max)
+        r_lo, r_hi = np.full(n, np.nan), np.full(n, np.nan)  # NaN: the end node
+        line = supercritical.copy()
+        if len(dome):
+            p, s = pressure[dome], entropy[dome]
+            rho_l, rho_v = self._saturated_array(p, "D")
+            s_l, s_v = self._saturated_array(p, "S")
+            two_phase = (s_l <= s) & (s <= s_v)
+            q = (s[two_phase] - s_l[two_phase]) / (s_v[two_phase] - s_l[two_phase])
+            density[dome[two_phase]] = 1.0 / ((1 - q) / rho_l[two_phase] + q / rho_v[two_phase])
+            solved[dome[two_phase]] = True
+            vapor, liquid = s > s_v, s < s_l
+            hi[dome[vapor]], r_hi[dome[vapor]] = np.log(rho_v[vapor]), (s_v - s)[vapor]
+            lo[dome[liquid]], r_lo[dome[liquid]] = np.log(rho_l[liquid]), (s_l - s)[liquid]
+            line[dome[vapor | liquid]] = True
+
+        at = np.flatnonzero(line)
+        if len(at):
+            p, s = pressure[at], entropy[at]
+            nodes = self._isobar_node_residual(p, "S", s)
+            r_lo = np.where(np.isnan(r_lo[at]), nodes(np.zeros(len(at), dtype=int)), r_lo[at])
+            r_hi = np.where(np.isnan(r_hi[at]), nodes(np.full(len(at), self.n_d - 1)), r_hi[at])
+            a, b, r_a, r_b, found = _bracket_array(nodes, self.lnd_min, self.dlnd, self.n_d, lo[at], hi[at], r_lo, r_hi)
+            at, p, s = at[found], p[found], s[found]
+
+            def residual(x, k):
+                values, covered = self._forward_array(p[k], np.exp(x), ("S",))
+                return np.where(covered, values[0] - s[k], np.nan)
+
+            x, solved[at] = _regula_falsi_array(residual, a[found], b[found], 1e-12, r_a[found], r_b[found])
+            density[at] = np.exp(x)
+        return density, solved
+
+    def _forward_array(self, pressure, density, names):
+        # Array form of _forward(); returns (values per name, covered mask)
+        n = len(pressure)
+        values = np.full((len(names), n), np.nan)
+        inside = (pressure >= self.p_min) & (pressure <= self.p_max) & (density >= self.d_min) & (density <= self.d_max)
+        quality = np.full(n, Q_SUPERCRITICAL)
+        two_phase = np.zeros(n, dtype=bool)
+        covered = inside.copy()
+
+        sat = self.saturation
+        below = inside & (pressure <= sat.p_max)
+        if below.any():
+            index = np.flatnonzero(below)
+            dx, coef = sat.rows(pressure[index])
+            both = cubic(coef, dx[:, None])
+            k_n = len(SAT_PROPERTIES)
+            rho_l, rho_v = both[:, 0], both[:, k_n]
+            d = density[index]
+            dome = (d >= rho_v) & (d <= rho_l)
+            quality[index] = np.where(d < rho_v, Q_VAPOR, Q_LIQUID)
+            if dome.any():
+                at = index[dome]
+                two_phase[at] = True
+                q = (1 / d[dome] - 1 / rho_l[dome]) / (1 / rho_v[dome] - 1 / rho_l[dome])
+                for row, name in enumerate(names):
+                    if name == "QMASS":
+                        values[row, at] = q
+                    else:
+                        k = SAT_PROPERTIES.index(name)
+                        values[row, at] = (1 - q) * both[dome, k] + q * both[dome, k + k_n]
+        near = inside & (pressure > sat.p_max) & (pressure < P_CRIT)
+        covered &= ~(near & (density >= self._rho_v_top) & (density <= self._rho_l_top))
+        quality = np.where(near, np.where(density < self._rho_v_top, Q_VAPOR, Q_LIQUID), quality)
+
+        single = covered & ~two_phase
+        index = np.flatnonzero(single)
+        if len(index):
+            p, lnd = pressure[index], np.log(density[index])
+            i = np.minimum(((p - self.p_min) / self.dp).astype(int), self.n_p - 2)
+            j = np.minimum(((lnd - self.lnd_min) / self.dlnd).astype(int), self.n_d - 2)
+            valid = self._valid[i, j].astype(bool)
+            covered[index[~valid]] = False
+            index, p, lnd, i, j = index[valid], p[valid], lnd[valid], i[valid], j[valid]
+            hu = _hermite((p - self.p_min) / self.dp - i)
+            hv = _hermite((lnd - self.lnd_min) / self.dlnd - j)
+            grid_names = [name for name in names if name != "QMASS"]
+            k = [PROPERTIES.index(name) for name in grid_names]
+            total = np.zeros((len(k), len(index)))
+            for corner_a in (0, 1):
+                for corner_b in (0, 1):
+                    c = self._grid[i + corner_a, j + corner_b][:, k, :]  # (n, len(k), 4)
+                    w0 = hu[2 * corner_a] * hv[2 * corner_b]
+                    w1 = hu[2 * corner_a + 1] * hv[2 * corner_b]
+                    w2 = hu[2 * corner_a] * hv[2 * corner_b + 1]
+                    w3 = hu[2 * corner_a + 1] * hv[2 * corner_b + 1]
+                    total += (w0[:, None] * c[..., 0] + w1[:, None] * c[..., 1]
+                              + w2[:, None] * c[..., 2] + w3[:, None] * c[..., 3]).T
+            rows = iter(total)
+            for row, name in enumerate(names):
+                values[row, index] = quality[index] if name == "QMASS" else next(rows)
+        return values, covered
+
+
+def _regula_falsi(f, lo, hi, xtol, max_iter=100, f_lo=None, f_hi=None):
+    # Illinois variant; returns None if f is undefined somewhere, not
+    # bracketed or still wider than xtol after max_iter iterations
+    if f_lo is None:
+        f_lo = f(lo)
+    if f_hi is None:
+        f_hi = f(hi)
+    if f_lo is None or f_hi is None or f_lo * f_hi > 0:
+        return None
+    side = 0
+    for _ in range(max_iter):
+        x = (lo * f_hi - hi * f_lo) / (f_hi - f_lo)
+        fx = f(x)
+        if fx is None:
+            return None
+        if fx == 0 or hi - lo < xtol:
+            return x
+        if fx * f_hi > 0:
+            hi, f_hi = x, fx
+            if side == 1:
+                f_lo *= 0.5
+            side = 1
+        else:
+            lo, f_lo = x, fx
+            if side == -1:
+                f_hi *= 0.5
+            side = -1
+        if abs(hi - lo) < xtol:
+            return x
+    warning("Property table: regula falsi did not converge in {n} iterations (bracket {lo:.6g} to {hi:.6g}, "
+            "xtol {xtol:.3g})", n=max_iter, lo=lo, hi=hi, xtol=xtol)
+    return None
+
+
+def _regula_falsi_array(f, lo, hi, xtol, f_lo, f_hi, max_iter=100):
+    # _regula_falsi() for many brackets at once; f(x, k) gives the residuals
+    # at x of the brackets with indices k, NaN where undefined. Returns
+    # (x, ok) with ok False where f was undefined, the bracket had no sign
+    # change or the iteration did not converge
+    lo, hi, f_lo, f_hi = (np.array(v, dtype=float) for v in (lo, hi, f_lo, f_hi))
+    x = np.where(f_lo == 0, lo, hi)
+    ok = f_lo * f_hi <= 0
+    active = ok & (f_lo != 0) & (f_hi != 0) & (hi - lo >= xtol)
+    side = np.zeros(len(lo), dtype=int)
+    for _ in range(max_iter):
+        k = np.flatnonzero(active)
+        if not len(k):
+            return x, ok
+        xk = (lo[k] * f_hi[k] - hi[k] * f_lo[k]) / (f_hi[k] - f_lo[k])
+        fx = f(xk, k)
+        x[k] = xk
+        bad = np.isnan(fx)
+        ok[k[bad]] = False
+        upper = ~bad & (fx * f_hi[k] > 0)
+        lower = ~bad & ~upper
+        u, v = k[upper], k[lower]
+        hi[u], f_hi[u] = xk[upper], fx[upper]
+        f_lo[u[side[u] == 1]] *= 0.5
+        side[u] = 1
+        lo[v], f_lo[v] = xk[lower], fx[lower]
+        f_hi[v[side[v] == -1]] *= 0.5
+        side[v] = -1
+        active[k[bad | (fx == 0) | (hi[k] - lo[k] < xtol)]] = False
+    if active.any():
+        warning("Property table: regula falsi did not converge in {n} iterations for {count} states",
+                n=max_iter, count=int(active.sum()))
+    ok[active] = False
+    return x, ok
+
+
+def _bracket_array(node_residual, x0, dx, count, lo, hi, r_lo, r_hi):
+    # Array form of PDTable._solve_on_line()'s bracketing for residuals that
+    # are monotone along the line: bisects over the grid nodes strictly
+    # inside (lo, hi) for the interval where the residual changes sign.
+    # node_residual(k) gives each state's residual at its node k. Returns
+    # (a, b, r_a, r_b, found)
+    k_lo = np.maximum(np.floor((lo - x0) / dx).astype(int) + 1, 0)
+    k_hi = np.minimum(np.ceil((hi - x0) / dx).astype(int) - 1, count - 1)
+    m = np.maximum(k_hi - k_lo + 1, 0)
+    found = r_lo * r_hi <= 0
+
+    def point(j):
+        # Position j of lo, the inside nodes and hi
+        node = (j > 0) & (j <= m)
+        k = np.clip(k_lo + j - 1, 0, count - 1)
+        x = np.where(j == 0, lo, np.where(node, x0 + k * dx, hi))
+        r = np.where(j == 0, r_lo, np.where(node, node_residual(k), r_hi))
+        return x, r
+
+    j_lo, j_hi = np.zeros(len(lo), dtype=int), m + 1
+    while True:
+        step = j_hi - j_lo > 1
+        if not step.any():
+            break
+        j = (j_lo + j_hi) // 2
+        r = point(j)[1]
+        found &= ~(step & np.isnan(r))
+        same = r * r_lo > 0
+        j_lo = np.where(step & same, j, j_lo)
+        j_hi = np.where(step & ~same, j, j_hi)
+    (a, r_a), (b, r_b) = point(j_lo), point(j_hi)
+    return a, b, r_a, r_b, found
+
+
+if __name__ == "__main__":
+    from properties import create_backend, _exact_backend_name
+
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    source = create_backend(_exact_backend_name())
+    table = PDTable.build(source)
+    table.save(path)
+    print(f"Wrote {path} from {source.name}: {table.n_p} x {table.n_d} nodes, "
+          f"{table.valid.mean():.1%} of cells valid, max error {table.max_error:.2e}, "
+          f"saturation max error {table.saturation.max_error:.2e}")
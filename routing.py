@@ -0,0 +1,133 @@
+"""Delivery-route optimizer for one trailer load across heterogeneous stations.
+
+Every station has its own starting mass and pressure; a route is an
+ordered subset of them, run leg by leg with ParametricStudy's cached
+``station_leg`` and closed by the return trip. ``optimize_route`` searches
+the orders depth first with branch-and-bound for the route that maximizes
+the mass received by the stations, less ``vent_weight`` times the mass
+vented:
+
+- a station's intake from a trailer bounds its intake from that trailer
+  anywhere later in the route, since a lighter trailer gives no more; the
+  remaining stations together can take at most the sum of these, and at
+  most what the trailer holds above its vapor heel, so a branch whose
+  bound does not beat the best route so far is cut. The bounds start from
+  the full trailer and tighten with the legs run at each node
+- legs are memoized on the quantized trailer state (LegCache), and a
+  visited set reached again in the same trailer state with no better
+  objective is dropped, so orders that end up in the same state are
+  searched once
+- stations are tried in order of decreasing intake, and a stop that
+  would deliver less than ``min_delivery`` is not made: a nearly empty
+  trailer still squeezes a few kg into every station it pressurizes, and
+  chasing those stops multiplies the orders for little mass
+
+    python routing.py [--stations N] [--seed S] [--max-stops K] [--vent-weight W]
+"""
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from ParametricStudy import (LEG_QUANTIZE_BITS, TRAILER_MASS_INITIAL, TRAILER_PRESSURE_INITIAL, TRAILER_VOLUME,
+                             leg_cache, run_return_trip, station_leg)
+from properties import get_backend, quantizer
+from tracing import info
+
+TOLERANCE = 1e-6  # kg, objective differences below this are ties
+MIN_DELIVERY = 10.0  # kg, smallest delivery worth a stop
+
+# order: station indices in visiting order; legs: (mass_received,
+# mass_vented) per stop; nodes: search nodes expanded
+RoutePlan = namedtuple("RoutePlan", ["order", "mass_received", "mass_vented", "legs", "nodes"])
+
+
+def evaluate_route(stations, order, trailer_mass=TRAILER_MASS_INITIAL, trailer_pressure=TRAILER_PRESSURE_INITIAL):
+    # Totals for visiting the given stations in the given order
+    legs = []
+    for index in order:
+        trailer_mass, trailer_pressure, mass_received, mass_vented = station_leg(
+            trailer_mass, trailer_pressure, *stations[index])
+        legs.append((mass_received, mass_vented))
+    mass_vented = sum(vented for _, vented in legs) + run_return_trip(trailer_mass, trailer_pressure)
+    return RoutePlan(tuple(order), sum(received for received, _ in legs), mass_vented, legs, 0)
+
+
+def optimize_route(stations, max_stops=None, vent_weight=0.0, min_delivery=MIN_DELIVERY,
+                   trailer_mass=TRAILER_MASS_INITIAL, trailer_pressure=TRAILER_PRESSURE_INITIAL):
+    """Best order and subset of ``stations``, (mass, pressure) pairs; returns a RoutePlan."""
+    stations = [tuple(station) for station in stations]
+    max_stops = len(stations) if max_stops is None else min(max_stops, len(stations))
+    intake = [station_leg(trailer_mass, trailer_pressure, *station)[2] for station in stations]
+    candidates = range(len(stations))
+    heel = TRAILER_VOLUME * get_backend().calc("PQ", "DVAP", min(p for _, p in stations), 0)[0] if stations else 0.0
+    quantize = quantizer(LEG_QUANTIZE_BITS)
+    seen = {}
+    best = [-float("inf"), None]  # objective, RoutePlan
+    nodes = [0]
+
+    def finish(order, state, received, vented, legs):
+        total_vented = vented + run_return_trip(*state)
+        objective = received - vent_weight * total_vented
+        if objective > best[0] + TOLERANCE:
+            best[:] = objective, RoutePlan(order, received, total_vented, list(legs), 0)
+
+    def search(order, state, visited, received, vented, legs, caps):
+        nodes[0] += 1
+        # The return trip only adds venting, so it is run only where it
+        # could give a better route
+        if received - vent_weight * vented > best[0] + TOLERANCE:
+            finish(order, state, received, vented, legs)
+        if len(order) == max_stops:
+            return
+        remaining = [i for i in candidates if not visited >> i & 1]
+        available = max(0.0, state[0] - heel)
+        objective = received - vent_weight * vented
+        if objective + min(available, sum(caps[i] for i in remaining)) <= best[0] + TOLERANCE:
+            return
+        key = (visited, quantize(state[0]), quantize(state[1]))
+        if seen.get(key, -float("inf")) >= objective - TOLERANCE:
+            return
+        seen[key] = objective
+        children = []
+        for i in remaining:
+            leg = station_leg(*state, *stations[i])
+            if leg[2] >= max(min_delivery, TOLERANCE):
+                children.append((i, leg))
+        caps = dict(caps)
+        caps.update((i, 0.0) for i in remaining)
+        caps.update((i, leg[2]) for i, leg in children)
+        if objective + min(available, sum(caps[i] for i in remaining)) <= best[0] + TOLERANCE:
+            return
+        children.sort(key=lambda child: -child[1][2])
+        for i, (mass, pressure, mass_received, mass_vented) in children:
+            search(order + (i,), (mass, pressure), visited | 1 << i, received + mass_received, vented + mass_vented,
+                   legs + ((mass_received, mass_vented),), caps)
+
+    search((), (trailer_mass, trailer_pressure), 0, 0.0, 0.0, (), dict(enumerate(intake)))
+    return best[1]._replace(nodes=nodes[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Best visiting order for one trailer load")
+    parser.add_argument("--stations", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-stops", type=int)
+    parser.add_argument("--vent-weight", type=float, default=0.0)
+    parser.add_argument("--min-delivery", type=float, default=MIN_DELIVERY)
+    args = parser.parse_args()
+
+    # Random stations: 50-600 kg at 220-350 kPa
+    rng = np.random.default_rng(args.seed)
+    stations = [(float(mass), float(pressure)) for mass, pressure in
+                zip(rng.uniform(50, 600, args.stations), rng.uniform(220000, 350000, args.stations))]
+    for index, (mass, pressure) in enumerate(stations):
+        info("Station {index}: {mass:.0f} kg at {pressure:.0f} Pa", index=index, mass=mass, pressure=pressure)
+
+    in_order = evaluate_route(stations, range(len(stations)))
+    plan = optimize_route(stations, args.max_stops, args.vent_weight, args.min_delivery)
+    info("In listed order: received {received:.2f} kg, vented {vented:.2f} kg",
+         received=in_order.mass_received, vented=in_order.mass_vented)
+    info("Best route {order}: received {received:.2f} kg, vented {vented:.2f} kg ({nodes} nodes, leg cache: {stats})",
+         order=list(plan.order), received=plan.mass_received, vented=plan.mass_vented, nodes=plan.nodes,
+         stats=leg_cache.stats)
@@ -0,0 +1,215 @@
+"""Saturation-curve table for parahydrogen.
+
+Liquid and vapor density, internal energy, enthalpy, entropy and temperature
+are tabulated against ln(P) from the triple point to just below the critical
+point and interpolated with a monotone (PCHIP) cubic. Nodes are added by
+bisection until the interpolant matches the source backend at every interval
+midpoint to within ``rtol`` relative error (measured against
+max(|value|, 1% of the property's largest magnitude), so properties that
+cross zero such as liquid entropy are not penalised near the crossing). A
+final pass over all midpoints records the achieved error in ``max_error``.
+"""
+from bisect import bisect_right
+import math
+
+import numpy as np
+
+P_TRIPLE = 7041.0  # Pa, parahydrogen triple point
+P_CRIT = 1285800.0  # Pa, parahydrogen critical point
+
+PROPERTIES = ("D", "E", "H", "S", "T")
+
+
+class SaturationTable:
+    def __init__(self, pressure, liquid, vapor, max_error=None):
+        self.pressure = np.asarray(pressure, dtype=float)
+        self.liquid = np.asarray(liquid, dtype=float)  # shape (n, len(PROPERTIES))
+        self.vapor = np.asarray(vapor, dtype=float)
+        self.max_error = max_error
+        self.p_min = float(self.pressure[0])
+        self.p_max = float(self.pressure[-1])
+
+        # One PCHIP over all liquid and vapor columns, kept as raw cubic
+        # coefficients so a scalar lookup is a bisect plus Horner's rule
+        self._x = np.log(self.pressure)
+        self._coef = pchip_coefficients(self._x, np.hstack([self.liquid, self.vapor]))
+        self._xs = self._x.tolist()
+        self._coef_rows = [self._coef[:, i, :].T.tolist() for i in range(self._coef.shape[1])]
+
+    @classmethod
+    def build(cls, source, p_min=P_TRIPLE, p_max=0.995 * P_CRIT, rtol=1e-5, initial_points=33, max_points=4097):
+        def states(p):
+            return (source.calc("PQ", PROPERTIES, p, 0), source.calc("PQ", PROPERTIES, p, 1))
+
+        x = list(np.linspace(math.log(p_min), math.log(p_max), initial_points))
+        values = {xi: states(math.exp(xi)) for xi in x}
+
+        def midpoint_errors(x, intervals):
+            y = np.array([values[xi][0] + values[xi][1] for xi in x])
+            coef = pchip_coefficients(np.array(x), y)
+            floor = 0.01 * np.max(np.abs(y), axis=0)
+            errors = []
+            for i in intervals:
+                xm = 0.5 * (x[i] + x[i + 1])
+                if xm not in values:
+                    values[xm] = states(math.exp(xm))
+                exact = np.array(values[xm][0] + values[xm][1])
+                estimate = cubic(coef[:, i, :], xm - x[i])
+                errors.append(float(np.max(np.abs(estimate - exact) / np.maximum(np.abs(exact), floor))))
+            return errors
+
+        # Bisect every interval whose midpoint misses the tolerance
+        pending = range(len(x) - 1)
+        while pending and len(x) < max_points:
+            errors = midpoint_errors(x, pending)
+            split = [0.5 * (x[i] + x[i + 1]) for i, e in zip(pending, errors) if e > rtol]
+            if not split:
+                break
+            x = sorted(x + split)
+            # PCHIP slopes at a node depend on its neighbours, so a new node
+            # changes the interpolant up to two intervals away
+            split = set(split)
+            new = [i for i, xi in enumerate(x) if xi in split]
+            pending = sorted({j for i in new for j in range(i - 2, i + 2) if 0 <= j < len(x) - 1})
+
+        max_error = max(midpoint_errors(x, range(len(x) - 1)))
+        pressure = np.exp(x)
+        liquid = [values[xi][0] for xi in x]
+        vapor = [values[xi][1] for xi in x]
+        return cls(pressure, liquid, vapor, max_error)
+
+    def save(self, path):
+        np.savez(path, pressure=self.pressure, liquid=self.liquid, vapor=self.vapor,
+                 max_error=np.nan if self.max_error is None else self.max_error)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            max_error = float(data["max_error"])
+            return cls(data["pressure"], data["liquid"], data["vapor"],
+                       None if math.isnan(max_error) else max_error)
+
+    def row(self, pressure):
+        # Offset into the interval holding ``pressure`` and its cubic
+        # coefficients per column; evaluate column k with cubic(row[k], dx)
+        x = math.log(pressure)
+        i = min(max(bisect_right(self._xs, x) - 1, 0), len(self._coef_rows) - 1)
+        return x - self._xs[i], self._coef_rows[i]
+
+    def saturated(self, pressure, quality):
+        # Liquid (quality 0) and vapor (quality 1) values of every property
+        dx, row = self.row(pressure)
+        n = len(PROPERTIES)
+        offset = 0 if quality == 0 else n
+        return tuple(cubic(c, dx) for c in row[offset:offset + n])
+
+    def lookup(self, hin, outputs, a, b):
+        if hin != "PQ" or not self.p_min <= a <= self.p_max or not 0 <= b <= 1:
+            return None
+        dx, row = self.row(a)
+        n = len(PROPERTIES)
+        result = []
+        for name in outputs:
+            if name == "P":
+                result.append(a)
+                continue
+            if name == "QMASS" or name == "QMOLE":
+                result.append(b)
+                continue
+            if name == "DLIQ" or name == "DVAP":
+                result.append(cubic(row[0 if name == "DLIQ" else n], dx))
+                continue
+            try:
+                k = PROPERTIES.index(name)
+            except ValueError:
+                return None
+            liquid = cubic(row[k], dx)
+            vapor = cubic(row[k + n], dx)
+            if b == 0:
+                result.append(liquid)
+            elif b == 1:
+                result.append(vapor)
+            elif name == "D":
+                # Lever rule on specific volume
+                result.append(1.0 / ((1 - b) / liquid + b / vapor))
+            else:
+                result.append((1 - b) * liquid + b * vapor)
+        return tuple(result)
+
+    def rows(self, pressure):
+        # Array form of row(): offsets and per-state coefficients with shape
+        # (4, n, 2 * len(PROPERTIES)), evaluated with cubic(coef, dx[:, None])
+        x = np.log(pressure)
+        i = np.clip(np.searchsorted(self._x, x, side="right") - 1, 0, self._coef.shape[1] - 1)
+        return x - self._x[i], self._coef[:, i, :]
+
+    def lookup_array(self, hin, outputs, a, b):
+        # Batched lookup(); returns (values, covered) with one row per output
+        if hin != "PQ":
+            return None
+        columns = []
+        for name in outputs:
+            if name not in PROPERTIES and name not in ("P", "QMASS", "QMOLE", "DLIQ", "DVAP"):
+                return None
+            columns.append(name)
+        covered = (a >= self.p_min) & (a <= self.p_max) & (b >= 0) & (b <= 1)
+        values = np.full((len(outputs), len(a)), np.nan)
+        if not covered.any():
+            return values, covered
+        p, q = a[covered], b[covered]
+        dx, coef = self.rows(p)
+        both = cubic(coef, dx[:, None])
+        n = len(PROPERTIES)
+        for row, name in enumerate(columns):
+            if name == "P":
+                values[row, covered] = p
+                continue
+            if name in ("QMASS", "QMOLE"):
+                values[row, covered] = q
+                continue
+            if name in ("DLIQ", "DVAP"):
+                values[row, covered] = both[:, 0 if name == "DLIQ" else n]
+                continue
+            k = PROPERTIES.index(name)
+            liquid, vapor = both[:, k], both[:, k + n]
+            if name == "D":
+                # Lever rule on specific volume
+                with np.errstate(divide="ignore"):
+                    values[row, covered] = np.where(q == 0, liquid, np.where(q == 1, vapor, 1.0 / ((1 - q) / liquid + q / vapor)))
+            else:
+                values[row, covered] = (1 - q) * liquid + q * vapor
+        return values, covered
+
+
+def cubic(c, dx):
+    return ((c[0] * dx + c[1]) * dx + c[2]) * dx + c[3]
+
+
+def pchip_coefficients(x, y):
+    # Piecewise cubic coefficients (highest power first, local offset from
+    # x[i]) of the monotone Fritsch-Carlson/Butland interpolant, matching
+    # scipy.interpolate.PchipInterpolator; y has shape (n, columns)
+    h = np.diff(x)[:, None]
+    m = np.diff(y, axis=0) / h
+    d = np.zeros_like(y)
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = (np.sign(m[:-1]) * np.sign(m[1:])) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / m[:-1] + w2 / m[1:])
+    d[1:-1] = np.where(same_sign, harmonic, 0.0)
+    d[0] = _pchip_end_slope(h[0], h[1], m[0], m[1])
+    d[-1] = _pchip_end_slope(h[-1], h[-2], m[-1], m[-2])
+    c = np.empty((4,) + m.shape)
+    c[0] = (d[:-1] + d[1:] - 2 * m) / h ** 2
+    c[1] = (3 * m - 2 * d[:-1] - d[1:]) / h
+    c[2] = d[:-1]
+    c[3] = y[:-1]
+    return c
+
+
+def _pchip_end_slope(h0, h1, m0, m1):
+    # Shape-preserving three-point end condition
+    d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    d = np.where(np.sign(d) != np.sign(m0), 0.0, d)
+    return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(d) > np.abs(3 * m0)), 3 * m0, d)
@@ -0,0 +1,174 @@
+"""Optimizer for the station pressure set-points and fill limit.
+
+ParametricStudy runs hand-picked station pressures (250/300/350 kPa) with
+the station vented to STATION_VENT_PRESSURE; here the set-points are
+continuous variables of one study route (``num_stations`` stations that
+start at ``station_mass``):
+
+- ``station_pressure``: station pressure when the trailer arrives (Pa)
+- ``vent_pressure``: the station is vented down to this after an offload
+  that ends above it (Pa)
+- ``fill_fraction``: liquid fill limit of the constant-pressure top-up
+
+The trailer fill pressure is not a set-point: it only sets how much the
+trailer vents before the refill, and costs nothing in return, since the
+refill is always to TRAILER_MASS_INITIAL and a leg's masses do not depend
+on the trailer pressure it starts from (the trailer is heated to station
+pressure first). An optimizer would just push it to its upper bound. The
+return trip vents to TRAILER_PRESSURE_FILL.
+
+``optimize_setpoints`` maximizes the mass received ("received") or
+minimizes the mass vented ("vented") with Nelder-Mead in coordinates
+scaled to the bounds, optionally under ``max_vented`` / ``min_received``
+constraints (penalties per kg of violation). A vent threshold below the
+station pressure is penalized the same way per kPa. Evaluations are
+cached on the quantized set-points and the legs go through the leg cache.
+The search stops when the simplex converges, when the best objective has
+not improved by ``ftol`` in ``patience`` evaluations, or after
+``max_evaluations``:
+
+    python setpoints.py [--objective received|vented] [--stations N] [--mass KG]
+"""
+import argparse
+from collections import namedtuple
+
+import numpy as np
+from scipy.optimize import minimize
+
+from ParametricStudy import (LEG_QUANTIZE_BITS, STATION_MAX_FILL_FRACTION, STATION_MAX_PRESSURE,
+                             STATION_VENT_PRESSURE, TRAILER_MASS_INITIAL, TRAILER_PRESSURE_INITIAL, leg_cache,
+                             run_return_trip, station_leg)
+from properties import quantizer
+from tracing import debug, info
+
+SETPOINTS = ("station_pressure", "vent_pressure", "fill_fraction")
+DEFAULTS = {
+    "station_pressure": 300000.0,
+    "vent_pressure": STATION_VENT_PRESSURE,
+    "fill_fraction": STATION_MAX_FILL_FRACTION,
+}
+BOUNDS = {
+    "station_pressure": (200000.0, 380000.0),
+    "vent_pressure": (250000.0, float(STATION_MAX_PRESSURE)),
+    "fill_fraction": (0.80, 0.98),
+}
+
+# setpoints: dict of all three; stop: "converged", "stalled" or "budget"
+SetpointResult = namedtuple("SetpointResult", ["setpoints", "mass_received", "mass_vented", "objective",
+                                               "evaluations", "cache_hits", "stop"])
+
+
+class _Stop(Exception):
+    pass
+
+
+def evaluate_setpoints(setpoints, num_stations=3, station_mass=200):
+    # (mass_received, mass_vented) of one study route; missing set-points
+    # take their DEFAULTS
+    setpoints = {**DEFAULTS, **setpoints}
+    trailer_mass, trailer_pressure = TRAILER_MASS_INITIAL, TRAILER_PRESSURE_INITIAL
+    total_received = total_vented = 0.0
+    for _ in range(num_stations):
+        trailer_mass, trailer_pressure, mass_received, mass_vented = station_leg(
+            trailer_mass, trailer_pressure, station_mass, setpoints["station_pressure"], setpoints["vent_pressure"],
+            setpoints["fill_fraction"])
+        total_received += mass_received
+        total_vented += mass_vented
+    total_vented += run_return_trip(trailer_mass, trailer_pressure)
+    return total_received, total_vented
+
+
+def optimize_setpoints(objective="received", num_stations=3, station_mass=200, bounds=None, start=None, fixed=None,
+                       max_vented=None, min_received=None, penalty=100.0, ftol=0.01, patience=40,
+                       max_evaluations=400):
+    """Search the set-points not in ``fixed``; returns a SetpointResult.
+
+    ``bounds`` and ``start`` override BOUNDS and DEFAULTS per set-point.
+    """
+    if objective not in ("received", "vented"):
+        raise ValueError(f"Unknown objective {objective!r}, expected 'received' or 'vented'")
+    bounds = {**BOUNDS, **(bounds or {})}
+    fixed = dict(fixed or {})
+    names = [name for name in SETPOINTS if name not in fixed]
+    lo = np.array([bounds[name][0] for name in names])
+    hi = np.array([bounds[name][1] for name in names])
+    start = {**DEFAULTS, **(start or {})}
+    x0 = np.clip((np.array([start[name] for name in names]) - lo) / (hi - lo), 0.0, 1.0)
+    quantize = quantizer(LEG_QUANTIZE_BITS)
+    cache = {}
+    search = {"best": None, "since": 0, "evaluations": 0, "hits": 0}
+
+    def setpoints_at(x):
+        return {**DEFAULTS, **fixed, **dict(zip(names, (lo + np.clip(x, 0.0, 1.0) * (hi - lo)).tolist()))}
+
+    def score(x):
+        setpoints = setpoints_at(x)
+        key = tuple(quantize(setpoints[name]) for name in SETPOINTS)
+        if key in cache:
+            search["hits"] += 1
+            return cache[key][0]
+        mass_received, mass_vented = evaluate_setpoints(setpoints, num_stations, station_mass)
+        value = -mass_received if objective == "received" else mass_vented
+        violation = max(0.0, setpoints["station_pressure"] - setpoints["vent_pressure"]) / 1000
+        if max_vented is not None:
+            violation += max(0.0, mass_vented - max_vented)
+        if min_received is not None:
+            violation += max(0.0, min_received - mass_received)
+        value += penalty * violation
+        cache[key] = (value, setpoints, mass_received, mass_vented)
+        search["evaluations"] += 1
+        debug("Set-points {setpoints}: received {received:.2f} kg, vented {vented:.2f} kg",
+              setpoints=setpoints, received=mass_received, vented=mass_vented)
+        best = search["best"]
+        if best is None or value < cache[best][0] - ftol:
+            search["best"], search["since"] = key, 0
+        else:
+            search["since"] += 1
+        if search["since"] >= patience:
+            raise _Stop("stalled")
+        if search["evaluations"] >= max_evaluations:
+            raise _Stop("budget")
+        return value
+
+    # Starting simplex: a quarter of each range from the start point,
+    # towards the middle
+    simplex = [x0]
+    for n in range(len(names)):
+        vertex = x0.copy()
+        vertex[n] += 0.25 if x0[n] <= 0.5 else -0.25
+        simplex.append(vertex)
+    stop = "converged"
+    if names:
+        try:
+            minimize(score, x0, method="Nelder-Mead", bounds=[(0.0, 1.0)] * len(names),
+                     options={"initial_simplex": np.array(simplex), "xatol": 1e-4, "fatol": ftol,
+                              "maxfev": max_evaluations * 10})
+        except _Stop as reason:
+            stop = str(reason)
+    else:
+        score(x0)
+    value, setpoints, mass_received, mass_vented = cache[search["best"]]
+    return SetpointResult(setpoints, mass_received, mass_vented, value, search["evaluations"], search["hits"], stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize the pressure set-points of a study route")
+    parser.add_argument("--objective", choices=("received", "vented"), default="received")
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--mass", type=float, default=200)
+    parser.add_argument("--max-vented", type=float)
+    parser.add_argument("--min-received", type=float)
+    args = parser.parse_args()
+
+    for pressure in (250000, 300000, 350000):
+        mass_received, mass_vented = evaluate_setpoints({"station_pressure": pressure}, args.stations, args.mass)
+        info("Hand-picked {pressure} Pa: received {received:.2f} kg, vented {vented:.2f} kg",
+             pressure=pressure, received=mass_received, vented=mass_vented)
+    result = optimize_setpoints(args.objective, args.stations, args.mass, max_vented=args.max_vented,
+                                min_received=args.min_received)
+    info("Optimized ({stop} after {evaluations} evaluations, {hits} cached): received {received:.2f} kg, "
+         "vented {vented:.2f} kg", stop=result.stop, evaluations=result.evaluations, hits=result.cache_hits,
+         received=result.mass_received, vented=result.mass_vented)
+    for name in SETPOINTS:
+        info("  {name}: {value:.6g}", name=name, value=result.setpoints[name])
+    info("Leg cache: {stats}", stats=leg_cache.stats)
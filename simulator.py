@@ -1,19 +1,16 @@
 import os
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
 import math
 import tkinter as tk
 from tkinter import messagebox
 from AllFunctions import (boil_to_pressure, offload_with_raising_pressure,
                           offload_const_pressure, boil_over_time, vent_trailer,
                           fill_trailer_const_pressure)
+from properties import get_backend
 
-# Initialize REFPROP
 # os.environ['RPPREFIX'] = r'C:\coding'
-
-os.environ['RPPREFIX']=r'C:\Program Files\REFPROP'
-RP = REFPROPFunctionLibrary(os.environ['RPPREFIX'])
-RP.SETPATHdll(os.environ['RPPREFIX'])
-MASS_BASE_SI = RP.GETENUMdll(0, "MASS BASE SI").iEnum
+# Use the default REFPROP install when present, otherwise the property layer falls back to CoolProp
+if os.path.isdir(r'C:\Program Files\REFPROP'):
+    os.environ.setdefault('RPPREFIX', r'C:\Program Files\REFPROP')
 
 
 # Function to run the simulation
@@ -56,8 +53,7 @@ def run_simulation():
 
         # Calculate station maximum mass
         station_max_mass = station_volume * \
-                           RP.REFPROPdll("PARAHYD", "PQ", "D", MASS_BASE_SI, 0, 0, offload_pressure, 0, [1.0]).Output[
-                               0] * station_max_fill_fraction
+                           get_backend().calc("PQ", "D", offload_pressure, 0)[0] * station_max_fill_fraction
 
         # Step 3: Offload with constant pressure at 2.5 atm
         if final_station_mass < station_max_mass:
@@ -0,0 +1,182 @@
+"""Fast surrogate of the study cycle for interactive what-if exploration.
+
+The full model runs ``num_stations`` station legs (ParametricStudy's
+cached ``station_leg``) and the return trip, thousands of property flashes
+per call. ``Surrogate.build`` samples the inputs with a scrambled Latin
+hypercube (scipy.stats.qmc), runs the model on the samples in parallel
+(sweep.run_sweep), fits every output with a radial basis function
+interpolant ("rbf") or a quadratic least-squares polynomial ("poly") on
+inputs scaled to the unit cube, and reports the error on a held-out part
+of the samples before refitting on all of them. A prediction then takes
+microseconds to a fraction of a millisecond; ``confirm`` runs the full
+model at the same point for comparison. The cycle has kinks and jumps
+where a station fills or the trailer runs dry, so check the reported
+error before trusting a prediction near them.
+
+Inputs (INPUTS, with their default ranges): number of stations (rounded
+to an integer), station starting mass and pressure, station vent
+pressure, trailer fill pressure and station fill fraction. Outputs
+(OUTPUTS): mass received, mass vented, trailer pressure after the last
+station and after the return transport.
+
+    python surrogate.py [--samples N] [--kind rbf|poly] [--processes N] [--save PATH]
+"""
+import argparse
+
+import numpy as np
+
+from AllFunctions import boil_over_time
+from ParametricStudy import TIME_TRANSPORTATION, TRAILER_MASS_INITIAL, TRAILER_PRESSURE_INITIAL, refill_trailer, station_leg
+from sweep import run_sweep
+from tracing import info
+
+INPUTS = {
+    "num_stations": (1, 6),
+    "station_mass": (50.0, 600.0),  # kg
+    "station_pressure": (200000.0, 380000.0),  # Pa
+    "vent_pressure": (250000.0, 400000.0),  # Pa
+    "fill_pressure": (110000.0, 200000.0),  # Pa
+    "fill_fraction": (0.80, 0.98),
+}
+OUTPUTS = ("mass_received", "mass_vented", "final_pressure", "transport_pressure")
+
+
+def run_cycle(num_stations, station_mass, station_pressure, vent_pressure, fill_pressure, fill_fraction):
+    # The full model at one point; returns the OUTPUTS as a tuple
+    trailer_mass, trailer_pressure = TRAILER_MASS_INITIAL, TRAILER_PRESSURE_INITIAL
+    total_received = total_vented = 0.0
+    for _ in range(int(round(num_stations))):
+        trailer_mass, trailer_pressure, mass_received, mass_vented = station_leg(
+            trailer_mass, trailer_pressure, station_mass, station_pressure, vent_pressure, fill_fraction)
+        total_received += mass_received
+        total_vented += mass_vented
+    # The return trip, split so the transport boil-off runs once
+    transport_pressure, _ = boil_over_time(trailer_mass, trailer_pressure, TIME_TRANSPORTATION)
+    total_vented += refill_trailer(trailer_mass, transport_pressure, fill_pressure)
+    return total_received, total_vented, trailer_pressure, transport_pressure
+
+
+def sample_inputs(count, bounds=None, seed=None):
+    # Scrambled Latin hypercube over the input ranges, one row per sample
+    from scipy.stats import qmc
+
+    bounds = {**INPUTS, **(bounds or {})}
+    lo, hi = (np.array([bounds[name][i] for name in INPUTS], dtype=float) for i in (0, 1))
+    samples = qmc.scale(qmc.LatinHypercube(len(INPUTS), seed=seed).random(count), lo, hi)
+    samples[:, 0] = np.round(samples[:, 0])
+    return samples
+
+
+def run_samples(samples, processes=None):
+    outputs, _ = run_sweep(run_cycle, [tuple(row) for row in np.asarray(samples).tolist()], processes=processes)
+    return np.array(outputs, dtype=float)
+
+
+def _quadratic_features(x):
+    # 1, x_i and x_i * x_j (i <= j) per row
+    n, d = x.shape
+    i, j = np.triu_indices(d)
+    return np.hstack([np.ones((n, 1)), x, x[:, i] * x[:, j]])
+
+
+class Surrogate:
+    """Regression of the OUTPUTS on the INPUTS, fitted to model runs.
+
+    ``samples`` is (n, len(INPUTS)) and ``outputs`` (n, len(OUTPUTS)).
+    ``validation`` holds the held-out error per output when the surrogate
+    comes from ``build``: RMSE, maximum absolute error and RMSE relative
+    to the output's spread.
+    """
+
+    def __init__(self, samples, outputs, kind="rbf", smoothing=0.0, bounds=None):
+        if kind not in ("rbf", "poly"):
+            raise ValueError(f"Unknown surrogate kind {kind!r}, expected 'rbf' or 'poly'")
+        self.samples = np.asarray(samples, dtype=float)
+        self.outputs = np.asarray(outputs, dtype=float)
+        self.kind = kind
+        self.smoothing = smoothing
+        self.bounds = {**INPUTS, **(bounds or {})}
+        self.validation = None
+        self._lo = np.array([self.bounds[name][0] for name in INPUTS], dtype=float)
+        self._span = np.array([self.bounds[name][1] for name in INPUTS], dtype=float) - self._lo
+        x = self._scale(self.samples)
+        if kind == "rbf":
+            from scipy.interpolate import RBFInterpolator
+            self._rbf = RBFInterpolator(x, self.outputs, kernel="thin_plate_spline", degree=1, smoothing=smoothing)
+        else:
+            self._coefficients = np.linalg.lstsq(_quadratic_features(x), self.outputs, rcond=None)[0]
+
+    def _scale(self, samples):
+        return (samples - self._lo) / self._span
+
+    @classmethod
+    def build(cls, count=400, kind="rbf", holdout=0.2, seed=None, processes=None, bounds=None, smoothing=0.0):
+        samples = sample_inputs(count, bounds, seed)
+        outputs = run_samples(samples, processes)
+        surrogate = cls(samples, outputs, kind, smoothing, bounds)
+        test = np.random.default_rng(seed).permutation(count)[:int(round(holdout * count))]
+        if test.size:
+            train = np.setdiff1d(np.arange(count), test)
+            fitted = cls(samples[train], outputs[train], kind, smoothing, bounds)
+            surrogate.validation = fitted.validate(samples[test], outputs[test])
+        return surrogate
+
+    def predict(self, samples):
+        # (n, len(INPUTS)) inputs to (n, len(OUTPUTS)) predictions
+        samples = np.atleast_2d(np.asarray(samples, dtype=float)).copy()
+        samples[:, 0] = np.round(samples[:, 0])
+        x = self._scale(samples)
+        if self.kind == "rbf":
+            return self._rbf(x)
+        return _quadratic_features(x) @ self._coefficients
+
+    def __call__(self, **inputs):
+        # One point by input name; returns the outputs by name
+        return dict(zip(OUTPUTS, self.predict([[inputs[name] for name in INPUTS]])[0].tolist()))
+
+    def confirm(self, **inputs):
+        # (predicted, full model) outputs at one point
+        return self(**inputs), dict(zip(OUTPUTS, run_cycle(*(inputs[name] for name in INPUTS))))
+
+    def validate(self, samples, outputs):
+        error = self.predict(samples) - np.asarray(outputs, dtype=float)
+        spread = np.std(outputs, axis=0)
+        rmse = np.sqrt(np.mean(error ** 2, axis=0))
+        return {name: {"rmse": float(rmse[n]), "max": float(np.abs(error[:, n]).max()),
+                       "relative": float(rmse[n] / spread[n]) if spread[n] > 0 else 0.0}
+                for n, name in enumerate(OUTPUTS)}
+
+    def save(self, path):
+        # The samples and model outputs; load() refits from them
+        np.savez(path, samples=self.samples, outputs=self.outputs, kind=self.kind, smoothing=self.smoothing,
+                 bounds=np.array([self.bounds[name] for name in INPUTS], dtype=float))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["samples"], data["outputs"], str(data["kind"]), float(data["smoothing"]),
+                   dict(zip(INPUTS, map(tuple, data["bounds"].tolist()))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit a surrogate of the study cycle")
+    parser.add_argument("--samples", type=int, default=400)
+    parser.add_argument("--kind", choices=("rbf", "poly"), default="rbf")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the samples to this .npz file")
+    args = parser.parse_args()
+
+    surrogate = Surrogate.build(args.samples, args.kind, seed=args.seed, processes=args.processes)
+    info("Held-out error of the {kind} surrogate on {samples} samples:", kind=args.kind, samples=args.samples)
+    for name, error in surrogate.validation.items():
+        info("  {name:>18}: RMSE {rmse:.4g}, max {max:.4g} ({relative:.1%} of its spread)", name=name, **error)
+    point = {"num_stations": 3, "station_mass": 200.0, "station_pressure": 300000.0, "vent_pressure": 360000.0,
+             "fill_pressure": 131000.0, "fill_fraction": 0.95}
+    predicted, actual = surrogate.confirm(**point)
+    for name in OUTPUTS:
+        info("Study 2.2 {name}: surrogate {predicted:.2f}, model {actual:.2f}", name=name,
+             predicted=predicted[name], actual=actual[name])
+    if args.save:
+        surrogate.save(args.save)
+        info("Saved samples to {path}", path=args.save)
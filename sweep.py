@@ -0,0 +1,234 @@
+"""Parallel runner for independent studies (ParametricStudy sweeps).
+
+``run_sweep(func, params)`` calls ``func(*args)`` for every argument tuple in
+``params`` on a pool of worker processes and returns the results in the
+order of ``params``. Work is handed out in chunks so thousands of short
+studies do not pay one round trip each. Every worker has its own property
+backend (REFPROP handles cannot be shared between processes), built from
+the same configuration as the parent. With ``quiet=True`` the studies'
+trace output is discarded, and a throughput line in studies per second is
+traced at the end. The property cache and profiling counters a worker
+records for a task, and those of named ``LegCache``s, come back with its
+result and are added to the parent's, so its reports cover the whole sweep.
+
+``func`` must be importable by the workers, i.e. defined at the top level
+of a module whose script part is behind ``if __name__ == "__main__":``.
+
+``RouteTree`` plans multi-leg studies whose routes share a prefix (the
+same sequence of station legs from the same start): it merges the routes
+into a trie of legs, runs each distinct leg once and branches only where
+the routes differ. ``LegCache`` memoizes a leg function across studies,
+keyed on a hashable leg description.
+"""
+from collections import OrderedDict
+import multiprocessing
+from multiprocessing.util import Finalize
+import os
+import time
+
+from properties import CacheStats, TabulatedBackend, find_layer, get_backend, merge_counters, set_backend, take_counters
+import tracing
+
+_leg_caches = {}  # name -> LegCache, whose stats workers send back
+
+
+def _init_worker(backend, quiet):
+    if quiet:
+        tracing.configure(tracing.NullSink(), tracing.OFF)
+    if backend is not None:
+        set_backend(backend)
+    # Pool workers leave through os._exit, which skips atexit; buffered rows
+    # of the persistent property store are flushed by a finalizer instead
+    store = _store_layer(get_backend())
+    if store is not None:
+        Finalize(store, store.flush, exitpriority=10)
+
+
+def _store_layer(backend):
+    from property_store import PersistentBackend
+    return find_layer(backend, PersistentBackend)
+
+
+def _take_counters():
+    # Property and leg cache counters since the last call, started over
+    legs = {}
+    for name, cache in _leg_caches.items():
+        legs[name], cache.stats = cache.stats, CacheStats()
+    return take_counters(), legs
+
+
+def _merge_counters(counters):
+    properties, legs = counters
+    merge_counters(properties)
+    for name, stats in legs.items():
+        if name in _leg_caches:
+            _leg_caches[name].stats.merge(stats)
+
+
+def _call(task):
+    # Runs one task in a worker; returns its result with the counters it
+    # recorded, for the parent to merge (forked workers start from the
+    # parent's counts, so they are reset first)
+    func, args = task
+    _take_counters()
+    result = func(*args)
+    return result, _take_counters()
+
+
+class SweepReport:
+    def __init__(self, count, processes, elapsed):
+        self.count = count
+        self.processes = processes
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        return self.count / self.elapsed if self.elapsed > 0 else float("inf")
+
+    def __repr__(self):
+        return (f"{self.count} studies on {self.processes} process(es) in {self.elapsed:.2f} s "
+                f"({self.rate:.1f} studies/s)")
+
+
+def run_sweep(func, params, processes=None, chunksize=None, backend=None, quiet=True, start_method=None, count=None):
+    """Run func(*args) for each args in params in parallel; returns (results, SweepReport).
+
+    ``backend`` is a backend name for the workers (default: the parent's
+    configuration). ``processes=1`` runs everything in this process, with
+    ``backend`` set for the duration of the sweep.
+    ``count`` is the number of studies the tasks cover, for the throughput
+    line, if a task runs more than one.
+    """
+    params = [tuple(args) for args in params]
+    processes = processes or os.cpu_count() or 1
+    processes = max(1, min(processes, len(params)))
+    start = time.perf_counter()
+
+    if processes == 1:
+        # Like the pool path, ``backend`` applies to the sweep only
+        previous = get_backend() if backend is not None else None
+        if backend is not None:
+            set_backend(backend)
+        try:
+            if quiet:
+                with tracing.capture(tracing.NullSink(), tracing.OFF):
+                    results = [func(*args) for args in params]
+            else:
+                results = [func(*args) for args in params]
+        finally:
+            if previous is not None:
+                set_backend(previous)
+    else:
+        context = multiprocessing.get_context(start_method)
+        if context.get_start_method() == "fork" and backend is None:
+            # Forked workers inherit the parent's backend; building its
+            # saturation table here saves every worker from building its own
+            tables = find_layer(get_backend(), TabulatedBackend)
+            if tables is not None and tables.use_saturation:
+                tables.saturation_table()
+        if chunksize is None:
+            chunksize = max(1, len(params) // (processes * 4))
+        pool = context.Pool(processes, initializer=_init_worker, initargs=(backend, quiet))
+        try:
+            results = []
+            for result, counters in pool.imap(_call, [(func, args) for args in params], chunksize):
+                results.append(result)
+                _merge_counters(counters)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    report = SweepReport(len(params) if count is None else count, processes, time.perf_counter() - start)
+    tracing.info("Sweep: {report}", report=report)
+    return results, report
+
+
+class RouteTree:
+    """Trie of leg sequences; each node is the state after its path of legs.
+
+    ``routes`` are sequences of hashable leg configurations. ``run`` walks
+    the trie depth first from ``initial_state``, calling
+    ``run_leg(state, config, depth) -> (state, leg_result)`` once per node,
+    with depth 1 for a route's first leg, and
+    ``finish(index, state, leg_results)`` for each route where it ends, and
+    returns the finish values in route order.
+    """
+
+    def __init__(self, routes):
+        self.routes = [tuple(route) for route in routes]
+        self.root = ({}, [])  # (children by leg config, indices of routes ending here)
+        for index, route in enumerate(self.routes):
+            node = self.root
+            for config in route:
+                node = node[0].setdefault(config, ({}, []))
+            node[1].append(index)
+
+    @property
+    def leg_count(self):
+        # Legs run by the tree, against sum(len(route)) when run one by one
+        count, stack = 0, [self.root]
+        while stack:
+            children = stack.pop()[0]
+            count += len(children)
+            stack.extend(children.values())
+        return count
+
+    def branches(self):
+        # One subtree per distinct first leg; they share nothing, so they
+        # can run as separate tasks
+        groups = {}
+        for index, route in enumerate(self.routes):
+            groups.setdefault(route[:1], []).append(index)
+        return list(groups.values())
+
+    def run(self, run_leg, finish, initial_state):
+        results = [None] * len(self.routes)
+        stack = [(self.root, initial_state, ())]
+        while stack:
+            (children, ends), state, leg_results = stack.pop()
+            for index in ends:
+                results[index] = finish(index, state, leg_results)
+            for config, child in reversed(list(children.items())):
+                next_state, leg_result = run_leg(state, config, len(leg_results) + 1)
+                stack.append((child, next_state, leg_results + (leg_result,)))
+        return results
+
+
+class LegCache:
+    """Bounded LRU cache of ``run(leg)`` for hashable legs.
+
+    A leg should carry everything its result depends on (quantized input
+    state and station configuration), so equal legs are interchangeable.
+    ``stats`` counts hits, misses and evictions like the property cache;
+    a cache with a ``name`` also counts the calls ``run_sweep`` workers make.
+    """
+
+    def __init__(self, run, maxsize=100000, name=None):
+        self.run = run
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        if name is not None:
+            _leg_caches[name] = self
+
+    def __call__(self, leg):
+        entries = self._entries
+        result = entries.get(leg)
+        if result is not None:
+            entries.move_to_end(leg)
+            self.stats.hits += 1
+            return result
+        self.stats.misses += 1
+        result = self.run(leg)
+        entries[leg] = result
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.stats.evictions += 1
+        return result
+
+    def clear(self):
+        self._entries.clear()
+        self.stats = CacheStats()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from analytic import VAPOR, AnalyticBackend, saturation_temperature
+
+
+@pytest.fixture
+def backend():
+    return AnalyticBackend()
+
+
+def vapor_states():
+    # Superheated vapor from 1 to 12 bar, up to ten times the saturation
+    # temperature, where the liquid temperature for the same energy is far
+    # past the pseudo-critical point
+    P = np.repeat(np.linspace(1e5, 12e5, 12), 8)
+    T = np.tile(np.linspace(1.05, 10.0, 8), 12) * saturation_temperature(P)
+    return P, P / (4124.2 * T)
+
+
+def test_de_round_trip_vapor_scalar(backend):
+    for P, D in zip(*vapor_states()):
+        e = backend.calc("PD", "E", P, D)[0]
+        P_back, x = backend.calc("DE", "P;QMASS", D, e)
+        assert x == VAPOR
+        assert P_back == pytest.approx(P, rel=1e-9)
+
+
+def test_de_round_trip_vapor_array(backend):
+    P, D = vapor_states()
+    e = backend.calc_array("PD", "E", P, D)[0]
+    P_back, x = backend.calc_array("DE", "P;QMASS", D, e)
+    assert np.all(x == VAPOR)
+    np.testing.assert_allclose(P_back, P, rtol=1e-9)
+
+
+def test_de_high_energy_vapor_not_liquid(backend):
+    # Used to come out as liquid at 5.6 MPa; CoolProp gives 561 kPa vapor
+    for P, x in (backend.calc("DE", "P;QMASS", 2.42, 6e5),
+                 [v[0] for v in backend.calc_array("DE", "P;QMASS", np.array([2.42]), np.array([6e5]))]):
+        assert x == VAPOR
+        assert 4e5 < P < 7e5
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from AllFunctions import offload_with_raising_pressure, offload_with_raising_pressure_batch, station_volume, trailer_volume
+from offload import STATION_FULL, RisingPressureOffload, integrate_adaptive, integrate_batch
+
+
+def test_batch_station_full_matches_adaptive():
+    # The station fills within the first Runge-Kutta step; the stages used
+    # to overshoot its capacity and fail the "PD" flash
+    P, m_trailer, m_station, m_station_max, P_max = 126857.0, 1501.0, 737.0, 796.0, 559932.0
+    problem = RisingPressureOffload(m_trailer + m_station, station_volume, trailer_volume, m_station_max, P_max)
+    P_scalar, m_scalar, reason_scalar = integrate_adaptive(problem, P, m_station)
+    P_batch, m_batch, reason_batch = integrate_batch(m_trailer + m_station, station_volume, trailer_volume,
+                                                     m_station_max, P_max, P, m_station)
+    assert reason_scalar == reason_batch[0] == STATION_FULL
+    assert P_batch[0] == pytest.approx(P_scalar, abs=10.0)
+    assert m_batch[0] == pytest.approx(m_scalar, abs=1e-6)
+
+
+def test_batch_matches_adaptive_near_station_full():
+    rng = np.random.default_rng(1)
+    P = rng.uniform(120000, 300000, 20)
+    m_trailer = rng.uniform(200, 2100, 20)
+    m_station = rng.uniform(300, 790, 20)
+    m_station_max = rng.uniform(700, 820, 20)
+    P_max = rng.uniform(350000, 600000, 20)
+    P_batch, m_batch, _ = integrate_batch(m_trailer + m_station, station_volume, trailer_volume, m_station_max, P_max,
+                                          P, m_station)
+    for k in range(len(P)):
+        if m_station[k] >= m_station_max[k]:
+            continue
+        problem = RisingPressureOffload(m_trailer[k] + m_station[k], station_volume, trailer_volume, m_station_max[k],
+                                        P_max[k])
+        P_scalar, m_scalar, _ = integrate_adaptive(problem, P[k], m_station[k])
+        assert P_batch[k] == pytest.approx(P_scalar, abs=10.0)
+        assert m_batch[k] == pytest.approx(m_scalar, abs=0.01)
+
+
+def test_batch_offload_scalar_arguments():
+    args = (126857.0, 126857.0, 1501.0, 737.0, station_volume, 796.0, 559932.0, 1e9, trailer_volume)
+    scalar = offload_with_raising_pressure_batch(*args)
+    batch = offload_with_raising_pressure_batch(*(np.array([a]) for a in args))
+    assert all(isinstance(value, float) for value in scalar)
+    assert scalar == tuple(value[0] for value in batch)
+
+
+def test_ode_returns_queryable_solution():
+    args = (202650.0, 202650.0, 2100.0, 150.0, station_volume, 800.0, 400000.0, 1e9, trailer_volume)
+    P, m_station, m_trailer, solution = offload_with_raising_pressure(*args, method="ode", return_solution=True)
+    assert solution.P == P
+    assert solution.station_mass(args[0]) == pytest.approx(args[3])
+    assert solution.station_mass(P) == pytest.approx(m_station, abs=1e-3)
+    midway = solution.station_mass(0.5 * (args[0] + P))
+    assert args[3] < midway < m_station
+    assert solution.trailer_mass(P) == pytest.approx(m_trailer, abs=1e-3)
+    with pytest.raises(ValueError):
+        offload_with_raising_pressure(*args, method="adaptive", return_solution=True)
+
+
+def test_scalar_engines_agree_on_station_full():
+    args = (126857.0, 126857.0, 1501.0, 737.0, station_volume, 796.0, 559932.0, 1e9, trailer_volume)
+    P_adaptive, m_adaptive, _ = offload_with_raising_pressure(*args, method="adaptive")
+    P_ode, m_ode, _ = offload_with_raising_pressure(*args, method="ode")
+    assert P_ode == pytest.approx(P_adaptive, abs=1.0)
+    assert m_ode == pytest.approx(m_adaptive, abs=1e-6)
@@ -0,0 +1,26 @@
+import pytest
+
+import ParametricStudy as study
+from properties import get_backend, set_backend
+
+
+@pytest.fixture
+def analytic():
+    previous = get_backend()
+    backend = set_backend("analytic")
+    study.leg_cache.clear()
+    yield backend
+    set_backend(previous)
+    study.leg_cache.clear()
+
+
+def test_leg_key_includes_backend_and_method(analytic):
+    state = (2100.0, 160000.0, 100.0, 250000.0)
+    assert study.make_leg(*state) == study.make_leg(*state)
+    assert study.make_leg(*state) != study.make_leg(*state, method="ode")
+    first = study.station_leg(*state)
+    assert study.leg_cache.stats.misses == 1
+    set_backend("analytic")
+    assert study.make_leg(*state).backend is not analytic
+    assert study.station_leg(*state) == pytest.approx(first)
+    assert study.leg_cache.stats.misses == 2
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from analytic import AnalyticBackend
+from properties import TabulatedBackend
+from property_table import PDTable, _regula_falsi, _regula_falsi_array
+from tracing import capture
+
+
+@pytest.fixture(scope="module")
+def backend():
+    source = AnalyticBackend()
+    table = PDTable.build(source, shape=(81, 81))
+    return TabulatedBackend(source, [table], saturation=False)
+
+
+def states(count=400):
+    rng = np.random.default_rng(0)
+    pressure = rng.uniform(1.05e5, 1.28e6, count)
+    density = np.exp(rng.uniform(np.log(0.6), np.log(74.0), count))
+    return pressure, density
+
+
+@pytest.mark.parametrize("hin, outputs", [("DE", ("P", "T", "QMASS")), ("PS", ("D", "T", "QMASS"))])
+def test_batch_inverse_matches_scalar(backend, hin, outputs):
+    pressure, density = states()
+    source = backend.source
+    if hin == "DE":
+        a, b = density, source.calc_array("PD", "E", pressure, density)[0]
+    else:
+        a, b = pressure, source.calc_array("PD", "S", pressure, density)[0]
+    table = backend.tables[0]
+    values, covered = table.lookup_array(hin, outputs, a, b)
+    scalar = [table.lookup(hin, outputs, float(x), float(y)) for x, y in zip(a, b)]
+    assert covered.tolist() == [result is not None for result in scalar]
+    assert covered.any()
+    expected = np.array([result for result in scalar if result is not None]).T
+    np.testing.assert_allclose(values[:, covered], expected, rtol=1e-9)
+
+    batch = backend.calc_array(hin, outputs, a, b)
+    single = np.array([backend.calc(hin, outputs, float(x), float(y)) for x, y in zip(a, b)]).T
+    np.testing.assert_allclose(batch, single, rtol=1e-9, atol=1e-9)
+
+
+def test_regula_falsi_reports_no_convergence():
+    with capture() as records:
+        assert _regula_falsi(lambda x: x ** 3 - 0.5, 0.0, 1.0, 1e-12) == pytest.approx(0.5 ** (1 / 3))
+        assert not records.messages()
+        assert _regula_falsi(lambda x: x ** 3 - 0.5, 0.0, 1.0, 1e-12, max_iter=3) is None
+        x, ok = _regula_falsi_array(lambda x, k: x ** 3 - 0.5, [0.0, 0.0], [1.0, 1.0], 1e-12, [-0.5, -0.5],
+                                    [0.5, 0.5], max_iter=3)
+        assert not ok.any()
+    assert len(records.messages()) == 2
+    assert all("did not converge" in message for message in records.messages())
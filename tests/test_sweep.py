@@ -0,0 +1,45 @@
+import pytest
+
+import ParametricStudy as study
+from properties import cache_stats, get_backend, instrument, profile_report, set_backend
+from sweep import run_sweep
+
+
+@pytest.fixture
+def profiled():
+    previous = get_backend()
+    set_backend("analytic")
+    backend = instrument()
+    study.leg_cache.clear()
+    yield backend
+    set_backend(previous)
+    study.leg_cache.clear()
+
+
+def test_profile_report_empty_until_recorded(profiled):
+    assert profile_report() is None
+    study.run_study("1.1", 1, 100, 250000)
+    assert "station leg 1" in profile_report()
+
+
+def test_pool_workers_counters_reach_parent(profiled):
+    tasks = [(study.studies[:2],), (study.studies[3:4],)]
+    run_sweep(study.run_study_tree, tasks, processes=2, start_method="fork")
+    report = profile_report()
+    for row in ("station leg 1", "station leg 2", "station leg 3", "return trip"):
+        assert row in report
+    assert profiled.phases["station leg 1"].entries == 3
+    assert profiled.phases["return trip"].entries == 3
+    assert cache_stats().calls > 0
+    assert study.leg_cache.stats.calls == 7
+
+
+def test_single_process_backend_is_restored():
+    previous = get_backend()
+    results, _ = run_sweep(_backend_name, [()], processes=1, backend="analytic")
+    assert results == ["analytic"]
+    assert get_backend() is previous
+
+
+def _backend_name():
+    return get_backend().name
@@ -0,0 +1,141 @@
+"""Level-controlled, structured tracing for the process functions and drivers.
+
+Messages are ``str.format`` templates with keyword fields, e.g.
+``debug("Pressure: {P:.1f} Pa", P=P)``; the template is only formatted when a
+record is actually emitted, so a disabled level costs one comparison.
+Records go to the current sink:
+
+- ``PrintSink`` (default) prints the message to stdout
+- ``NullSink`` discards everything
+- ``RingBuffer(maxlen)`` keeps the last records in memory
+- ``JsonlSink(path)`` appends one JSON object per record
+
+``configure(sink, level)`` sets them for the process and ``capture(sink,
+level)`` for the duration of a ``with`` block, e.g. around one call. The
+starting level comes from ``TRUEZERO_TRACE`` ("debug", "info", "warning" or
+"off", default "info"); per-step detail of the offload loops and the
+per-station narration of the studies is at "debug".
+"""
+from collections import deque, namedtuple
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "off": OFF}
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning"}
+
+
+class Record(namedtuple("Record", ["time", "level", "template", "fields"])):
+    __slots__ = ()
+
+    @property
+    def message(self):
+        return self.template.format(**self.fields)
+
+
+class PrintSink:
+    def emit(self, record):
+        print(record.message, file=sys.stdout)
+
+
+class NullSink:
+    def emit(self, record):
+        pass
+
+
+class RingBuffer:
+    def __init__(self, maxlen=10000):
+        self.records = deque(maxlen=maxlen)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def messages(self):
+        return [record.message for record in self.records]
+
+    def clear(self):
+        self.records.clear()
+
+
+class JsonlSink:
+    def __init__(self, path, mode="a"):
+        self.path = path
+        self.mode = mode
+        self._file = None
+
+    def emit(self, record):
+        if self._file is None:
+            self._file = open(self.path, self.mode, encoding="utf-8")
+        self._file.write(json.dumps({
+            "time": record.time,
+            "level": LEVEL_NAMES.get(record.level, record.level),
+            "message": record.message.strip(),
+            "fields": record.fields,
+        }, default=str) + "\n")
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_sink = PrintSink()
+_level = LEVELS.get(os.environ.get("TRUEZERO_TRACE", "info").strip().lower(), INFO)
+
+
+def enabled(level):
+    return level >= _level
+
+
+def emit(level, template, fields):
+    if level >= _level:
+        _sink.emit(Record(time.time(), level, template, fields))
+
+
+def debug(template, **fields):
+    if DEBUG >= _level:
+        _sink.emit(Record(time.time(), DEBUG, template, fields))
+
+
+def info(template, **fields):
+    if INFO >= _level:
+        _sink.emit(Record(time.time(), INFO, template, fields))
+
+
+def warning(template, **fields):
+    if WARNING >= _level:
+        _sink.emit(Record(time.time(), WARNING, template, fields))
+
+
+def configure(sink=None, level=None):
+    # Sets the sink and/or level; returns the previous (sink, level)
+    global _sink, _level
+    previous = (_sink, _level)
+    if sink is not None:
+        _sink = sink
+    if level is not None:
+        _level = LEVELS[level] if isinstance(level, str) else level
+    return previous
+
+
+@contextmanager
+def capture(sink=None, level=DEBUG):
+    # Sends records to ``sink`` (a new RingBuffer by default) inside the block
+    sink = RingBuffer() if sink is None else sink
+    previous = configure(sink, level)
+    try:
+        yield sink
+    finally:
+        configure(*previous)
+        if hasattr(sink, "flush"):
+            sink.flush()